@@ -0,0 +1,189 @@
+# benchmarkHelpers.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+SRC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+def load_spotipyne():
+    # The sources are installed as the "spotipyne" package by meson, so load
+    # src/ under that name to make the relative imports work in-tree as well.
+    if 'spotipyne' in sys.modules:
+        return sys.modules['spotipyne']
+    spec = importlib.util.spec_from_file_location(
+        'spotipyne',
+        os.path.join(SRC_DIR, '__init__.py'),
+        submodule_search_locations=[SRC_DIR])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['spotipyne'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class Result:
+
+    def __init__(self, name, samples_s, threads=1, wall_s=None):
+        self.name = name
+        self.samples_s = samples_s
+        self.threads = threads
+        self.wall_s = wall_s if wall_s is not None else sum(samples_s)
+
+    def per_op_us(self):
+        return statistics.median(self.samples_s) * 1e6
+
+    def p95_us(self):
+        ordered = sorted(self.samples_s)
+        return ordered[int(0.95 * (len(ordered) - 1))] * 1e6
+
+    def throughput(self):
+        if self.wall_s <= 0:
+            return float('inf')
+        return len(self.samples_s) / self.wall_s
+
+    def to_dict(self):
+        return {
+            'per_op_us': self.per_op_us(),
+            'p95_us': self.p95_us(),
+            'ops_per_s': self.throughput(),
+            'threads': self.threads,
+        }
+
+
+def measure(name, func, args_list, repeat=1):
+    samples = []
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            func(*args)
+            samples.append(time.perf_counter() - start)
+    return Result(name, samples)
+
+
+def measure_threaded(name, func, args_list, threads):
+    # Every thread works through the whole list, so the throughput is what
+    # the pipeline manages with N concurrent cover workers.
+    samples = []
+    samples_lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        local_samples = []
+        barrier.wait()
+        for args in args_list:
+            start = time.perf_counter()
+            func(*args)
+            local_samples.append(time.perf_counter() - start)
+        with samples_lock:
+            samples.extend(local_samples)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    wall_start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    return Result(name, samples, threads=threads, wall_s=wall)
+
+
+def print_results(results):
+    print("{:<44} {:>12} {:>12} {:>14}".format(
+        "benchmark", "median us", "p95 us", "ops/s"))
+    for result in results:
+        print("{:<44} {:>12.1f} {:>12.1f} {:>14.1f}".format(
+            result.name,
+            result.per_op_us(),
+            result.p95_us(),
+            result.throughput()))
+
+
+def check_against_baseline(results, baseline_path, tolerance,
+                           require_baseline=False):
+    try:
+        with open(baseline_path, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        if require_baseline:
+            return ["No baseline at " + baseline_path +
+                    ", record one with --save-baseline first."]
+        print("No baseline at " + baseline_path + ", not gating this run.")
+        return []
+    regressions = []
+    for result in results:
+        if result.name not in baseline:
+            continue
+        allowed = baseline[result.name]['per_op_us'] * (1.0 + tolerance)
+        if result.per_op_us() > allowed:
+            regressions.append(
+                "{}: {:.1f}us > {:.1f}us allowed".format(
+                    result.name, result.per_op_us(), allowed))
+    return regressions
+
+
+def save_baseline(results, baseline_path):
+    with open(baseline_path, "w") as baseline_file:
+        json.dump(
+            {result.name: result.to_dict() for result in results},
+            baseline_file,
+            indent=2,
+            sort_keys=True)
+
+
+def build_argument_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--baseline',
+        help="JSON file with earlier results. Fails when a benchmark got slower than the tolerance allows.")
+    parser.add_argument(
+        '--require-baseline', action='store_true',
+        help="Fail instead of skipping the check when --baseline does not exist.")
+    parser.add_argument(
+        '--save-baseline',
+        help="Write the results of this run as the new baseline.")
+    parser.add_argument(
+        '--tolerance', type=float, default=0.25,
+        help="Allowed slowdown relative to the baseline (default: 0.25)")
+    parser.add_argument(
+        '--json', help="Also write the results to this JSON file.")
+    return parser
+
+
+def finish(results, args):
+    print_results(results)
+    if args.json:
+        save_baseline(results, args.json)
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+    if args.baseline:
+        regressions = check_against_baseline(
+            results, args.baseline, args.tolerance, args.require_baseline)
+        if regressions:
+            print("Performance regressions:", file=sys.stderr)
+            for regression in regressions:
+                print("  " + regression, file=sys.stderr)
+            return 1
+    return 0
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+# coverArtBenchmark.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Headless microbenchmarks for the cover art pipeline. GdkPixbuf does not
+# need a display, so this runs fine on a build server:
+#
+#   python3 benchmarks/coverArtBenchmark.py --save-baseline baseline.json
+#   python3 benchmarks/coverArtBenchmark.py --baseline baseline.json
+
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+
+# xdg.BaseDirectory reads the environment on import, so the cache has to be
+# redirected before anything from spotipyne is loaded.
+CACHE_DIR = tempfile.mkdtemp(prefix='spotipyne-bench-')
+os.environ['XDG_CACHE_HOME'] = CACHE_DIR
+
+import gi
+gi.require_version('Gtk', '3.0')
+gi.require_version('GdkPixbuf', '2.0')
+from gi.repository import GdkPixbuf, GLib
+
+import benchmarkHelpers as helpers
+
+spotipyne = helpers.load_spotipyne()
+from spotipyne import coverArtLoader as loader  # noqa: E402
+from spotipyne.core.coverStore import CoverStore  # noqa: E402
+from spotipyne.core.thumbnailPack import ThumbnailPack  # noqa: E402
+
+# The variants the Web API hands out for albums and playlists, plus a
+# landscape one like the ones used for artists and shows.
+SOURCE_SIZES = [(64, 64), (300, 300), (640, 640), (640, 427)]
+# The sizes the UI asks for: list rows, the playlist header and the controls.
+TARGET_SIZES = [60, 128]
+
+
+def generate_jpeg(path, width, height, seed):
+    row_stride = width * 3
+    data = bytearray(row_stride * height)
+    for y in range(height):
+        offset = y * row_stride
+        for x in range(width):
+            data[offset] = (x * 5 + seed) & 0xff
+            data[offset + 1] = (y * 3 + seed * 7) & 0xff
+            data[offset + 2] = ((x ^ y) + seed * 13) & 0xff
+            offset += 3
+    pixbuf = GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(bytes(data)),
+        GdkPixbuf.Colorspace.RGB,
+        False, 8, width, height, row_stride)
+    pixbuf.savev(path, 'jpeg', ['quality'], ['90'])
+
+
+def image_url_for(uri, width, height):
+    return 'https://i.scdn.co/image/' + uri + '-' + str(width) + 'x' + \
+        str(height)
+
+
+def image_responses_for(uri):
+    return [{'url': image_url_for(uri, w, h),
+             'width': w,
+             'height': h} for (w, h) in SOURCE_SIZES]
+
+
+@contextlib.contextmanager
+def temporary_pack():
+    directory = tempfile.mkdtemp(dir=CACHE_DIR)
+    pack = ThumbnailPack(directory)
+    try:
+        yield pack
+    finally:
+        pack.close()
+        shutil.rmtree(directory)
+
+
+def build_corpus(covers):
+    # Place the generated JPEGs where PixbufCache expects downloaded covers,
+    # so the cache never needs the network.
+    corpus = []
+    for index in range(covers):
+        uri = 'spotify:album:bench' + str(index)
+        for (width, height) in SOURCE_SIZES:
+            path = CoverStore.get_default().path_for_url(
+                image_url_for(uri, width, height))
+            generate_jpeg(path, width, height, index)
+            corpus.append((uri, path, width, height))
+    return corpus
+
+
+def run(args):
+    corpus = build_corpus(args.covers)
+    uris = sorted({uri for (uri, _, _, _) in corpus})
+    results = []
+
+    results.append(helpers.measure(
+        'get_desired_image_for_size',
+        loader.get_desired_image_for_size,
+        [(size, image_responses_for(uri))
+            for uri in uris for size in TARGET_SIZES],
+        repeat=args.repeat))
+
+    for (width, height) in SOURCE_SIZES:
+        paths = [(path,) for (_, path, w, h) in corpus
+                 if (w, h) == (width, height)]
+        results.append(helpers.measure(
+            'load_pixbuf_from_file {}x{}'.format(width, height),
+            loader.load_pixbuf_from_file, paths, repeat=args.repeat))
+
+    pixbufs = {
+        (w, h): loader.load_pixbuf_from_file(path)
+        for (_, path, w, h) in corpus
+    }
+
+    results.append(helpers.measure(
+        'crop_to_square 640x427',
+        loader.crop_to_square,
+        [(pixbufs[(640, 427)],)] * len(uris),
+        repeat=args.repeat))
+
+    for (width, height) in SOURCE_SIZES:
+        for size in TARGET_SIZES:
+            results.append(helpers.measure(
+                'scale_to_dimension {}x{} -> {}'.format(width, height, size),
+                loader.scale_to_dimension,
+                [(pixbufs[(width, height)],
+                  loader.Dimensions(size, size, True))] * len(uris),
+                repeat=args.repeat))
+
+    # Cache paths: a disk hit decodes the downloaded cover, a pack hit reads
+    # the scaled thumbnail from the thumbnail pack, a derived hit scales a
+    # bigger pixbuf that is already in memory down to a new size and a
+    # memory hit returns the exact pixbuf.
+    for size in TARGET_SIZES:
+        dim = loader.Dimensions(size, size, True)
+        with contextlib.ExitStack() as packs:
+            disk_samples = []
+            for _ in range(args.repeat):
+                pack = packs.enter_context(temporary_pack())
+                cache = loader.PixbufCache(thumbnail_pack=pack)
+                disk_samples += helpers.measure(
+                    'disk', cache.get_pixbuf,
+                    [(uri, dim, image_responses_for(uri)) for uri in uris]
+                ).samples_s
+            results.append(helpers.Result(
+                'PixbufCache.get_scaled disk hit ' + str(size), disk_samples))
+
+            pack_samples = []
+            for _ in range(args.repeat):
+                cache = loader.PixbufCache(thumbnail_pack=pack)
+                pack_samples += helpers.measure(
+                    'pack', cache.get_pixbuf,
+                    [(uri, dim, image_responses_for(uri)) for uri in uris]
+                ).samples_s
+            results.append(helpers.Result(
+                'PixbufCache.get_scaled pack hit ' + str(size), pack_samples))
+
+            # Only a pixbuf at least as big as the request is scaled down,
+            # a bigger request would decode the download again.
+            derived = loader.Dimensions(size // 2, size // 2, True)
+            results.append(helpers.measure(
+                'PixbufCache.get_scaled derived hit ' + str(size // 2),
+                cache.get_pixbuf,
+                [(uri, derived, image_responses_for(uri)) for uri in uris]))
+
+            results.append(helpers.measure(
+                'PixbufCache.get_scaled memory hit ' + str(size),
+                cache.get_pixbuf,
+                [(uri, dim, image_responses_for(uri)) for uri in uris],
+                repeat=args.repeat))
+
+    for threads in args.threads:
+        dim = loader.Dimensions(TARGET_SIZES[0], TARGET_SIZES[0], True)
+        # An empty pack shared by all workers, like the cover threads on a
+        # cold start. A fresh cache per call keeps the in-memory one out.
+        with temporary_pack() as pack:
+
+            def load_and_scale(uri):
+                return loader.PixbufCache(thumbnail_pack=pack).get_pixbuf(
+                    uri, dim, image_responses_for(uri))
+
+            results.append(helpers.measure_threaded(
+                'cold cover load x{} threads'.format(threads),
+                load_and_scale,
+                [(uri,) for uri in uris],
+                threads))
+
+    return results
+
+
+def main():
+    parser = helpers.build_argument_parser(
+        "Microbenchmarks for the cover art pipeline")
+    parser.add_argument(
+        '--covers', type=int, default=20,
+        help="Number of generated covers per source size (default: 20)")
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help="How often every measurement is repeated (default: 3)")
+    parser.add_argument(
+        '--threads', type=int, nargs='+', default=[1, 4, 8],
+        help="Thread counts for the concurrent run (default: 1 4 8)")
+    args = parser.parse_args()
+    return helpers.finish(run(args), args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
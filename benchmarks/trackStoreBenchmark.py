@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+# trackStoreBenchmark.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares the memory a library retains as parsed spotipy responses with the
+# same library in a TrackStore. Needs neither gi nor a network:
+#
+#   python3 benchmarks/trackStoreBenchmark.py --tracks 50000
+
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import benchmarkHelpers as helpers
+
+spotipyne = helpers.load_spotipyne()
+from spotipyne.core.trackStore import TrackStore  # noqa: E402
+
+MARKETS = [
+    "AD", "AE", "AR", "AT", "AU", "BE", "BG", "BH", "BO", "BR", "CA", "CH",
+    "CL", "CO", "CR", "CY", "CZ", "DE", "DK", "DO", "DZ", "EC", "EE", "EG",
+    "ES", "FI", "FR", "GB", "GR", "GT", "HK", "HN", "HU", "ID", "IE", "IL",
+    "IN", "IS", "IT", "JO", "JP", "KW", "LB", "LI", "LT", "LU", "LV", "MA",
+    "MC", "MT", "MX", "MY", "NI", "NL", "NO", "NZ", "OM", "PA", "PE", "PH",
+    "PL", "PS", "PT", "PY", "QA", "RO", "SA", "SE", "SG", "SK", "SV", "TH",
+    "TN", "TR", "TW", "US", "UY", "VN", "ZA"]
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def spotify_id(rng):
+    return "".join(rng.choice(ALPHABET) for _ in range(22))
+
+
+def artist_object(artist_id, name):
+    return {
+        "external_urls": {"spotify": "https://open.spotify.com/artist/" + artist_id},
+        "href": "https://api.spotify.com/v1/artists/" + artist_id,
+        "id": artist_id,
+        "name": name,
+        "type": "artist",
+        "uri": "spotify:artist:" + artist_id,
+    }
+
+
+def saved_track_item(rng, artists, albums):
+    track_id = spotify_id(rng)
+    album_id, album_name, album_artists = rng.choice(albums)
+    track_artists = [artist_object(*artist) for artist in album_artists]
+    return {
+        "added_at": "2020-10-01T12:00:00Z",
+        "track": {
+            "album": {
+                "album_type": "album",
+                "artists": track_artists,
+                "available_markets": MARKETS,
+                "external_urls": {"spotify": "https://open.spotify.com/album/" + album_id},
+                "href": "https://api.spotify.com/v1/albums/" + album_id,
+                "id": album_id,
+                "images": [
+                    {"height": size, "width": size,
+                     "url": "https://i.scdn.co/image/" + album_id + str(size)}
+                    for size in (640, 300, 64)],
+                "name": album_name,
+                "release_date": "2019-05-17",
+                "release_date_precision": "day",
+                "total_tracks": 12,
+                "type": "album",
+                "uri": "spotify:album:" + album_id,
+            },
+            "artists": track_artists,
+            "available_markets": MARKETS,
+            "disc_number": 1,
+            "duration_ms": rng.randint(120000, 400000),
+            "explicit": False,
+            "external_ids": {"isrc": "USUM7" + str(rng.randint(1000000, 9999999))},
+            "external_urls": {"spotify": "https://open.spotify.com/track/" + track_id},
+            "href": "https://api.spotify.com/v1/tracks/" + track_id,
+            "id": track_id,
+            "is_local": False,
+            "name": "Track " + track_id[:8],
+            "popularity": rng.randint(0, 100),
+            "preview_url": "https://p.scdn.co/mp3-preview/" + track_id,
+            "track_number": rng.randint(1, 12),
+            "type": "track",
+            "uri": "spotify:track:" + track_id,
+        },
+    }
+
+
+def build_pages(track_count, seed=1):
+    # Every page is serialized and parsed again, like the real responses, so
+    # nothing is shared between the parsed dicts that the API would not share.
+    rng = random.Random(seed)
+    artists = [(spotify_id(rng), "Artist " + str(i))
+               for i in range(max(1, track_count // 20))]
+    albums = [(spotify_id(rng), "Album " + str(i),
+               rng.sample(artists, min(len(artists), rng.randint(1, 2))))
+              for i in range(max(1, track_count // 10))]
+    page = []
+    for _ in range(track_count):
+        page.append(saved_track_item(rng, artists, albums))
+        if len(page) == 50:
+            yield json.dumps({"items": page})
+            page = []
+    if page:
+        yield json.dumps({"items": page})
+
+
+def retained_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    retained = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return retained, size, elapsed
+
+
+def main():
+    parser = helpers.build_argument_parser(
+        "Memory retained by the track list of a big library")
+    parser.add_argument(
+        '--tracks', type=int, default=50000,
+        help="Number of saved tracks (default: 50000)")
+    parser.add_argument(
+        '--max-bytes-per-track', type=float,
+        help="Fail if the TrackStore needs more bytes per track than this.")
+    args = parser.parse_args()
+
+    pages = list(build_pages(args.tracks))
+
+    def as_dicts():
+        tracks = []
+        for page in pages:
+            tracks += [item['track'] for item in json.loads(page)['items']]
+        return tracks
+
+    def as_store():
+        store = TrackStore()
+        for page in pages:
+            store.extend(item['track'] for item in json.loads(page)['items'])
+        return store
+
+    dicts, dicts_bytes, dicts_s = retained_bytes(as_dicts)
+    del dicts
+    store, store_bytes, store_s = retained_bytes(as_store)
+
+    print("{:<24} {:>14} {:>14} {:>10}".format(
+        "representation", "bytes", "bytes/track", "build s"))
+    for name, size, elapsed in (
+            ("spotipy dicts", dicts_bytes, dicts_s),
+            ("TrackStore", store_bytes, store_s)):
+        print("{:<24} {:>14} {:>14.1f} {:>10.2f}".format(
+            name, size, size / args.tracks, elapsed))
+    print("TrackStore keeps {:.1%} of the dict representation".format(
+        store_bytes / dicts_bytes))
+
+    results = [helpers.measure(
+        'TrackStore.row_model', store.row_model,
+        [(index,) for index in range(0, len(store), max(1, len(store) // 2000))])]
+    # One keystroke in the filter entry of a 10k track page, this has to
+    # stay well below a frame.
+    results.append(helpers.measure(
+        'TrackStore.matches 10k rows', store.matches,
+        [(query, 10000) for query in ('t', 'track', 'album 1', 'artist 3 track')],
+        repeat=20))
+    status = helpers.finish(results, args)
+
+    bytes_per_track = store_bytes / args.tracks
+    if args.max_bytes_per_track and bytes_per_track > args.max_bytes_per_track:
+        print("TrackStore needs {:.1f} bytes per track, allowed are {:.1f}".format(
+            bytes_per_track, args.max_bytes_per_track), file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# batchThumbnailer.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .core.metrics import Metrics
+from .core.thumbnailPack import ThumbnailPack
+
+
+def _make_thumbnail(image_url, source_path, width, height, be_square):
+    # Runs in a worker process. Only the scaled pixels travel back, the
+    # parent is the only writer of the thumbnail pack.
+    import gi
+    gi.require_version('Gtk', '3.0')
+    gi.require_version('GdkPixbuf', '2.0')
+    from gi.repository import GdkPixbuf, GLib
+    from .coverArtLoader import Dimensions, scale_to_dimension
+
+    start = time.perf_counter()
+    try:
+        source = GdkPixbuf.Pixbuf.new_from_file(source_path)
+    except GLib.Error as e:
+        return image_url, None, str(e), 0, time.perf_counter() - start
+    scaled = scale_to_dimension(source, Dimensions(width, height, be_square))
+    pixels = scaled.read_pixel_bytes().get_data()
+    return image_url, (
+        pixels,
+        scaled.get_width(),
+        scaled.get_height(),
+        scaled.get_rowstride(),
+        scaled.get_has_alpha()
+    ), None, os.path.getsize(source_path), time.perf_counter() - start
+
+
+class BatchReport:
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.source_bytes = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def items_per_second(self):
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def megabytes_per_second(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.source_bytes / self.elapsed / (1024 * 1024)
+
+    def __str__(self):
+        return "{}/{} thumbnails ({} failed) in {:.1f}s, {:.1f}/s, {:.1f} MB/s".format(
+            self.done, self.total, self.failed, self.elapsed,
+            self.items_per_second(), self.megabytes_per_second())
+
+
+class BatchThumbnailer:
+    """Scales many covers at once on all cores, e.g. to warm the cache.
+
+    Decoding and scaling run in worker processes, so bulk jobs neither hold
+    the GIL of the UI process nor compete with the cover threads for it.
+    """
+
+    def __init__(self, thumbnail_pack=None, processes=None):
+        self.thumbnail_pack = thumbnail_pack or ThumbnailPack.get_default()
+        self.processes = processes or os.cpu_count() or 1
+
+    def run(self, jobs, progress_callback=None):
+        """jobs: iterable of (image URL, source file, target Dimensions).
+
+        progress_callback(report) is called from the calling thread after
+        every finished thumbnail. Returns the final BatchReport.
+        """
+        from .core.coverStore import get_thumbnail_key
+
+        # Covers are shared between albums and playlists, so the same
+        # thumbnail may be asked for more than once.
+        unique_jobs = {}
+        for job in jobs:
+            key = get_thumbnail_key(job[0], job[2])
+            if key not in unique_jobs and key not in self.thumbnail_pack:
+                unique_jobs[key] = job
+        jobs = list(unique_jobs.values())
+        report = BatchReport(len(jobs))
+        if not jobs:
+            return report
+
+        # spawn instead of fork: the UI process has GTK and I/O threads
+        # whose locks must not be copied into the workers.
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=context) as pool:
+            futures = {
+                pool.submit(
+                    _make_thumbnail, image_url, source_path,
+                    dim.width, dim.height, dim.be_square): (image_url, dim)
+                for image_url, source_path, dim in jobs}
+            for future in as_completed(futures):
+                image_url, dim = futures[future]
+                try:
+                    _uri, thumbnail, error, source_bytes, elapsed = \
+                        future.result()
+                except Exception as e:
+                    thumbnail, error, source_bytes, elapsed = None, str(e), 0, 0
+                if thumbnail is None:
+                    print(error)
+                    report.failed += 1
+                else:
+                    pixels, width, height, rowstride, has_alpha = thumbnail
+                    self.thumbnail_pack.put(
+                        get_thumbnail_key(image_url, dim),
+                        pixels, width, height, rowstride, has_alpha)
+                    report.done += 1
+                    report.source_bytes += source_bytes
+                    Metrics.observe('thumbnailer.job_ms', elapsed * 1000)
+                report.elapsed = time.perf_counter() - report.started
+                if progress_callback:
+                    progress_callback(report)
+        Metrics.inc('thumbnailer.done', report.done)
+        Metrics.inc('thumbnailer.failed', report.failed)
+        return report
@@ -73,6 +73,9 @@ class ContentDeck(Handy.Deck):
     def push(self, new_top):
         scrollable_container = Gtk.ScrolledWindow()
         scrollable_container.add(new_top)
+        # pop only sees the container, which has to stop the page inside.
+        if hasattr(new_top, "page_stop_event"):
+            scrollable_container.page_stop_event = new_top.page_stop_event
         self.stack.append(scrollable_container)
         self.add(scrollable_container)
         self.show_all()
@@ -89,6 +92,8 @@ class ContentDeck(Handy.Deck):
         self.set_transition_duration(0)
         self.push(widget)
         for child in self.stack[:-1]:
+            if hasattr(child, "page_stop_event"):
+                child.page_stop_event.set()
             self.remove(child)
         self.stack = [self.stack[-1]]
         self.set_transition_duration(self.transition_duration)
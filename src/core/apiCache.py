@@ -0,0 +1,117 @@
+# apiCache.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from .ioEngine import IoEngine
+from .bandwidthProfile import BandwidthProfile
+from .metrics import Metrics
+
+
+class ApiCache:
+    """Projected responses of read-only Web API calls, shared by all pages.
+
+    Entries are keyed by the projection and the call's arguments and live
+    for TTL seconds, the least recently used ones are evicted past
+    MAX_ENTRIES. A request for a key that is already on the wire joins it
+    instead of sending a second one. The request itself is not tied to the
+    page that started it, so leaving a page early still fills the cache for
+    the next visit.
+    """
+
+    TTL = 10 * 60
+    MAX_ENTRIES = 512
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        with cls.__instance_lock:
+            if not cls.__instance:
+                cls.__instance = ApiCache()
+            return cls.__instance
+
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+        # Only touched from the I/O loop.
+        self.__in_flight = {}
+
+    @staticmethod
+    def key(projection, args, kwargs):
+        return (projection.name, args, tuple(sorted(kwargs.items())))
+
+    def lookup(self, key):
+        with self.__lock:
+            found = self.__entries.get(key)
+            if found is None:
+                return None
+            expires, response = found
+            if expires < time.monotonic():
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return response
+
+    def store(self, key, response):
+        with self.__lock:
+            self.__entries[key] = (
+                time.monotonic() + BandwidthProfile.stretch_cache(self.ttl),
+                response)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+
+    def invalidate(self, projection_name=None):
+        """Drops the entries of one projection, or everything."""
+        with self.__lock:
+            for key in list(self.__entries):
+                if projection_name is None or key[0] == projection_name:
+                    del self.__entries[key]
+
+    async def fetch(self, projection, call, *args, **kwargs):
+        """projection.request(call, *args, **kwargs), through the cache.
+
+        Must be awaited on the I/O loop.
+        """
+        key = self.key(projection, args, kwargs)
+        response = self.lookup(key)
+        if response is not None:
+            Metrics.inc('api_cache.hits')
+            return response
+        task = self.__in_flight.get(key)
+        if task is None:
+            Metrics.inc('api_cache.misses')
+            task = asyncio.ensure_future(IoEngine.get().run(
+                projection.request, call, *args, **kwargs))
+            self.__in_flight[key] = task
+            task.add_done_callback(partial(self.__finished, key))
+        else:
+            Metrics.inc('api_cache.joined')
+        return await asyncio.shield(task)
+
+    def __finished(self, key, task):
+        del self.__in_flight[key]
+        if not task.cancelled() and task.exception() is None:
+            self.store(key, task.result())
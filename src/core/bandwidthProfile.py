@@ -0,0 +1,75 @@
+# bandwidthProfile.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from .metrics import Metrics
+
+
+class BandwidthProfile:
+    """Spends as few bytes as possible on metered connections.
+
+    It is on when Gio.NetworkMonitor reports a metered network, see
+    networkWatcher.py. SPOTIPYNE_METERED=1 forces it on, =0 forces it off.
+    While on, covers use the smallest variant, the playback poll waits
+    longer, covers are not prewarmed and cached data is used while it is
+    reasonably fresh. Received bytes are counted per profile in
+    session.bytes_received metered/unmetered.
+    """
+
+    ENV_FORCE = 'SPOTIPYNE_METERED'
+    POLL_STRETCH = 5
+    CACHE_STRETCH = 6
+    CACHE_MAX_AGE_S = 60 * 60
+
+    __forced = {'1': True, '0': False}.get(os.environ.get(ENV_FORCE, ''))
+    __metered = False
+
+    @classmethod
+    def is_enabled(cls):
+        if cls.__forced is not None:
+            return cls.__forced
+        return cls.__metered
+
+    @classmethod
+    def set_metered(cls, metered):
+        cls.__metered = metered
+
+    @classmethod
+    def stretch_poll(cls, seconds):
+        return seconds * cls.POLL_STRETCH if cls.is_enabled() else seconds
+
+    @classmethod
+    def stretch_cache(cls, seconds):
+        return seconds * cls.CACHE_STRETCH if cls.is_enabled() else seconds
+
+    @classmethod
+    def summary(cls):
+        received = Metrics.counter('session.bytes_received').snapshot()
+        metered = Metrics.counter(
+            'session.bytes_received metered').snapshot()
+        return 'Received this session: {:.1f} MB, {:.1f} MB of it metered' \
+            ' (metered profile {})'.format(
+                received / 1e6, metered / 1e6,
+                'on' if cls.is_enabled() else 'off')
+
+    @classmethod
+    def count_received(cls, size):
+        Metrics.inc('session.bytes_received', size)
+        Metrics.inc(
+            'session.bytes_received ' +
+            ('metered' if cls.is_enabled() else 'unmetered'), size)
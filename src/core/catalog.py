@@ -0,0 +1,126 @@
+# catalog.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from . import rowModels
+from .apiCache import ApiCache
+from .projection import Projection
+from .spotify import Spotify as sp
+from .trackStore import TrackStore
+
+
+class Catalog:
+    """Artists, albums and shows, fetched through the shared ApiCache.
+
+    Everything in here is a coroutine for the I/O loop. Albums and shows
+    come with their first page of tracks or episodes, all further pages
+    are requested at once.
+    """
+
+    ARTIST = Projection('artist', rowModels.ARTIST_FIELDS + ',genres')
+    ARTIST_TOP_TRACKS = Projection(
+        'artist_top_tracks', 'tracks(' + rowModels.TRACK_FIELDS + ')')
+    ARTIST_ALBUMS = Projection(
+        'artist_albums', 'items(' + rowModels.ALBUM_FIELDS + ')')
+    RELATED_ARTISTS = Projection(
+        'artist_related_artists', 'artists(' + rowModels.ARTIST_FIELDS + ')')
+    ALBUM = Projection(
+        'album',
+        rowModels.ALBUM_FIELDS +
+        ',tracks(items(' + rowModels.ALBUM_TRACK_FIELDS + '),total)')
+    ALBUM_TRACKS = Projection(
+        'album_tracks', 'items(' + rowModels.ALBUM_TRACK_FIELDS + ')')
+    SHOW = Projection(
+        'show',
+        rowModels.SHOW_FIELDS +
+        ',episodes(items(' + rowModels.EPISODE_FIELDS + '),total)')
+    SHOW_EPISODES = Projection(
+        'show_episodes', 'items(' + rowModels.EPISODE_FIELDS + ')')
+    PAGE_SIZE = 50
+
+    @classmethod
+    def __fetch_remaining_pages(cls, projection, call, item_id, total):
+        return asyncio.gather(*[
+            ApiCache.get().fetch(
+                projection, call, item_id,
+                limit=cls.PAGE_SIZE, offset=offset)
+            for offset in range(cls.PAGE_SIZE, total, cls.PAGE_SIZE)])
+
+    @classmethod
+    async def artist(cls, artist_id):
+        return await ApiCache.get().fetch(
+            cls.ARTIST, sp.get().artist, artist_id)
+
+    @classmethod
+    async def artist_top_tracks(cls, artist_id):
+        response = await ApiCache.get().fetch(
+            cls.ARTIST_TOP_TRACKS, sp.get().artist_top_tracks, artist_id)
+        return response['tracks']
+
+    @classmethod
+    async def artist_albums(cls, artist_id):
+        response = await ApiCache.get().fetch(
+            cls.ARTIST_ALBUMS, sp.get().artist_albums, artist_id,
+            limit=cls.PAGE_SIZE)
+        return response['items']
+
+    @classmethod
+    async def related_artists(cls, artist_id):
+        response = await ApiCache.get().fetch(
+            cls.RELATED_ARTISTS, sp.get().artist_related_artists, artist_id)
+        return response['artists']
+
+    @classmethod
+    async def album(cls, album_id):
+        return await ApiCache.get().fetch(cls.ALBUM, sp.get().album, album_id)
+
+    @classmethod
+    async def album_tracks(cls, album):
+        """All tracks of an album response as a TrackStore."""
+        # The album's tracks do not repeat the album, the rows need its
+        # cover though. The cached responses are not modified.
+        album_reference = {
+            'uri': album['uri'],
+            'name': album['name'],
+            'images': album['images']}
+        tracks = TrackStore()
+        tracks.extend(
+            dict(track, album=album_reference)
+            for track in album['tracks']['items'])
+        remaining = await cls.__fetch_remaining_pages(
+            cls.ALBUM_TRACKS, sp.get().album_tracks,
+            album['uri'].split(':')[-1], album['tracks']['total'])
+        for page in remaining:
+            tracks.extend(
+                dict(track, album=album_reference) for track in page['items'])
+        return tracks
+
+    @classmethod
+    async def show(cls, show_id):
+        return await ApiCache.get().fetch(cls.SHOW, sp.get().show, show_id)
+
+    @classmethod
+    async def show_episodes(cls, show):
+        """All episodes of a show response."""
+        episodes = list(show['episodes']['items'])
+        remaining = await cls.__fetch_remaining_pages(
+            cls.SHOW_EPISODES, sp.get().show_episodes,
+            show['uri'].split(':')[-1], show['episodes']['total'])
+        for page in remaining:
+            episodes += page['items']
+        return episodes
@@ -0,0 +1,194 @@
+# cli.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The command line client. It only uses the core package, so it runs on
+# machines without GTK or a display:
+#
+#   spotipyne-cli sync
+#   spotipyne-cli dump --with-playlist-tracks > library.jsonl
+#   spotipyne-cli prewarm-covers --rate 0
+#
+# Commands import what they need when they run, so --help stays instant.
+
+import argparse
+import json
+import os
+import sys
+
+# The sizes the app shows covers in: list rows and page headers.
+ROW_COVER_SIZE = 60
+HEADER_COVER_SIZE = 128
+
+
+def write_json_line(record, out):
+    out.write(json.dumps(record) + '\n')
+    # Consumers read the stream as it comes, e.g. piped into jq.
+    out.flush()
+
+
+def sync(args):
+    from .library import Library
+
+    def progress(count):
+        if count % 500 == 0:
+            print(str(count) + " records...", file=sys.stderr)
+    path = Library.sync(args.with_playlist_tracks, progress)
+    print("Library saved to " + path, file=sys.stderr)
+    return 0
+
+
+def dump(args):
+    from .library import Library
+
+    if args.snapshot:
+        records = Library.iter_snapshot()
+    else:
+        records = Library.iter_records(args.with_playlist_tracks)
+    for record in records:
+        write_json_line(record, sys.stdout)
+    return 0
+
+
+def wanted_cover_urls(records):
+    from .coverStore import get_desired_image_for_size
+
+    wanted = {}
+    for record in records:
+        if record['type'] == 'playlist':
+            images = record['playlist']['images']
+            sizes = (ROW_COVER_SIZE, HEADER_COVER_SIZE)
+        else:
+            images = record['track']['album']['images']
+            sizes = (ROW_COVER_SIZE,)
+        for size in sizes:
+            url, _dim = get_desired_image_for_size(size, images or [])
+            if url is not None:
+                wanted[url] = None
+    return list(wanted)
+
+
+async def fetch_covers(urls, rate):
+    import asyncio
+
+    from .coverStore import CoverDownloadError, CoverStore, download_to_file
+    from .ioEngine import IoEngine
+    from .throttle import TokenBucket
+
+    store = CoverStore.get_default()
+    bucket = TokenBucket(rate) if rate > 0 else None
+    missing = [url for url in urls if not store.has(url)]
+    failed = 0
+
+    async def fetch(url):
+        nonlocal failed
+        try:
+            path = await IoEngine.get().run(store.fetch, url, download_to_file)
+        except CoverDownloadError as e:
+            print(e, file=sys.stderr)
+            failed += 1
+            return
+        if bucket:
+            await bucket.consume(os.path.getsize(path))
+
+    if bucket:
+        for url in missing:
+            await fetch(url)
+    else:
+        # IoEngine keeps this to MAX_CONNECTIONS requests at a time.
+        await asyncio.gather(*[fetch(url) for url in missing])
+    return len(missing) - failed, failed
+
+
+def prewarm_covers(args):
+    from .ioEngine import IoEngine
+    from .library import Library
+
+    if args.snapshot:
+        records = list(Library.iter_snapshot())
+    else:
+        records = list(Library.iter_records())
+    urls = wanted_cover_urls(records)
+    fetched, failed = IoEngine.get().spawn(
+        fetch_covers(urls, args.rate)).result()
+    print("{} covers wanted, {} downloaded, {} failed".format(
+        len(urls), fetched, failed), file=sys.stderr)
+    return 1 if failed else 0
+
+
+def now_playing(args):
+    from .playbackState import PlaybackState
+    from .spotify import Spotify as sp
+
+    state = PlaybackState.from_response(
+        PlaybackState.CURRENT_PLAYBACK.request(sp.get().current_playback))
+    write_json_line(state.to_dict(), sys.stdout)
+    return 0
+
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(
+        prog='spotipyne-cli',
+        description="Headless access to the Spotipyne library and caches.")
+    parser.add_argument(
+        '--username',
+        help="Spotify user name, only needed before the first login.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sync_parser = commands.add_parser(
+        'sync', help="Fetch the library and save it as a snapshot.")
+    sync_parser.add_argument('--with-playlist-tracks', action='store_true')
+    sync_parser.set_defaults(function=sync)
+
+    dump_parser = commands.add_parser(
+        'dump', help="Write the library to stdout as JSON lines.")
+    dump_parser.add_argument('--with-playlist-tracks', action='store_true')
+    dump_parser.add_argument(
+        '--snapshot', action='store_true',
+        help="Read the last synced snapshot instead of the Web API.")
+    dump_parser.set_defaults(function=dump)
+
+    prewarm_parser = commands.add_parser(
+        'prewarm-covers',
+        help="Download the covers of playlists and Liked Songs.")
+    prewarm_parser.add_argument(
+        '--rate', type=int, default=0,
+        help="Bytes per second, 0 for no limit (default: 0)")
+    prewarm_parser.add_argument(
+        '--snapshot', action='store_true',
+        help="Take the covers from the last synced snapshot.")
+    prewarm_parser.set_defaults(function=prewarm_covers)
+
+    now_playing_parser = commands.add_parser(
+        'now-playing', help="Print the playback state as JSON.")
+    now_playing_parser.set_defaults(function=now_playing)
+    return parser
+
+
+def main(version=None, argv=None):
+    args = build_argument_parser().parse_args(argv)
+    if args.username:
+        from .spotify import Spotify
+        Spotify.set_username_backup(args.username)
+    try:
+        return args.function(args)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # The reader went away, e.g. "dump | head". Nothing may be flushed
+        # to it on exit either.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
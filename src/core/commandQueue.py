@@ -0,0 +1,80 @@
+# commandQueue.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import threading
+
+from .ioEngine import IoEngine
+from .metrics import Metrics
+
+
+class CommandQueue:
+    """Sends player commands one at a time, in the order of their keys.
+
+    A key names one kind of intent: 'start' for starting a track or
+    context, 'play_state' for play/pause, 'transfer' for switching the
+    device. A command put while an earlier one with the same key still
+    waits replaces it, so rapid play/pause toggles end in one call for
+    the final state instead of one call per click, while a pending track
+    start survives a play/pause click. A command equal to the one that
+    was just sent is dropped.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        with cls.__instance_lock:
+            if not cls.__instance:
+                cls.__instance = CommandQueue()
+            return cls.__instance
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()
+        self.running = False
+
+    def put(self, key, function, *args, **kwargs):
+        with self.lock:
+            if key in self.pending:
+                Metrics.inc('commands.coalesced')
+            self.pending[key] = (function, args, kwargs)
+            self.pending.move_to_end(key)
+            if self.running:
+                return
+            self.running = True
+        IoEngine.get().submit(self.__drain)
+
+    def __drain(self):
+        last = None
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.running = False
+                    return
+                key, command = self.pending.popitem(last=False)
+            if (key, command) == last:
+                Metrics.inc('commands.coalesced')
+                continue
+            last = (key, command)
+            function, args, kwargs = command
+            Metrics.inc('commands.sent')
+            try:
+                function(*args, **kwargs)
+            except Exception as e:
+                print(e)
@@ -0,0 +1,66 @@
+# connectivity.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+from .metrics import Metrics
+
+
+class OfflineError(Exception):
+    """Raised instead of sending a request that cannot get through."""
+
+    def __init__(self, what):
+        super().__init__("Offline, not requesting " + what)
+
+
+class Connectivity:
+    """Whether the Spotify servers can be reached.
+
+    The GTK app feeds this from Gio.NetworkMonitor, see networkWatcher.py;
+    without it, e.g. in the command line client, it is always online.
+    Listeners are called with the new state, on the thread that set it.
+    """
+
+    __lock = threading.Lock()
+    __online = True
+    __listeners = []
+
+    @classmethod
+    def is_online(cls):
+        return cls.__online
+
+    @classmethod
+    def check(cls, what):
+        if not cls.__online:
+            Metrics.inc('offline.skipped_requests')
+            raise OfflineError(what)
+
+    @classmethod
+    def add_listener(cls, listener):
+        with cls.__lock:
+            cls.__listeners.append(listener)
+
+    @classmethod
+    def set_online(cls, online):
+        with cls.__lock:
+            if online == cls.__online:
+                return
+            cls.__online = online
+            listeners = list(cls.__listeners)
+        Metrics.inc('offline.went_online' if online else 'offline.went_offline')
+        for listener in listeners:
+            listener(online)
@@ -0,0 +1,257 @@
+# coverStore.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import requests
+from xdg import BaseDirectory
+
+from .bandwidthProfile import BandwidthProfile
+from .config import Config
+from .ioEngine import IoEngine
+from .metrics import Metrics
+
+
+def cover_hash(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def get_desired_image_for_size(desired_size, image_responses):
+    if BandwidthProfile.is_enabled():
+        url, dimensions = get_smallest_image(image_responses)
+        if url is not None:
+            return url, dimensions
+    image_responses = sorted(image_responses, key=lambda img: img['width'])
+    for image in image_responses:
+        if image['width'] is None or image['height'] is None:
+            continue
+        smaller = image['height'] \
+            if image['width'] > image['height'] \
+            else image['width']
+        if smaller >= desired_size:
+            return image['url'], Dimensions(
+                image['width'],
+                image['height'],
+                image['width'] == image['height']
+            )
+    try:
+        if image_responses[-1]:
+            image = image_responses[-1]
+            return image['url'], Dimensions(
+                image['width'],
+                image['height'],
+                image['width'] == image['height']
+            )
+    except IndexError:
+        pass
+    return None, Dimensions(desired_size, desired_size, True)
+
+
+def get_smallest_image(image_responses):
+    known_sizes = [image for image in image_responses
+                   if image['width'] is not None and image['height'] is not None]
+    if not known_sizes:
+        return None, None
+    image = min(known_sizes, key=lambda img: img['width'])
+    return image['url'], Dimensions(
+        image['width'],
+        image['height'],
+        image['width'] == image['height']
+    )
+
+
+class CoverDownloadError(Exception):
+
+    def __init__(self, url, reason, permanent):
+        super().__init__(reason + ": " + url)
+        self.url = url
+        self.permanent = permanent
+
+
+def download_to_file(url, toFile):
+    try:
+        with Metrics.timed_ms('covers.download_ms'):
+            response = IoEngine.get().http_session.get(url, timeout=30)
+    except requests.RequestException as e:
+        raise CoverDownloadError(url, str(e), permanent=False)
+    Metrics.inc('covers.downloads')
+    Metrics.inc('covers.bytes_downloaded', len(response.content))
+    BandwidthProfile.count_received(len(response.content))
+    if response.status_code != 200:
+        # Rate limits and server errors may go away, everything else won't.
+        permanent = response.status_code != 429 and response.status_code < 500
+        raise CoverDownloadError(
+            url, "HTTP " + str(response.status_code), permanent)
+    content_type = response.headers.get('Content-Type', '')
+    if not content_type.startswith('image/'):
+        raise CoverDownloadError(
+            url, "Not an image (" + content_type + ")", permanent=True)
+    # Unique per process and thread, another instance may download the
+    # same URL into the same store.
+    temp_file = toFile + "." + str(os.getpid()) + "." + \
+        str(threading.get_ident()) + ".part"
+    with open(temp_file, 'wb') as cover_file:
+        cover_file.write(response.content)
+    os.replace(temp_file, toFile)
+
+
+def get_thumbnail_key(image_url, dim):
+    return cover_hash(image_url) + ":" + str(dim)
+
+
+class Dimensions:
+
+    def __key(self):
+        return (self.width, self.height, self.be_square)
+
+    def __hash__(self):
+        return hash(self.__key())
+
+    def __eq__(self, other):
+        if isinstance(other, Dimensions):
+            return self.__key() == other.__key()
+        return NotImplemented
+
+    def __gt__(self, other):
+        if self.width is None or self.height is None:
+            return True
+        if other.width is None or other.height is None:
+            return False
+        return self.width > other.width and self.height > other.height
+
+    def __ge__(self, other):
+        return self.__gt__(other) or self.__eq__(other)
+
+    def __lt__(self, other):
+        if self.width is None or self.height is None:
+            return False
+        if other.width is None or other.height is None:
+            return True
+        return self.width < other.width and self.height < other.height
+
+    def __le__(self, other):
+        return self.__lt__(other) or self.__eq__(other)
+
+    def __init__(self, width, height, be_square=False):
+        self.width = width
+        self.height = height
+        if be_square:
+            self.height = self.width
+        self.be_square = be_square
+
+    def __str__(self):
+        return str(self.width) + "x" + str(self.height) + "x" + str(self.be_square)
+
+
+class CoverStore:
+    """Downloaded covers, stored once per image URL.
+
+    Albums, their tracks and playlists showing the same artwork share one
+    file named after the hash of the image URL. Which images belong to a
+    URI is kept in a small SQLite table next to it. Several app instances
+    can share the directory: downloads of the same URL are serialized with
+    a lock file and every file appears through an atomic rename.
+    """
+
+    __default = None
+    __default_lock = threading.Lock()
+
+    @classmethod
+    def get_default(cls):
+        with cls.__default_lock:
+            if not cls.__default:
+                cls.__default = CoverStore(BaseDirectory.save_cache_path(
+                    Config.applicationID + '/covers'))
+            return cls.__default
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'locks'), exist_ok=True)
+        self.__db_lock = threading.Lock()
+        self.__db = sqlite3.connect(
+            os.path.join(directory, 'uris.sqlite'),
+            timeout=10,
+            check_same_thread=False)
+        with self.__db:
+            self.__db.execute(
+                'CREATE TABLE IF NOT EXISTS uri_images '
+                '(uri TEXT PRIMARY KEY, images TEXT NOT NULL)')
+        self.__remembered = {}
+
+    def path_for_hash(self, image_hash):
+        return os.path.join(self.directory, image_hash)
+
+    def path_for_url(self, url):
+        return self.path_for_hash(cover_hash(url))
+
+    def has(self, url):
+        return os.path.isfile(self.path_for_url(url))
+
+    @contextmanager
+    def locked(self, url):
+        """Held while a URL is downloaded, across processes.
+
+        URLs share 256 lock files by hash prefix, so nothing has to clean
+        them up.
+        """
+        lock_path = os.path.join(
+            self.directory, 'locks', cover_hash(url)[:2])
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def fetch(self, url, download_function):
+        """Returns the path of the cover, downloading it if nobody has yet.
+
+        download_function(url, path) has to write path atomically.
+        """
+        path = self.path_for_url(url)
+        if os.path.isfile(path):
+            return path
+        with self.locked(url):
+            # Another thread or process may have finished it meanwhile.
+            if os.path.isfile(path):
+                Metrics.inc('covers.shared_downloads_avoided')
+                return path
+            download_function(url, path)
+        return path
+
+    def remember(self, uri, images):
+        if not images or self.__remembered.get(uri) == images:
+            return
+        with self.__db_lock:
+            with self.__db:
+                self.__db.execute(
+                    'INSERT OR REPLACE INTO uri_images VALUES (?, ?)',
+                    (uri, json.dumps(images)))
+            self.__remembered[uri] = images
+
+    def lookup(self, uri):
+        with self.__db_lock:
+            row = self.__db.execute(
+                'SELECT images FROM uri_images WHERE uri = ?',
+                (uri,)).fetchone()
+        return json.loads(row[0]) if row else None
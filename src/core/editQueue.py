@@ -0,0 +1,179 @@
+# editQueue.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import threading
+
+from xdg import BaseDirectory
+
+from .config import Config
+from .connectivity import Connectivity
+from .ioEngine import IoEngine
+from .library import Library
+from .metrics import Metrics
+from .spotify import Spotify as sp
+
+
+class EditQueue:
+    """Library edits made while offline, kept on disk until they can be
+    sent.
+
+    Edits are replayed in the order they were made when the network comes
+    back, or on the next start. Each one is checked against the library
+    first: tracks that are already saved are not saved again, tracks that
+    are already gone are not removed, and tracks already in a playlist are
+    not added twice. An edit the server refuses for good is dropped. One
+    that fails for any other reason, e.g. the network, a rate limit or a
+    server error, stays queued with everything after it.
+    """
+
+    SAVE = 'save'
+    REMOVE = 'remove'
+    PLAYLIST_ADD = 'playlist_add'
+
+    SAVED_TRACKS_BATCH = 50
+    PLAYLIST_BATCH = 100
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        with cls.__instance_lock:
+            if not cls.__instance:
+                cls.__instance = EditQueue()
+            return cls.__instance
+
+    def __init__(self, path=None):
+        self.path = path or BaseDirectory.save_cache_path(
+            Config.applicationID) + '/pending_edits.jsonl'
+        # lock guards the file, __replay_lock keeps replays one at a time.
+        # Requests go out with only the latter held, so put() never waits
+        # for the network.
+        self.lock = threading.Lock()
+        self.__replay_lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        """Replays what an earlier session left, and again whenever the
+        network comes back."""
+        if self.started:
+            return
+        self.started = True
+
+        def on_connectivity_changed(online):
+            if online:
+                IoEngine.get().submit(self.replay)
+        Connectivity.add_listener(on_connectivity_changed)
+        on_connectivity_changed(Connectivity.is_online())
+
+    def put(self, kind, uris, playlist_id=None):
+        with self.lock:
+            with open(self.path, 'a') as queue_file:
+                queue_file.write(json.dumps({
+                    'kind': kind,
+                    'uris': list(uris),
+                    'playlist_id': playlist_id}) + '\n')
+                queue_file.flush()
+                os.fsync(queue_file.fileno())
+        Metrics.inc('offline.queued_edits')
+
+    def pending(self):
+        try:
+            with open(self.path, 'r') as queue_file:
+                return [json.loads(line) for line in queue_file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def __write(self, edits):
+        if not edits:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        with tempfile.NamedTemporaryFile(
+                'w', dir=os.path.dirname(self.path),
+                prefix=os.path.basename(self.path) + '.', suffix='.part',
+                delete=False) as queue_file:
+            for edit in edits:
+                queue_file.write(json.dumps(edit) + '\n')
+        os.replace(queue_file.name, self.path)
+
+    def replay(self):
+        """Sends the queued edits in order, returns how many went out."""
+        with self.__replay_lock:
+            with self.lock:
+                edits = self.pending()
+            sent = 0
+            for edit in edits:
+                try:
+                    self.__apply(edit)
+                    Metrics.inc('offline.replayed_edits')
+                except Exception as e:
+                    print(e)
+                    if not self.is_permanent(e):
+                        # Offline again, rate limited or a server error:
+                        # the edit is still to be made, and so is
+                        # everything after it.
+                        break
+                    Metrics.inc('offline.dropped_edits')
+                sent += 1
+            with self.lock:
+                # put() only appends, edits queued meanwhile follow the
+                # ones read above.
+                self.__write(self.pending()[sent:])
+            return sent
+
+    @staticmethod
+    def is_permanent(error):
+        """Only a 4xx refusal means the edit will never go through. 401
+        (an expired token), 408 and 429 go away again."""
+        status = getattr(error, 'http_status', None)
+        return status is not None and 400 <= status < 500 and \
+            status not in (401, 408, 429)
+
+    @staticmethod
+    def __chunks(items, size):
+        return [items[start:start + size]
+                for start in range(0, len(items), size)]
+
+    def __saved_flags(self, uris):
+        flags = []
+        for chunk in self.__chunks(uris, self.SAVED_TRACKS_BATCH):
+            flags += sp.get().current_user_saved_tracks_contains(chunk)
+        return flags
+
+    def __apply(self, edit):
+        uris = edit['uris']
+        if edit['kind'] == self.SAVE:
+            missing = [uri for uri, saved in zip(uris, self.__saved_flags(uris))
+                       if not saved]
+            for chunk in self.__chunks(missing, self.SAVED_TRACKS_BATCH):
+                sp.get().current_user_saved_tracks_add(chunk)
+        elif edit['kind'] == self.REMOVE:
+            present = [uri for uri, saved in zip(uris, self.__saved_flags(uris))
+                       if saved]
+            for chunk in self.__chunks(present, self.SAVED_TRACKS_BATCH):
+                sp.get().current_user_saved_tracks_delete(chunk)
+        elif edit['kind'] == self.PLAYLIST_ADD:
+            playlist_id = edit['playlist_id']
+            known = {track['uri']
+                     for track in Library.iter_playlist_tracks(playlist_id)}
+            missing = [uri for uri in uris if uri not in known]
+            for chunk in self.__chunks(missing, self.PLAYLIST_BATCH):
+                sp.get().playlist_add_items(playlist_id, chunk)
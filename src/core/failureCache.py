@@ -0,0 +1,74 @@
+# failureCache.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+from .metrics import Metrics
+
+
+class FailureCache:
+    """Remembers failing downloads so they are not retried on every row.
+
+    Transient failures (network errors, 5xx, rate limits) back off
+    exponentially. Permanent ones (other 4xx, responses that are no image)
+    are not retried before the negative cache TTL has passed.
+    """
+
+    BASE_BACKOFF_S = 30
+    MAX_BACKOFF_S = 6 * 60 * 60
+    NEGATIVE_TTL_S = 24 * 60 * 60
+
+    class Failure:
+
+        __slots__ = ('count', 'retry_at')
+
+        def __init__(self):
+            self.count = 0
+            self.retry_at = 0.0
+
+    def __init__(self, clock=time.monotonic):
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__failures = {}
+
+    def record_failure(self, key, permanent=False):
+        with self.__lock:
+            failure = self.__failures.get(key)
+            if failure is None:
+                failure = self.__failures[key] = self.Failure()
+            failure.count += 1
+            if permanent:
+                delay = self.NEGATIVE_TTL_S
+            else:
+                delay = min(
+                    self.BASE_BACKOFF_S * 2 ** (failure.count - 1),
+                    self.MAX_BACKOFF_S)
+            failure.retry_at = self.__clock() + delay
+        Metrics.inc('failures.recorded')
+
+    def record_success(self, key):
+        with self.__lock:
+            self.__failures.pop(key, None)
+
+    def should_skip(self, key):
+        with self.__lock:
+            failure = self.__failures.get(key)
+            skip = failure is not None and self.__clock() < failure.retry_at
+        if skip:
+            Metrics.inc('failures.skipped')
+        return skip
@@ -0,0 +1,185 @@
+# ioEngine.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import Metrics
+
+
+class RequestGroup(threading.Event):
+    """A stop event that also cancels the requests submitted with it.
+
+    Pages keep one of these as their page_stop_event, so leaving a page
+    cancels whatever it still has queued.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.__futures_lock = threading.Lock()
+        self.__futures = set()
+
+    def add(self, future):
+        with self.__futures_lock:
+            if self.is_set():
+                future.cancel()
+                return
+            self.__futures.add(future)
+        future.add_done_callback(self.__discard)
+
+    def __discard(self, future):
+        with self.__futures_lock:
+            self.__futures.discard(future)
+
+    def set(self):
+        super().set()
+        with self.__futures_lock:
+            futures = list(self.__futures)
+            self.__futures.clear()
+        for future in futures:
+            if future.cancel():
+                Metrics.inc('io.cancelled')
+
+
+class SlotSession(requests.Session):
+    """A requests session that holds one of a fixed number of slots for
+    every single request, from sending it until its body has been read."""
+
+    def __init__(self, slots):
+        super().__init__()
+        self.slots = slots
+
+    def request(self, *args, **kwargs):
+        Metrics.inc('io.queued')
+        with self.slots:
+            Metrics.inc('io.started')
+            return super().request(*args, **kwargs)
+
+
+class IoEngine:
+    """Runs all network I/O from one asyncio loop on a dedicated thread.
+
+    The HTTP libraries in use (spotipy, requests) are blocking, so jobs run
+    on a thread pool. All of them, API calls and cover downloads alike,
+    share the one http_session, which lets at most MAX_CONNECTIONS requests
+    be on the wire at a time. A slot is held per request, not per job, so
+    a long pagination leaves room between its pages for the playback poll.
+    """
+
+    MAX_CONNECTIONS = 8
+    # spotipy only sets up its own retries when it builds the session, so
+    # the shared one has to bring them along: rate limits and transient
+    # server errors are retried after Retry-After or a short backoff.
+    RETRIES = 3
+    RETRY_BACKOFF_FACTOR = 0.3
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    # Jobs mostly wait for a slot or for the network, not for the CPU.
+    MAX_WORKERS = 32
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        with cls.__instance_lock:
+            if not cls.__instance:
+                cls.__instance = IoEngine()
+            return cls.__instance
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.__engine_thread = threading.local()
+        self.__executor = ThreadPoolExecutor(
+            max_workers=self.MAX_WORKERS, thread_name_prefix='io',
+            initializer=self.__mark_engine_thread)
+        self.http_session = self.create_session(
+            threading.BoundedSemaphore(self.MAX_CONNECTIONS))
+        started = threading.Event()
+
+        def run_loop():
+            self.__mark_engine_thread()
+            asyncio.set_event_loop(self.loop)
+            started.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=run_loop, daemon=True, name='io-loop').start()
+        started.wait()
+
+    def __mark_engine_thread(self):
+        self.__engine_thread.active = True
+
+    def in_engine_thread(self):
+        return getattr(self.__engine_thread, 'active', False)
+
+    @classmethod
+    def create_session(cls, slots):
+        session = SlotSession(slots)
+        retry = Retry(
+            total=cls.RETRIES,
+            backoff_factor=cls.RETRY_BACKOFF_FACTOR,
+            status_forcelist=cls.RETRY_STATUSES,
+            allowed_methods=False,
+            respect_retry_after_header=True)
+        adapter = HTTPAdapter(
+            pool_connections=cls.MAX_CONNECTIONS,
+            pool_maxsize=cls.MAX_CONNECTIONS,
+            max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    async def run(self, function, *args, **kwargs):
+        """Awaitable that runs a blocking call on the I/O threads."""
+        return await self.loop.run_in_executor(
+            self.__executor, partial(function, *args, **kwargs))
+
+    def call(self, function, *args, **kwargs):
+        """Runs a blocking call on the I/O threads and waits for it, for
+        threads that are not part of the IoEngine. Exceptions are raised
+        here instead of being reported."""
+        if self.in_engine_thread():
+            # Blocking here would hold an I/O thread, or the loop itself,
+            # until a job queued behind it is done.
+            raise RuntimeError(
+                "IoEngine.call() from an I/O thread, await run() instead")
+        return asyncio.run_coroutine_threadsafe(
+            self.run(function, *args, **kwargs), self.loop).result()
+
+    def spawn(self, coroutine, group=None):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        future.add_done_callback(self.__report_exception)
+        if group is not None:
+            group.add(future)
+        return future
+
+    def submit(self, function, *args, group=None, **kwargs):
+        """Runs a blocking call from any thread, returns a Future."""
+        return self.spawn(self.run(function, *args, **kwargs), group)
+
+    def __report_exception(self, future):
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None:
+            Metrics.inc('io.errors')
+            print(exception)
@@ -0,0 +1,304 @@
+# library.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import threading
+import time
+
+from xdg import BaseDirectory
+
+from . import rowModels
+from .bandwidthProfile import BandwidthProfile
+from .config import Config
+from .metrics import Metrics
+from .connectivity import Connectivity, OfflineError
+from .projection import Projection
+from .spotify import Spotify as sp
+from .trackStore import TrackStore
+
+
+def iter_responses(projection, call, *args, page_size=50, **kwargs):
+    """Yields every page of a paginated endpoint, in order, requesting
+    the next one only when asked for it.
+
+    The projection has to keep 'next', which is how the end is found.
+    """
+    offset = 0
+    while True:
+        response = projection.request(
+            call, *args, limit=page_size, offset=offset, **kwargs)
+        yield response
+        if response['next'] is None:
+            return
+        offset += page_size
+
+
+def iter_pages(projection, call, *args, page_size=50, **kwargs):
+    """Yields the items of every page of a paginated endpoint, in order."""
+    for response in iter_responses(
+            projection, call, *args, page_size=page_size, **kwargs):
+        yield response['items']
+
+
+def saved_item_key(item):
+    # A track saved again later is a new item.
+    return (item['track'] or {}).get('uri'), item['added_at']
+
+
+class Library:
+    """The user's playlists and Liked Songs, without any UI.
+
+    The GTK pages and the command line client both read the library
+    through this. Every list fetched with a get_ method is kept on disk
+    and served from there while offline.
+    """
+
+    USER_PLAYLISTS = Projection(
+        'user_playlists',
+        'items(' + rowModels.PLAYLIST_FIELDS + ',snapshot_id),next')
+    SAVED_TRACKS = Projection(
+        'saved_tracks',
+        'items(added_at,track(' + rowModels.TRACK_FIELDS + ')),next,total')
+    PLAYLIST_TRACKS = Projection(
+        'playlist_tracks',
+        'items(track(' + rowModels.TRACK_FIELDS + ')),next',
+        server_side=True)
+    PLAYLIST_INFO = Projection(
+        'playlist',
+        'name,images,followers(total),owner(display_name)',
+        server_side=True)
+    # Catches a removal and an addition in between that leave the count
+    # unchanged.
+    FULL_SYNC_INTERVAL_S = 24 * 60 * 60
+
+    @classmethod
+    def iter_playlists(cls):
+        for items in iter_pages(
+                cls.USER_PLAYLISTS, sp.get().current_user_playlists):
+            yield from items
+
+    @classmethod
+    def iter_saved_tracks(cls):
+        for items in iter_pages(
+                cls.SAVED_TRACKS, sp.get().current_user_saved_tracks):
+            for item in items:
+                if item['track'] is not None:
+                    yield item['track']
+
+    @classmethod
+    def iter_playlist_tracks(cls, playlist_id):
+        for items in iter_pages(
+                cls.PLAYLIST_TRACKS, sp.get().playlist_tracks,
+                page_size=100, playlist_id=playlist_id):
+            for item in items:
+                if item['track'] is not None:
+                    yield item['track']
+
+    @classmethod
+    def get_cache_path(cls, name):
+        return BaseDirectory.save_cache_path(
+            Config.applicationID, 'library') + '/' + name + '.json'
+
+    @classmethod
+    def __load_cache(cls, name):
+        try:
+            with open(cls.get_cache_path(name), 'r') as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @classmethod
+    def __prefer_cache(cls, name):
+        """On metered connections a recent enough copy beats a download."""
+        if not BandwidthProfile.is_enabled():
+            return False
+        try:
+            age = time.time() - os.path.getmtime(cls.get_cache_path(name))
+        except OSError:
+            return False
+        return age < BandwidthProfile.CACHE_MAX_AGE_S
+
+    @classmethod
+    def __store_cache(cls, name, value):
+        path = cls.get_cache_path(name)
+        temp_path = path + '.' + str(os.getpid()) + '.' + \
+            str(threading.get_ident()) + '.part'
+        try:
+            with open(temp_path, 'w') as cache_file:
+                json.dump(value, cache_file)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(e)
+
+    @classmethod
+    def __cached(cls, name, fetch):
+        if not Connectivity.is_online():
+            value = cls.__load_cache(name)
+            if value is None:
+                raise OfflineError(name)
+            return value
+        if cls.__prefer_cache(name):
+            value = cls.__load_cache(name)
+            if value is not None:
+                Metrics.inc('library.metered_cache_hits')
+                return value
+        value = fetch()
+        cls.__store_cache(name, value)
+        return value
+
+    @classmethod
+    def get_playlists(cls):
+        return cls.__cached('playlists', lambda: list(cls.iter_playlists()))
+
+    @classmethod
+    def __fetch_new_saved_items(cls, known):
+        """The saved items added since the newest known one, newest first,
+        the total, and whether a known item was reached at all."""
+        new_items = []
+        total = 0
+        for response in iter_responses(
+                cls.SAVED_TRACKS, sp.get().current_user_saved_tracks):
+            total = response['total']
+            for item in response['items']:
+                if saved_item_key(item) in known:
+                    return new_items, total, True
+                new_items.append(item)
+        return new_items, total, False
+
+    @classmethod
+    def sync_saved_items(cls):
+        """Brings the cached Liked Songs up to date, returns their items.
+
+        Saved tracks come newest first, so only the pages down to the
+        first known item are requested. The total that comes with the
+        first page tells whether tracks were removed meanwhile, only then
+        or once a day is everything fetched again.
+        """
+        cached = cls.__load_cache('liked_songs')
+        if not Connectivity.is_online():
+            if cached is None:
+                raise OfflineError('saved_tracks')
+            return cached['items']
+        if cached is not None and cls.__prefer_cache('liked_songs'):
+            Metrics.inc('library.metered_cache_hits')
+            return cached['items']
+        # A metered connection only pays for a full sync on a removal.
+        if cached is not None and (
+                BandwidthProfile.is_enabled() or
+                time.time() - cached['synced_at'] < cls.FULL_SYNC_INTERVAL_S):
+            new_items, total, reached_known = cls.__fetch_new_saved_items(
+                {saved_item_key(item) for item in cached['items']})
+            if not reached_known:
+                # Everything was new, which is a full sync already.
+                Metrics.inc('library.saved_tracks_full_syncs')
+                cls.__store_cache(
+                    'liked_songs',
+                    {'synced_at': time.time(), 'items': new_items})
+                return new_items
+            if total == len(new_items) + len(cached['items']):
+                Metrics.inc('library.saved_tracks_incremental_syncs')
+                Metrics.inc('library.saved_tracks_new', len(new_items))
+                cached['items'] = new_items + cached['items']
+                cls.__store_cache('liked_songs', cached)
+                return cached['items']
+        Metrics.inc('library.saved_tracks_full_syncs')
+        items = []
+        for response in iter_responses(
+                cls.SAVED_TRACKS, sp.get().current_user_saved_tracks):
+            items += response['items']
+        cls.__store_cache(
+            'liked_songs', {'synced_at': time.time(), 'items': items})
+        return items
+
+    @classmethod
+    def get_saved_tracks(cls):
+        all_tracks = TrackStore()
+        all_tracks.extend(
+            item['track'] for item in cls.sync_saved_items()
+            if item['track'] is not None)
+        return all_tracks
+
+    @classmethod
+    def get_playlist_tracks(cls, playlist_id):
+        all_tracks = TrackStore()
+        all_tracks.extend(cls.__cached(
+            'playlist_tracks.' + playlist_id,
+            lambda: list(cls.iter_playlist_tracks(playlist_id))))
+        return all_tracks
+
+    @classmethod
+    def get_playlist_info(cls, playlist_id):
+        return cls.__cached(
+            'playlist.' + playlist_id,
+            lambda: cls.PLAYLIST_INFO.request(sp.get().playlist, playlist_id))
+
+    @classmethod
+    def iter_records(cls, with_playlist_tracks=False):
+        """The whole library as flat records, streamed as it is fetched.
+
+        Every record is a dict with a 'type' of 'playlist', 'saved_track'
+        or 'playlist_track'.
+        """
+        for playlist in cls.iter_playlists():
+            yield {'type': 'playlist', 'playlist': playlist}
+            if with_playlist_tracks:
+                playlist_id = playlist['uri'].split(':')[-1]
+                for track in cls.iter_playlist_tracks(playlist_id):
+                    yield {
+                        'type': 'playlist_track',
+                        'playlist_uri': playlist['uri'],
+                        'track': track}
+        for track in cls.iter_saved_tracks():
+            yield {'type': 'saved_track', 'track': track}
+
+    @classmethod
+    def get_snapshot_path(cls):
+        return BaseDirectory.save_cache_path(
+            Config.applicationID) + '/library.jsonl'
+
+    @classmethod
+    def sync(cls, with_playlist_tracks=False, progress_callback=None):
+        """Writes the library to the snapshot file, returns the path.
+
+        The snapshot is replaced at once when complete, readers never see
+        half of it.
+        """
+        path = cls.get_snapshot_path()
+        temp_path = path + '.' + str(os.getpid()) + '.part'
+        count = 0
+        try:
+            with open(temp_path, 'w') as snapshot_file:
+                for record in cls.iter_records(with_playlist_tracks):
+                    snapshot_file.write(json.dumps(record) + '\n')
+                    count += 1
+                    if progress_callback:
+                        progress_callback(count)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return path
+
+    @classmethod
+    def iter_snapshot(cls):
+        try:
+            with open(cls.get_snapshot_path(), 'r') as snapshot_file:
+                for line in snapshot_file:
+                    yield json.loads(line)
+        except FileNotFoundError:
+            return
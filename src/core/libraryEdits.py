@@ -0,0 +1,161 @@
+# libraryEdits.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from .connectivity import OfflineError
+from .editQueue import EditQueue
+from .ioEngine import IoEngine
+from .metrics import Metrics
+from .spotify import Spotify as sp
+from .throttle import TokenBucket
+
+
+class EditResult:
+    """How far a bulk edit got. The uris of failed batches are kept, so
+    they can be sent again, queued ones wait in the EditQueue."""
+
+    __slots__ = ('total', 'done', 'queued', 'failed')
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.queued = 0
+        self.failed = []
+
+    def fraction(self):
+        return (self.done + self.queued + len(self.failed)) / \
+            max(1, self.total)
+
+    def summary(self, verb):
+        if self.queued == self.total:
+            return 'Offline, ' + str(self.queued) + ' tracks queued'
+        text = verb + ' ' + str(self.done) + ' tracks'
+        if self.done != self.total:
+            text = verb + ' ' + str(self.done) + ' of ' + \
+                str(self.total) + ' tracks'
+        if self.queued:
+            text += ', ' + str(self.queued) + ' queued'
+        if self.failed:
+            text += ', ' + str(len(self.failed)) + ' failed'
+        return text
+
+
+class LibraryEdits:
+    """Saves, removes and adds many tracks at once, in as few requests as
+    the API allows.
+
+    Liked Songs batches are independent of each other and several of them
+    are on the wire at a time, within the request slots of the IoEngine.
+    Playlist batches go one after another, so the tracks keep their order.
+    All batches share one rate limit. A batch the API answers with 429
+    stops every batch for its Retry-After and is then sent again.
+    A failed batch does not stop the others, one that cannot go out
+    because the network is gone is queued in the EditQueue instead.
+    progress_callback is called with the EditResult after every batch, on
+    the I/O loop.
+    """
+
+    SAVED_TRACKS_BATCH = 50
+    PLAYLIST_BATCH = 100
+    # Leaves request slots for pages that load meanwhile.
+    MAX_IN_FLIGHT = 4
+    REQUESTS_PER_SECOND = 5
+    # Sends of a batch that keeps being rate limited, before it fails.
+    RATE_LIMITED_ATTEMPTS = 4
+    # When a 429 comes without Retry-After, e.g. after the session's own
+    # retries ran out.
+    DEFAULT_RETRY_AFTER_S = 5
+
+    rate_limit = TokenBucket(REQUESTS_PER_SECOND, burst=MAX_IN_FLIGHT)
+
+    @classmethod
+    def retry_after(cls, error):
+        """Seconds to wait if error is a rate limit, otherwise None."""
+        if getattr(error, 'http_status', None) != 429:
+            return None
+        headers = getattr(error, 'headers', None) or {}
+        try:
+            return max(0, int(headers.get('Retry-After')))
+        except (TypeError, ValueError):
+            return cls.DEFAULT_RETRY_AFTER_S
+
+    @classmethod
+    async def __send(cls, kind, call, args, batch, result,
+                     progress_callback):
+        Metrics.inc('edits.batches')
+        for attempt in range(1, cls.RATE_LIMITED_ATTEMPTS + 1):
+            await cls.rate_limit.consume(1)
+            try:
+                await IoEngine.get().run(call, *args, batch)
+                result.done += len(batch)
+            except OfflineError:
+                await IoEngine.get().run(
+                    EditQueue.get().put, kind, batch, *args)
+                result.queued += len(batch)
+            except Exception as e:
+                retry_after = cls.retry_after(e)
+                if retry_after is not None and \
+                        attempt < cls.RATE_LIMITED_ATTEMPTS:
+                    Metrics.inc('edits.rate_limited')
+                    cls.rate_limit.pause(retry_after)
+                    continue
+                print(e)
+                Metrics.inc('edits.failed_batches')
+                result.failed += batch
+            break
+        if progress_callback:
+            progress_callback(result)
+
+    @classmethod
+    async def __pipelined(cls, kind, call, uris, batch_size,
+                          progress_callback):
+        result = EditResult(len(uris))
+        in_flight = asyncio.Semaphore(cls.MAX_IN_FLIGHT)
+
+        async def send(batch):
+            async with in_flight:
+                await cls.__send(
+                    kind, call, (), batch, result, progress_callback)
+        await asyncio.gather(*[
+            send(uris[start:start + batch_size])
+            for start in range(0, len(uris), batch_size)])
+        return result
+
+    @classmethod
+    async def save_tracks(cls, uris, progress_callback=None):
+        return await cls.__pipelined(
+            EditQueue.SAVE, sp.get().current_user_saved_tracks_add, uris,
+            cls.SAVED_TRACKS_BATCH, progress_callback)
+
+    @classmethod
+    async def remove_tracks(cls, uris, progress_callback=None):
+        return await cls.__pipelined(
+            EditQueue.REMOVE, sp.get().current_user_saved_tracks_delete,
+            uris,
+            cls.SAVED_TRACKS_BATCH, progress_callback)
+
+    @classmethod
+    async def add_to_playlist(cls, playlist_id, uris, progress_callback=None):
+        result = EditResult(len(uris))
+        for start in range(0, len(uris), cls.PLAYLIST_BATCH):
+            await cls.__send(
+                EditQueue.PLAYLIST_ADD, sp.get().playlist_add_items,
+                (playlist_id,),
+                uris[start:start + cls.PLAYLIST_BATCH], result,
+                progress_callback)
+        return result
@@ -0,0 +1,177 @@
+# metrics.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import math
+import platform
+import threading
+import time
+from contextlib import contextmanager
+
+from xdg import BaseDirectory
+
+from .config import Config
+
+
+class Counter:
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.__lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+
+    # Buckets grow by a factor of two, which is plenty to tell a 5ms request
+    # from a 500ms one without keeping every sample around.
+    BUCKET_COUNT = 32
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * self.BUCKET_COUNT
+
+    def __bucket(self, value):
+        if value <= 1:
+            return 0
+        return min(int(math.log2(value)) + 1, self.BUCKET_COUNT - 1)
+
+    def observe(self, value):
+        with self.__lock:
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+            self.buckets[self.__bucket(value)] += 1
+
+    def percentile(self, fraction):
+        if self.count == 0:
+            return None
+        wanted = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= wanted:
+                return min(2 ** index, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+        }
+
+
+class Metrics:
+
+    __lock = threading.Lock()
+    __counters = {}
+    __histograms = {}
+    __started = time.time()
+
+    @classmethod
+    def counter(cls, name):
+        with cls.__lock:
+            if name not in cls.__counters:
+                cls.__counters[name] = Counter()
+            return cls.__counters[name]
+
+    @classmethod
+    def histogram(cls, name):
+        with cls.__lock:
+            if name not in cls.__histograms:
+                cls.__histograms[name] = Histogram()
+            return cls.__histograms[name]
+
+    @classmethod
+    def inc(cls, name, amount=1):
+        cls.counter(name).inc(amount)
+
+    @classmethod
+    def observe(cls, name, value):
+        cls.histogram(name).observe(value)
+
+    @classmethod
+    @contextmanager
+    def timed_ms(cls, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe(name, (time.perf_counter() - start) * 1000)
+
+    @classmethod
+    def snapshot(cls):
+        with cls.__lock:
+            counters = dict(cls.__counters)
+            histograms = dict(cls.__histograms)
+        return {
+            'host': platform.node(),
+            'version': getattr(Config, 'version', None),
+            'uptime_s': time.time() - cls.__started,
+            'counters': {
+                name: counter.snapshot()
+                for name, counter in sorted(counters.items())},
+            'histograms': {
+                name: histogram.snapshot()
+                for name, histogram in sorted(histograms.items())},
+        }
+
+    @classmethod
+    def format_text(cls):
+        snapshot = cls.snapshot()
+        lines = [
+            'host: ' + str(snapshot['host']),
+            'uptime: {:.0f}s'.format(snapshot['uptime_s']),
+            '',
+            'Counters']
+        for name, value in snapshot['counters'].items():
+            lines.append('  {:<48} {:>12}'.format(name, value))
+        lines += ['', 'Histograms (count / mean / p50 / p95 / max)']
+        for name, hist in snapshot['histograms'].items():
+            lines.append('  {:<48} {:>8} {:>10.1f} {:>8} {:>8} {:>10.1f}'.format(
+                name, hist['count'], hist['mean'] or 0.0,
+                hist['p50'] or 0, hist['p95'] or 0, hist['max'] or 0.0))
+        return '\n'.join(lines)
+
+    @classmethod
+    def dump_to_file(cls, path=None):
+        if path is None:
+            path = BaseDirectory.save_cache_path(
+                Config.applicationID + '/metrics')
+            path += '/metrics-{}-{}.json'.format(
+                platform.node(), time.strftime('%Y%m%d-%H%M%S'))
+        with open(path, "w") as metrics_file:
+            json.dump(cls.snapshot(), metrics_file, indent=2)
+        return path
@@ -0,0 +1,129 @@
+# playbackState.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .projection import Projection
+from .rowModels import join_artist_names
+
+
+MPRIS_LOOP_STATUS = {'None': 'off', 'Track': 'track', 'Playlist': 'context'}
+
+
+def mpris_track_uri(track_id):
+    """Newer clients report '/com/spotify/track/<id>' as mpris:trackid."""
+    if track_id.startswith('/com/spotify/'):
+        return 'spotify:' + track_id[len('/com/spotify/'):].replace('/', ':')
+    return track_id
+
+
+def mpris_art_url(art_url):
+    # Some client versions report a host that does not serve the images.
+    return art_url.replace(
+        'https://open.spotify.com/image/', 'https://i.scdn.co/image/')
+
+
+class PlaybackState:
+    """One poll of the player, as plain values.
+
+    SpotifyPlayback turns the differences between two states into GObject
+    signals, the command line client prints them.
+    """
+
+    CURRENT_PLAYBACK = Projection(
+        'current_playback',
+        'is_playing,repeat_state,shuffle_state,progress_ms,'
+        'item(uri,name,duration_ms,artists(name),album(images))')
+
+    __slots__ = ('has_playback', 'is_playing', 'repeat', 'shuffle',
+                 'progress_ms', 'track_uri', 'track_name', 'artists',
+                 'duration_ms', 'cover_images')
+
+    def __init__(self, has_playback=False, is_playing=None, repeat='off',
+                 shuffle=False, progress_ms=0, track_uri='', track_name='',
+                 artists='', duration_ms=1, cover_images=None):
+        self.has_playback = has_playback
+        self.is_playing = is_playing
+        self.repeat = repeat
+        self.shuffle = shuffle
+        self.progress_ms = progress_ms
+        self.track_uri = track_uri
+        self.track_name = track_name
+        self.artists = artists
+        self.duration_ms = duration_ms
+        self.cover_images = cover_images
+
+    @classmethod
+    def from_response(cls, response):
+        """response is a projected current_playback response or None."""
+        if not response:
+            return cls()
+        item = response['item']
+        if item is None:
+            # Playing something the API does not describe, e.g. an ad.
+            return cls(
+                has_playback=True,
+                is_playing=response['is_playing'],
+                repeat=response['repeat_state'],
+                shuffle=response['shuffle_state'])
+        return cls(
+            has_playback=True,
+            is_playing=response['is_playing'],
+            repeat=response['repeat_state'],
+            shuffle=response['shuffle_state'],
+            progress_ms=response['progress_ms'] or 0,
+            track_uri=item['uri'],
+            track_name=item['name'],
+            artists=join_artist_names(item.get('artists') or []),
+            duration_ms=item['duration_ms'] or 1,
+            cover_images=(item.get('album') or {}).get('images'))
+
+    @classmethod
+    def from_mpris(cls, properties, position_us=0):
+        """properties are the unpacked org.mpris.MediaPlayer2.Player
+        properties, position_us the last known Position.
+
+        MPRIS does not give image sizes, the cover is a single image of
+        unknown dimensions.
+        """
+        metadata = properties.get('Metadata') or {}
+        track_id = metadata.get('mpris:trackid') or ''
+        status = properties.get('PlaybackStatus', 'Stopped')
+        if status == 'Stopped' or not track_id:
+            return cls()
+        art_url = metadata.get('mpris:artUrl')
+        return cls(
+            has_playback=True,
+            is_playing=status == 'Playing',
+            repeat=MPRIS_LOOP_STATUS.get(properties.get('LoopStatus'), 'off'),
+            shuffle=bool(properties.get('Shuffle', False)),
+            progress_ms=max(0, position_us // 1000),
+            track_uri=mpris_track_uri(track_id),
+            track_name=metadata.get('xesam:title') or '',
+            artists=', '.join(metadata.get('xesam:artist') or []),
+            duration_ms=max(1, (metadata.get('mpris:length') or 0) // 1000),
+            cover_images=[{'url': mpris_art_url(art_url),
+                           'width': None, 'height': None}]
+            if art_url else None)
+
+    def progress_fraction(self):
+        return self.progress_ms / self.duration_ms
+
+    def changed_fields(self, other):
+        return [name for name in self.__slots__
+                if getattr(self, name) != getattr(other, name)]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
@@ -0,0 +1,100 @@
+# projection.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .metrics import Metrics
+
+# Field projections use the syntax of the Web API's "fields" parameter,
+# e.g. "items(track(uri,name,artists(name))),next". Endpoints that accept
+# it get the filter sent along, for all others the same declaration is used
+# to strip the response right after it has been parsed.
+
+
+def parse_fields(fields):
+    """Turns a fields string into a nested dict, None marks a leaf."""
+    def parse(position):
+        spec = {}
+        name = ''
+        while position < len(fields):
+            char = fields[position]
+            if char == '(':
+                spec[name.strip()], position = parse(position + 1)
+                name = None
+            elif char == ')':
+                if name and name.strip():
+                    spec[name.strip()] = None
+                return spec, position + 1
+            elif char == ',':
+                if name and name.strip():
+                    spec[name.strip()] = None
+                name = ''
+                position += 1
+                continue
+            else:
+                name = (name or '') + char
+                position += 1
+                continue
+        if name and name.strip():
+            spec[name.strip()] = None
+        return spec, position
+
+    spec, _ = parse(0)
+    return spec
+
+
+def project(data, spec):
+    """Returns (projected data, number of dropped keys)."""
+    if spec is None or data is None:
+        return data, 0
+    if isinstance(data, list):
+        dropped = 0
+        projected = []
+        for element in data:
+            element, element_dropped = project(element, spec)
+            projected.append(element)
+            dropped += element_dropped
+        return projected, dropped
+    if not isinstance(data, dict):
+        return data, 0
+    projected = {}
+    dropped = 0
+    for key, value in data.items():
+        if key not in spec:
+            dropped += 1
+            continue
+        projected[key], value_dropped = project(value, spec[key])
+        dropped += value_dropped
+    return projected, dropped
+
+
+class Projection:
+
+    def __init__(self, name, fields, server_side=False):
+        self.name = name
+        self.fields = fields
+        self.spec = parse_fields(fields)
+        self.server_side = server_side
+
+    def apply(self, response):
+        projected, dropped = project(response, self.spec)
+        Metrics.inc('projection.dropped_keys ' + self.name, dropped)
+        return projected
+
+    def request(self, call, *args, **kwargs):
+        if self.server_side:
+            kwargs['fields'] = self.fields
+            return call(*args, **kwargs)
+        return self.apply(call(*args, **kwargs))
@@ -0,0 +1,150 @@
+# rowModels.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unicodedata
+
+# View-models for list rows. They are built on the loader threads from the
+# raw API responses, so the main thread only has to create the widgets.
+# Nothing in here may touch GTK.
+
+# The response fields every model reads, in the syntax of the Web API's
+# "fields" parameter. Requests project their responses down to these.
+# The artist URIs let TrackStore tell apart artists with the same name.
+TRACK_FIELDS = 'uri,name,artists(uri,name),album(uri,name,images)'
+ARTIST_FIELDS = 'uri,name,images,followers(total)'
+EPISODE_FIELDS = 'uri,name,description,images'
+SHOW_FIELDS = 'uri,name,publisher,images'
+ALBUM_FIELDS = 'uri,name,artists(name),images'
+# Tracks listed by an album leave out the album itself.
+ALBUM_TRACK_FIELDS = 'uri,name,artists(name)'
+PLAYLIST_FIELDS = 'uri,name,images'
+
+_MARKUP_ESCAPES = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    "'": '&#39;',
+    '"': '&quot;',
+})
+
+
+def escape_markup(text):
+    # Same result as GLib.markup_escape_text for the text we display, but
+    # usable without gi.
+    return text.translate(_MARKUP_ESCAPES)
+
+
+def fold_for_search(text):
+    # Case and accents do not matter when filtering, "beyonce" finds
+    # "Beyoncé" and "Sigur Rós" is found by "ros".
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(
+        char for char in decomposed
+        if not unicodedata.combining(char)).casefold()
+
+
+def join_artist_names(artists):
+    return ", ".join(artist['name'] for artist in artists)
+
+
+def two_line_markup(title, subtitle):
+    return '<b>' + escape_markup(title) + '</b>\n' + escape_markup(subtitle)
+
+
+class RowModel:
+
+    __slots__ = ('kind', 'uri', 'markup', 'cover_uri', 'images')
+
+    def __init__(self, kind, uri, markup, cover_uri, images):
+        object.__setattr__(self, 'kind', kind)
+        object.__setattr__(self, 'uri', uri)
+        object.__setattr__(self, 'markup', markup)
+        object.__setattr__(self, 'cover_uri', cover_uri)
+        object.__setattr__(self, 'images', images)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RowModel is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("RowModel is immutable")
+
+    def __repr__(self):
+        return 'RowModel(' + self.kind + ', ' + self.uri + ')'
+
+
+def track_model(track):
+    album = track['album']
+    return RowModel(
+        'track',
+        track['uri'],
+        two_line_markup(track['name'], join_artist_names(track['artists'])),
+        album['uri'],
+        album['images'])
+
+
+def artist_model(artist):
+    return RowModel(
+        'artist',
+        artist['uri'],
+        two_line_markup(
+            artist['name'],
+            str(artist['followers']['total']) + ' followers'),
+        artist['uri'],
+        artist['images'])
+
+
+def episode_model(episode):
+    if episode is None:
+        return RowModel(
+            'episode',
+            'episode::Response is None',
+            "No Uri. Episode is None",
+            "No Uri. Episode is None",
+            None)
+    return RowModel(
+        'episode',
+        episode['uri'],
+        two_line_markup(episode['name'], episode['description']),
+        episode['uri'],
+        episode['images'])
+
+
+def show_model(show):
+    return RowModel(
+        'show',
+        show['uri'],
+        two_line_markup(show['name'], show['publisher']),
+        show['uri'],
+        show['images'])
+
+
+def album_model(album):
+    return RowModel(
+        'album',
+        album['uri'],
+        two_line_markup(album['name'], join_artist_names(album['artists'])),
+        album['uri'],
+        album['images'])
+
+
+def playlist_model(playlist):
+    return RowModel(
+        'playlist',
+        playlist['uri'],
+        escape_markup(playlist['name']),
+        playlist['uri'],
+        playlist['images'])
@@ -15,21 +15,69 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from .bandwidthProfile import BandwidthProfile
 from .config import Config
+from .connectivity import Connectivity
+from .ioEngine import IoEngine
+from .metrics import Metrics
 import os
+import re
 import sys
 import threading
+import time
 from xdg import BaseDirectory
 
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 
 
+class InstrumentedSpotify(spotipy.Spotify):
+    """spotipy client that records latency, errors and bytes per endpoint."""
+
+    __id_pattern = re.compile(r'/[0-9A-Za-z]{22}(?=/|$)')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._session.hooks['response'].append(self.__count_bytes)
+
+    @classmethod
+    def endpoint_name(cls, method, url):
+        path = url.split('?', 1)[0]
+        if path.startswith(spotipy.Spotify.prefix):
+            path = path[len(spotipy.Spotify.prefix):]
+        path = cls.__id_pattern.sub('/{id}', '/' + path.lstrip('/'))
+        return method + ' ' + path
+
+    def __count_bytes(self, response, *args, **kwargs):
+        endpoint = self.endpoint_name(response.request.method, response.url)
+        received = len(response.content or b'')
+        Metrics.inc('api.bytes_received', received)
+        Metrics.inc('api.bytes_received ' + endpoint, received)
+        BandwidthProfile.count_received(received)
+        return response
+
+    def _internal_call(self, method, url, payload, params):
+        endpoint = self.endpoint_name(method, url)
+        Connectivity.check(endpoint)
+        Metrics.inc('api.calls ' + endpoint)
+        start = time.perf_counter()
+        try:
+            return super()._internal_call(method, url, payload, params)
+        except Exception:
+            Metrics.inc('api.errors ' + endpoint)
+            raise
+        finally:
+            Metrics.observe(
+                'api.latency_ms ' + endpoint,
+                (time.perf_counter() - start) * 1000)
+
+
 class Spotify:
 
     __sp = None
     __lock = threading.Lock()
     username_backup = None
+    active_device_id = None
 
     @classmethod
     def set_username_backup(cls, username):
@@ -104,7 +152,9 @@ class Spotify:
                 "There is an error in the code. The constructor of the spotify object should not be called more than once!",
                 file=sys.stderr)
             sys.exit(1)
-        self.sp = spotipy.Spotify(auth_manager=auth_manager)
+        self.sp = InstrumentedSpotify(
+            auth_manager=auth_manager,
+            requests_session=IoEngine.get().http_session)
 
     @classmethod
     def get(cls):
@@ -113,38 +163,61 @@ class Spotify:
                 cls.__sp = Spotify(cls.build_auth_manager())
             return cls.__sp.sp
 
+    @classmethod
+    def remember_devices(cls, devices):
+        """Keeps the device to play on when nothing is active, fed from the
+        device list SpotifyPlayback polls anyway."""
+        ids = [dev['id'] for dev in devices]
+        active = [dev['id'] for dev in devices if dev.get('is_active')]
+        if active:
+            cls.active_device_id = active[0]
+        elif cls.active_device_id not in ids:
+            cls.active_device_id = ids[0] if ids else None
+
     @classmethod
     def start_playback(
-            cls, context_uri=None, offset=None, device_id=None, uris=None,
-            recursion_protection=False):
+            cls, context_uri=None, offset=None, device_id=None, uris=None):
+        """Returns whether playback started."""
+        if not Connectivity.is_online():
+            print("Offline, cannot start playback")
+            return False
         try:
             cls.get().start_playback(
                 context_uri=context_uri,
                 offset=offset,
                 uris=uris,
-                device_id=device_id)
+                device_id=device_id or cls.active_device_id)
+            return True
         except spotipy.SpotifyException as e:
-            if "No active device found" in str(e):
-                if recursion_protection:
-                    return
-                try:
-                    cls.start_playback(
-                        context_uri=context_uri,
-                        uris=uris,
-                        offset=offset,
-                        device_id=cls.get().devices()['devices'][0]['id'],
-                        recursion_protection=True
-                        )
-                except spotipy.SpotifyException as dev_e:
-                    print(str(dev_e))
-                except IndexError:
-                    print("Cannot start playback. No active devices...")
-            else:
+            # "No active device found" or the remembered one went away.
+            if e.http_status != 404:
                 print(str(e))
+                return False
+        Metrics.inc('playback.device_misses')
+        try:
+            cls.remember_devices(cls.get().devices()['devices'])
+            if cls.active_device_id is None:
+                print("Cannot start playback. No active devices...")
+                return False
+            cls.get().start_playback(
+                context_uri=context_uri,
+                offset=offset,
+                uris=uris,
+                device_id=cls.active_device_id)
+            return True
+        except spotipy.SpotifyException as e:
+            print(str(e))
+            return False
 
     @classmethod
     def pause_playback(cls):
+        """Returns whether playback paused."""
+        if not Connectivity.is_online():
+            print("Offline, cannot pause playback")
+            return False
         try:
             cls.get().pause_playback()
+            return True
         except spotipy.SpotifyException as e:
             print(str(e))
+            return False
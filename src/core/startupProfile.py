@@ -0,0 +1,91 @@
+# startupProfile.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Imported as early as possible, everything is timed relative to this.
+_START = time.perf_counter()
+
+
+class StartupProfile:
+    """Timestamps for every startup step, opt-in via SPOTIPYNE_PROFILE_STARTUP.
+
+    With the variable set, the launcher also restarts Python with
+    -X importtime, which writes the import tree to stderr. The steps logged
+    here show where the time between the imports went.
+    """
+
+    ENV_ENABLE = "SPOTIPYNE_PROFILE_STARTUP"
+
+    enabled = bool(os.getenv(ENV_ENABLE))
+    __steps = []
+
+    @classmethod
+    def wants_import_times(cls):
+        return cls.enabled and 'importtime' not in sys._xoptions and \
+            not os.getenv('PYTHONPROFILEIMPORTTIME')
+
+    @classmethod
+    def import_time_argv(cls, argv):
+        """The command line to re-run the launcher with -X importtime."""
+        return [sys.executable, '-X', 'importtime'] + argv
+
+    @classmethod
+    def mark(cls, name):
+        if not cls.enabled:
+            return
+        now_ms = (time.perf_counter() - _START) * 1000
+        cls.__steps.append((name, now_ms, None))
+        print("startup: {:8.1f} ms  {}".format(now_ms, name), file=sys.stderr)
+
+    @classmethod
+    @contextmanager
+    def step(cls, name):
+        if not cls.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            duration_ms = (end - start) * 1000
+            now_ms = (end - _START) * 1000
+            cls.__steps.append((name, now_ms, duration_ms))
+            print("startup: {:8.1f} ms  {} took {:.1f} ms".format(
+                now_ms, name, duration_ms), file=sys.stderr)
+
+    @classmethod
+    def finish(cls):
+        """Marks the end of startup and prints the steps, slowest first."""
+        if not cls.enabled:
+            return
+        cls.mark("startup finished")
+        print("startup: slowest steps\n" + cls.report(), file=sys.stderr)
+
+    @classmethod
+    def report(cls):
+        timed = [step for step in cls.__steps if step[2] is not None]
+        lines = []
+        for name, at_ms, duration_ms in sorted(
+                timed, key=lambda step: step[2], reverse=True):
+            lines.append("{:8.1f} ms  {} (done at {:.1f} ms)".format(
+                duration_ms, name, at_ms))
+        return "\n".join(lines)
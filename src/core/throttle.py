@@ -0,0 +1,77 @@
+# throttle.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import time
+
+
+class UserActivity:
+    """Tracks whether the user is waiting for pages to load."""
+
+    QUIET_PERIOD_S = 3
+
+    __lock = threading.Lock()
+    __active = 0
+    __last_activity = 0.0
+
+    @classmethod
+    def begin(cls):
+        with cls.__lock:
+            cls.__active += 1
+            cls.__last_activity = time.monotonic()
+
+    @classmethod
+    def end(cls):
+        with cls.__lock:
+            cls.__active -= 1
+            cls.__last_activity = time.monotonic()
+
+    @classmethod
+    def is_active(cls):
+        with cls.__lock:
+            return cls.__active > 0 or \
+                time.monotonic() - cls.__last_activity < cls.QUIET_PERIOD_S
+
+
+class TokenBucket:
+
+    def __init__(self, bytes_per_second, burst=None):
+        self.rate = bytes_per_second
+        self.capacity = burst or bytes_per_second
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def __refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def consume(self, amount):
+        # Spending more than is available leaves a debt that is waited off
+        # before the next download, so the average stays at the rate.
+        self.__refill()
+        self.tokens -= amount
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+    def pause(self, seconds):
+        """Lets nothing through for seconds, e.g. after a Retry-After."""
+        self.__refill()
+        # Several requests that ran into the same limit wait it off once.
+        self.tokens = min(self.tokens, -seconds * self.rate)
@@ -0,0 +1,368 @@
+# thumbnailPack.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import fcntl
+import mmap
+import os
+import threading
+import time
+
+from xdg import BaseDirectory
+
+from .config import Config
+from .metrics import Metrics
+
+
+class ThumbnailPack:
+    """Scaled covers as raw pixels in a few append-only pack files.
+
+    Every thumbnail is appended to the current pack file and recorded in an
+    append-only index, where the last line for a key wins. Packs are read
+    through mmap, so a cold start costs one open per pack instead of one
+    open, stat and decode per cover. Replaced entries leave dead bytes
+    behind, which a background compaction rewrites away. Several processes
+    may share one directory, each picks up the others' appends from the
+    index.
+    """
+
+    PACK_SIZE_LIMIT = 64 * 1024 * 1024
+    COMPACT_DEAD_RATIO = 0.5
+    COMPACT_MIN_DEAD_BYTES = 4 * 1024 * 1024
+    WRITE_LOCK_TIMEOUT = 0.1
+
+    class Entry:
+
+        __slots__ = ('pack', 'offset', 'length', 'width', 'height',
+                     'rowstride', 'has_alpha')
+
+        def __init__(self, pack, offset, length, width, height, rowstride,
+                     has_alpha):
+            self.pack = pack
+            self.offset = offset
+            self.length = length
+            self.width = width
+            self.height = height
+            self.rowstride = rowstride
+            self.has_alpha = has_alpha
+
+        def to_line(self, key):
+            return '\t'.join([key] + [str(value) for value in (
+                self.pack, self.offset, self.length, self.width,
+                self.height, self.rowstride, int(self.has_alpha))]) + '\n'
+
+        @classmethod
+        def from_fields(cls, fields):
+            pack, offset, length, width, height, rowstride, has_alpha = \
+                [int(field) for field in fields]
+            return cls(pack, offset, length, width, height, rowstride,
+                       bool(has_alpha))
+
+    __default = None
+    __default_lock = threading.Lock()
+
+    @classmethod
+    def get_default(cls):
+        with cls.__default_lock:
+            if not cls.__default:
+                cls.__default = ThumbnailPack(BaseDirectory.save_cache_path(
+                    Config.applicationID + '/thumbnails'))
+            return cls.__default
+
+    def __init__(self, directory):
+        self.directory = directory
+        # __lock guards the in-memory state, __write_lock and the lock file
+        # serialize writers within this process and across processes.
+        self.__lock = threading.Lock()
+        self.__write_lock = threading.Lock()
+        self.__lock_file = open(os.path.join(directory, 'lock'), 'a')
+        self.__entries = {}
+        self.__maps = {}
+        self.__compacting = False
+        self.__current_pack = 0
+        self.__index_inode = None
+        self.__index_offset = 0
+        self.dead_bytes = 0
+        self.__index_file = open(self.__index_path(), 'a')
+        with self.__lock:
+            self.__sync_index()
+
+    def close(self):
+        """Closes the files of this pack. Maps stay alive as long as
+        buffers handed out by get() do."""
+        with self.__lock:
+            self.__index_file.close()
+            self.__lock_file.close()
+            self.__maps = {}
+
+    def __index_path(self):
+        return os.path.join(self.directory, 'index')
+
+    def __pack_path(self, pack):
+        return os.path.join(self.directory, 'pack-' + str(pack))
+
+    def __list_packs(self):
+        packs = []
+        for name in os.listdir(self.directory):
+            if name.startswith('pack-') and name[len('pack-'):].isdigit():
+                packs.append(int(name[len('pack-'):]))
+        return packs
+
+    def __try_lock_files(self, timeout=0.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(self.__lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.002)
+
+    def __unlock_files(self):
+        fcntl.flock(self.__lock_file, fcntl.LOCK_UN)
+
+    def __sync_index(self):
+        """Reads what was appended to the index since the last call.
+
+        Other processes append to the same index, and a compaction anywhere
+        replaces it, which shows up as a new inode. Returns whether anything
+        was read.
+        """
+        try:
+            index_file = open(self.__index_path(), 'rb')
+        except FileNotFoundError:
+            return False
+        with index_file:
+            inode = os.fstat(index_file.fileno()).st_ino
+            if inode != self.__index_inode:
+                if self.__index_inode is not None:
+                    self.__index_file.close()
+                    self.__index_file = open(self.__index_path(), 'a')
+                self.__index_inode = inode
+                self.__index_offset = 0
+                self.__entries = {}
+                self.__maps = {}
+                self.__current_pack = 0
+                self.dead_bytes = 0
+            index_file.seek(self.__index_offset)
+            data = index_file.read()
+        # A line without its newline is still being written, or was torn
+        # by a crash. Either way it is not ours to read yet.
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return False
+        self.__index_offset += end
+        for line in data[:end].decode('utf-8', 'replace').splitlines():
+            fields = line.split('\t')
+            if len(fields) != 8:
+                continue
+            try:
+                entry = self.Entry.from_fields(fields[1:])
+            except ValueError as e:
+                print(e)
+                continue
+            key = fields[0]
+            if key in self.__entries:
+                self.dead_bytes += self.__entries[key].length
+            self.__entries[key] = entry
+            self.__current_pack = max(self.__current_pack, entry.pack)
+        return True
+
+    def __map(self, pack, needed_end):
+        mapped = self.__maps.get(pack)
+        if mapped is None or len(mapped) < needed_end:
+            # The pack grew since it was mapped. Buffers handed out earlier
+            # keep the old map alive until they are gone.
+            with open(self.__pack_path(pack), 'rb') as pack_file:
+                mapped = mmap.mmap(
+                    pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__maps[pack] = mapped
+        return mapped
+
+    def __contains__(self, key):
+        with self.__lock:
+            return key in self.__entries or \
+                (self.__sync_index() and key in self.__entries)
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__entries)
+
+    def get(self, key):
+        """Returns (pixels, entry) or None. pixels is a view on the map."""
+        with self.__lock:
+            found = self.__lookup_locked(key)
+        if found is None:
+            Metrics.inc('thumbnails.misses')
+            return None
+        Metrics.inc('thumbnails.hits')
+        return found
+
+    def __lookup_locked(self, key):
+        entry = self.__entries.get(key)
+        if entry is None and self.__sync_index():
+            entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        try:
+            mapped = self.__map(entry.pack, entry.offset + entry.length)
+        except (OSError, ValueError):
+            # Most likely another process compacted the pack away.
+            mapped = None
+            if self.__sync_index():
+                entry = self.__entries.get(key)
+                if entry is not None:
+                    try:
+                        mapped = self.__map(
+                            entry.pack, entry.offset + entry.length)
+                    except (OSError, ValueError) as e:
+                        print(e)
+        if mapped is None:
+            self.__entries.pop(key, None)
+            return None
+        return memoryview(mapped)[entry.offset:entry.offset + entry.length], entry
+
+    def put(self, key, pixels, width, height, rowstride, has_alpha):
+        # Thumbnails can always be made again, so a write that would have to
+        # wait for a compaction or another process is dropped instead.
+        if not self.__write_lock.acquire(timeout=self.WRITE_LOCK_TIMEOUT):
+            Metrics.inc('thumbnails.writes_dropped')
+            return
+        try:
+            if not self.__try_lock_files(self.WRITE_LOCK_TIMEOUT):
+                Metrics.inc('thumbnails.writes_dropped')
+                return
+            try:
+                self.__append(key, pixels, width, height, rowstride, has_alpha)
+            finally:
+                self.__unlock_files()
+        finally:
+            self.__write_lock.release()
+        if self.needs_compaction():
+            self.compact_in_background()
+
+    def __append(self, key, pixels, width, height, rowstride, has_alpha):
+        with self.__lock:
+            self.__sync_index()
+            pack = self.__current_pack
+        pack_path = self.__pack_path(pack)
+        try:
+            offset = os.path.getsize(pack_path)
+        except FileNotFoundError:
+            offset = 0
+        if offset + len(pixels) > self.PACK_SIZE_LIMIT and offset > 0:
+            pack += 1
+            pack_path = self.__pack_path(pack)
+            offset = 0
+        with open(pack_path, 'ab') as pack_file:
+            pack_file.write(pixels)
+        entry = self.Entry(
+            pack, offset, len(pixels), width, height, rowstride, has_alpha)
+        with self.__lock:
+            self.__index_file.write(entry.to_line(key))
+            self.__index_file.flush()
+            self.__sync_index()
+        Metrics.inc('thumbnails.bytes_written', len(pixels))
+
+    def needs_compaction(self):
+        with self.__lock:
+            live = sum(entry.length for entry in self.__entries.values())
+            total = live + self.dead_bytes
+            return self.dead_bytes >= self.COMPACT_MIN_DEAD_BYTES and \
+                self.dead_bytes >= total * self.COMPACT_DEAD_RATIO
+
+    def __claim_compaction(self):
+        with self.__lock:
+            if self.__compacting:
+                return False
+            self.__compacting = True
+            return True
+
+    def compact_in_background(self):
+        if self.__claim_compaction():
+            threading.Thread(target=self.__compact, daemon=True).start()
+
+    def compact(self):
+        if self.__claim_compaction():
+            self.__compact()
+
+    def __compact(self):
+        # Live entries are copied into fresh packs numbered after the
+        # current ones, then the index is swapped and the old packs removed.
+        # Writers are locked out for the whole run, here and in other
+        # processes, so nothing can be appended to the old packs meanwhile.
+        try:
+            with self.__write_lock:
+                if not self.__try_lock_files():
+                    # Another process is writing or compacting already.
+                    return
+                try:
+                    self.__compact_locked()
+                finally:
+                    self.__unlock_files()
+            Metrics.inc('thumbnails.compactions')
+        except OSError as e:
+            print(e)
+        finally:
+            with self.__lock:
+                self.__compacting = False
+
+    def __compact_locked(self):
+        with self.__lock:
+            self.__sync_index()
+            entries = dict(self.__entries)
+            next_pack = self.__current_pack + 1
+        new_entries = {}
+        pack = next_pack
+        offset = 0
+        pack_file = open(self.__pack_path(pack), 'wb')
+        for key, entry in entries.items():
+            # Not through get(), copying is no cache hit or miss.
+            with self.__lock:
+                found = self.__lookup_locked(key)
+            if found is None:
+                continue
+            pixels, _entry = found
+            if offset + entry.length > self.PACK_SIZE_LIMIT and offset > 0:
+                pack_file.close()
+                pack += 1
+                offset = 0
+                pack_file = open(self.__pack_path(pack), 'wb')
+            pack_file.write(pixels)
+            new_entries[key] = self.Entry(
+                pack, offset, entry.length, entry.width, entry.height,
+                entry.rowstride, entry.has_alpha)
+            offset += entry.length
+        pack_file.close()
+
+        temp_index = self.__index_path() + '.compact'
+        with open(temp_index, 'w') as index_file:
+            for key, entry in new_entries.items():
+                index_file.write(entry.to_line(key))
+        os.replace(temp_index, self.__index_path())
+        with self.__lock:
+            # Reloads the new index, and drops the maps of the old packs.
+            self.__sync_index()
+        # Every pack before the new ones goes, also those that no index
+        # entry points to any more because all their keys were put again.
+        for old_pack in self.__list_packs():
+            if old_pack >= next_pack:
+                continue
+            try:
+                os.remove(self.__pack_path(old_pack))
+            except FileNotFoundError:
+                pass
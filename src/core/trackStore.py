@@ -0,0 +1,199 @@
+# trackStore.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+
+from .rowModels import RowModel, fold_for_search, two_line_markup
+
+# Tracks are kept column-wise: every string goes through a pool and the
+# columns only hold integer ids, so a big library does not retain one
+# nested JSON dict per track.
+
+NONE_ID = -1
+
+
+class StringPool:
+
+    def __init__(self):
+        self.__ids = {}
+        self.__strings = []
+
+    def intern(self, string):
+        if string is None:
+            return NONE_ID
+        string_id = self.__ids.get(string)
+        if string_id is None:
+            string_id = len(self.__strings)
+            self.__ids[string] = string_id
+            self.__strings.append(string)
+        return string_id
+
+    def get(self, string_id):
+        if string_id == NONE_ID:
+            return None
+        return self.__strings[string_id]
+
+    def __len__(self):
+        return len(self.__strings)
+
+
+class TrackStore:
+
+    def __init__(self):
+        self.strings = StringPool()
+
+        self.__album_ids = {}
+        self.album_uri = array('i')
+        self.album_images_start = array('i')
+        self.album_images_end = array('i')
+        self.image_url = array('i')
+        self.image_width = array('i')
+        self.image_height = array('i')
+
+        self.__artist_ids = {}
+        self.artist_name = array('i')
+
+        self.track_uri = array('i')
+        self.track_name = array('i')
+        self.track_album = array('i')
+        self.track_artists_start = array('i')
+        self.track_artists_end = array('i')
+        self.track_artists = array('i')
+        # Folded "title artists album" per track, kept up to date as tracks
+        # are appended so filtering never has to build them.
+        self.search_keys = []
+
+    def __album_id(self, album):
+        # Local files have no album URI, each keeps its own images.
+        uri = album.get('uri')
+        album_id = self.__album_ids.get(uri) if uri is not None else None
+        if album_id is not None:
+            return album_id
+        album_id = len(self.album_uri)
+        if uri is not None:
+            self.__album_ids[uri] = album_id
+        self.album_uri.append(self.strings.intern(uri))
+        self.album_images_start.append(len(self.image_url))
+        for image in album.get('images') or []:
+            self.image_url.append(self.strings.intern(image['url']))
+            # The API reports unknown sizes as null.
+            self.image_width.append(image['width'] or 0)
+            self.image_height.append(image['height'] or 0)
+        self.album_images_end.append(len(self.image_url))
+        return album_id
+
+    def __artist_id(self, artist):
+        # Different artists can share a name, so they are told apart by
+        # URI. Artists of local files have none and are not shared.
+        uri = artist.get('uri') or artist.get('id')
+        artist_id = self.__artist_ids.get(uri) if uri is not None else None
+        if artist_id is None:
+            artist_id = len(self.artist_name)
+            if uri is not None:
+                self.__artist_ids[uri] = artist_id
+            self.artist_name.append(self.strings.intern(artist['name']))
+        return artist_id
+
+    def append(self, track):
+        # Playlists can contain tracks that are no longer available.
+        if track is None:
+            return
+        self.track_uri.append(self.strings.intern(track['uri']))
+        self.track_name.append(self.strings.intern(track['name']))
+        self.track_album.append(self.__album_id(track['album']))
+        self.track_artists_start.append(len(self.track_artists))
+        for artist in track['artists']:
+            self.track_artists.append(self.__artist_id(artist))
+        self.track_artists_end.append(len(self.track_artists))
+        self.search_keys.append(fold_for_search('\n'.join((
+            track['name'] or '',
+            ', '.join(artist['name'] for artist in track['artists']),
+            track['album'].get('name') or ''))))
+
+    def extend(self, tracks):
+        for track in tracks:
+            self.append(track)
+
+    def __len__(self):
+        return len(self.track_uri)
+
+    def uri(self, index):
+        return self.strings.get(self.track_uri[index])
+
+    def name(self, index):
+        return self.strings.get(self.track_name[index])
+
+    def artist_names(self, index):
+        return ", ".join(
+            self.strings.get(self.artist_name[artist_id])
+            for artist_id in self.track_artists[
+                self.track_artists_start[index]:
+                self.track_artists_end[index]])
+
+    def album_uri_of(self, index):
+        return self.strings.get(self.album_uri[self.track_album[index]])
+
+    def images(self, index):
+        album_id = self.track_album[index]
+        return [
+            {'url': self.strings.get(self.image_url[image_id]),
+             'width': self.image_width[image_id] or None,
+             'height': self.image_height[image_id] or None}
+            for image_id in range(
+                self.album_images_start[album_id],
+                self.album_images_end[album_id])]
+
+    def matches(self, query, count=None, start=0):
+        """Whether each of the tracks from start up to count contains every
+        word of query, as a list of bools."""
+        end = len(self.search_keys) if count is None else count
+        keys = self.search_keys[start:end]
+        words = fold_for_search(query).split()
+        if not words:
+            return [True] * len(keys)
+        if len(words) == 1:
+            word = words[0]
+            return [word in key for key in keys]
+        # Every further word only has to look at the rows still matching.
+        matching = range(len(keys))
+        for word in words:
+            matching = [index for index in matching if word in keys[index]]
+        mask = [False] * len(keys)
+        for index in matching:
+            mask[index] = True
+        return mask
+
+    def row_model(self, index):
+        return RowModel(
+            'track',
+            self.uri(index),
+            two_line_markup(self.name(index), self.artist_names(index)),
+            self.album_uri_of(index),
+            self.images(index))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row_model(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("track index out of range")
+        return self.row_model(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.row_model(index)
@@ -15,14 +15,23 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import itertools
+import queue
 import threading
 import os
-from xdg import BaseDirectory
+import time
 
-import requests
 from gi.repository import Gtk, GdkPixbuf, GLib
 
-from .config import Config
+from .core.coverStore import (
+    CoverDownloadError, CoverStore, Dimensions, download_to_file,
+    get_desired_image_for_size, get_smallest_image, get_thumbnail_key)
+from .core.connectivity import Connectivity
+from .core.failureCache import FailureCache
+from .core.ioEngine import IoEngine
+from .core.metrics import Metrics
+from .core.thumbnailPack import ThumbnailPack
+from .uiDispatcher import UiDispatcher
 
 
 def static_vars(**kwargs):
@@ -33,15 +42,6 @@ def static_vars(**kwargs):
     return decorate
 
 
-@static_vars(cache_path=None)
-def get_cover_path(uri, dim):
-    if not get_cover_path.cache_path:
-        get_cover_path.cache_path = BaseDirectory.save_cache_path(
-            Config.applicationID + '/coverArt/'
-        )
-    return get_cover_path.cache_path + uri + ":" + str(dim)
-
-
 # GTK
 @static_vars(image=None)
 def get_error_image():
@@ -54,9 +54,14 @@ def get_error_image():
 
 
 def load_pixbuf_from_file(path):
+    start = time.perf_counter()
     try:
-        return GdkPixbuf.Pixbuf.new_from_file(filename=path)
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file(filename=path)
+        Metrics.observe(
+            'covers.decode_ms', (time.perf_counter() - start) * 1000)
+        return pixbuf
     except GLib.Error as gliberr:
+        Metrics.inc('covers.decode_errors')
         print(gliberr)
         try:
             os.remove(path)
@@ -65,46 +70,32 @@ def load_pixbuf_from_file(path):
         return None
 
 
-def get_desired_image_for_size(desired_size, image_responses):
-    image_responses = sorted(image_responses, key=lambda img: img['width'])
-    for image in image_responses:
-        if image['width'] is None or image['height'] is None:
-            continue
-        smaller = image['height'] \
-            if image['width'] > image['height'] \
-            else image['width']
-        if smaller >= desired_size:
-            return image['url'], Dimensions(
-                image['width'],
-                image['height'],
-                image['width'] == image['height']
-            )
-    try:
-        if image_responses[-1]:
-            image = image_responses[-1]
-            return image['url'], Dimensions(
-                image['width'],
-                image['height'],
-                image['width'] == image['height']
-            )
-    except IndexError:
-        pass
-    return None, Dimensions(desired_size, desired_size, True)
-
-
-def download_to_file(url, toFile):
-    response = requests.get(url)
-    open(toFile, 'wb').write(response.content)
-
-
-def rename_file_if_dimensions_none(uri, cache_path):
-    loaded = load_pixbuf_from_file(path=cache_path)
-    w = loaded.get_width()
-    h = loaded.get_height()
-    read_dim = Dimensions(w, h, w == h)
-    new_filename = get_cover_path(uri, read_dim)
-    os.rename(cache_path, new_filename)
-    return read_dim
+def load_pixbuf_from_pack(pack, key):
+    found = pack.get(key)
+    if found is None:
+        return None
+    pixels, entry = found
+    # GLib.Bytes copies the pixels out of the map once. The pixbuf owns
+    # that copy, so it outlives a compaction that unmaps the pack, and the
+    # pack still saves the file open and the decode.
+    return GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(pixels),
+        GdkPixbuf.Colorspace.RGB,
+        entry.has_alpha,
+        8,
+        entry.width,
+        entry.height,
+        entry.rowstride)
+
+
+def save_pixbuf_to_pack(pack, key, pixbuf):
+    pack.put(
+        key,
+        pixbuf.read_pixel_bytes().get_data(),
+        pixbuf.get_width(),
+        pixbuf.get_height(),
+        pixbuf.get_rowstride(),
+        pixbuf.get_has_alpha())
 
 
 def crop_to_square(pixbuf):
@@ -116,50 +107,6 @@ def crop_to_square(pixbuf):
     return pixbuf.new_subpixbuf(src_x, src_y, smallerValue, smallerValue)
 
 
-class Dimensions:
-
-    def __key(self):
-        return (self.width, self.height, self.be_square)
-
-    def __hash__(self):
-        return hash(self.__key())
-
-    def __eq__(self, other):
-        if isinstance(other, Dimensions):
-            return self.__key() == other.__key()
-        return NotImplemented
-
-    def __gt__(self, other):
-        if self.width is None or self.height is None:
-            return True
-        if other.width is None or other.height is None:
-            return False
-        return self.width > other.width and self.height > other.height
-
-    def __ge__(self, other):
-        return self.__gt__(other) or self.__eq__(other)
-
-    def __lt__(self, other):
-        if self.width is None or self.height is None:
-            return False
-        if other.width is None or other.height is None:
-            return True
-        return self.width < other.width and self.height < other.height
-
-    def __le__(self, other):
-        return self.__lt__(other) or self.__eq__(other)
-
-    def __init__(self, width, height, be_square=False):
-        self.width = width
-        self.height = height
-        if be_square:
-            self.height = self.width
-        self.be_square = be_square
-
-    def __str__(self):
-        return str(self.width) + "x" + str(self.height) + "x" + str(self.be_square)
-
-
 def scale_to_dimension(pixbuf, dim):
     cropped = pixbuf
     if dim.be_square:
@@ -175,81 +122,194 @@ class PixbufCache:
 
     class PixbufCacheEntry:
 
-        def __init__(self):
+        def __init__(self, thumbnail_pack, failure_cache, cover_store):
             self.pixbufs_scaled = {}
             self.used_by = 0
             self.error = False
+            self.previews = {}
+            self.thumbnail_pack = thumbnail_pack
+            self.failure_cache = failure_cache
+            self.cover_store = cover_store
 
-        def __get_image(self, uri, dim, url=None):
-            cache_path = get_cover_path(uri, dim)
+        def __get_image(self, url):
+            if url is None:
+                return None
+            cache_path = self.cover_store.path_for_url(url)
             if os.path.isfile(cache_path):
                 loaded = load_pixbuf_from_file(path=cache_path)
                 if loaded:
+                    Metrics.inc('covers.disk_hits')
                     return loaded
-            if url:
-                download_to_file(url, cache_path)
-                if dim.height is None or dim.width is None:
-                    dim = rename_file_if_dimensions_none(uri, cache_path)
-                return self.__get_image(uri, dim, None)
-            return None
-
-        def get_scaled(self, uri, dim, urls):
+            Metrics.inc('covers.disk_misses')
+            # Not a failure of the URL, it is tried again once online.
+            if not Connectivity.is_online() or \
+                    self.failure_cache.should_skip(url):
+                return None
+            try:
+                IoEngine.get().call(
+                    self.cover_store.fetch, url, download_to_file)
+            except CoverDownloadError as e:
+                print(e)
+                self.failure_cache.record_failure(url, e.permanent)
+                return None
+            loaded = load_pixbuf_from_file(path=cache_path)
+            if loaded is None:
+                self.failure_cache.record_failure(url, permanent=True)
+                return None
+            self.failure_cache.record_success(url)
+            return loaded
+
+        def get_scaled(self, dim, urls):
             self.used_by += 1
 
             if self.error:
                 return None
 
             if dim in self.pixbufs_scaled.keys():
+                Metrics.inc('covers.memory_hits')
                 return self.pixbufs_scaled[dim]
 
-            big_enough_dims = [scale for scale in self.pixbufs_scaled.keys() if scale <= dim]
+            Metrics.inc('covers.memory_misses')
+            image_url, desired_dim = get_desired_image_for_size(
+                dim.height,
+                urls
+            )
+            if image_url is None:
+                return None
+            thumbnail_key = get_thumbnail_key(image_url, dim)
+            packed = load_pixbuf_from_pack(self.thumbnail_pack, thumbnail_key)
+            if packed:
+                self.pixbufs_scaled[dim] = packed
+                return packed
+
+            # Only a pixbuf at least as big as dim can be scaled down to it,
+            # a smaller one would come out blurry. The smallest of those is
+            # the cheapest to scale.
+            big_enough_dims = [scale for scale in self.pixbufs_scaled.keys() if scale >= dim]
             if len(big_enough_dims) > 0:
                 self.pixbufs_scaled[dim] = scale_to_dimension(
                     self.pixbufs_scaled[min(big_enough_dims)],
                     dim
                 )
             else:
-                image_url, desired_dim = get_desired_image_for_size(
-                    dim.height,
-                    urls
-                )
-                bigger_img = self.__get_image(uri, desired_dim, image_url)
+                bigger_img = self.__get_image(image_url)
+                if bigger_img is None:
+                    return None
                 self.pixbufs_scaled[desired_dim] = bigger_img
                 self.pixbufs_scaled[dim] = scale_to_dimension(bigger_img, dim)
 
+            save_pixbuf_to_pack(
+                self.thumbnail_pack, thumbnail_key, self.pixbufs_scaled[dim])
             return self.pixbufs_scaled[dim]
 
+        def is_ready(self, dim, urls):
+            """Whether get_scaled can answer without a download."""
+            if self.error or dim in self.pixbufs_scaled.keys():
+                return True
+            if any(scale >= dim for scale in self.pixbufs_scaled.keys()):
+                return True
+            image_url, _desired_dim = get_desired_image_for_size(
+                dim.height, urls)
+            if image_url is None:
+                return True
+            return get_thumbnail_key(image_url, dim) in self.thumbnail_pack \
+                or self.cover_store.has(image_url)
+
+        def get_preview(self, dim, urls):
+            # The smallest variant, scaled to the requested size so the
+            # final image later replaces it without changing the layout.
+            # One per size, kept apart from pixbufs_scaled, nothing may be
+            # derived from an upscaled image.
+            if dim not in self.previews:
+                image_url, _small_dim = get_smallest_image(urls)
+                small_img = self.__get_image(image_url)
+                if small_img is None:
+                    return None
+                self.previews[dim] = scale_to_dimension(small_img, dim)
+                Metrics.inc('covers.previews')
+            return self.previews[dim]
+
         def dec_used(self):
             self.used_by -= 1
 
             if self.used_by <= 0:
                 self.pixbufs_scaled = {}
+                self.previews = {}
 
-    def __init__(self):
+    def __init__(self, thumbnail_pack=None, failure_cache=None,
+                 cover_store=None):
         self.__pixbufs_lock = threading.Lock()
         self.__pixbufs = {}
+        self.thumbnail_pack = thumbnail_pack or ThumbnailPack.get_default()
+        self.failure_cache = failure_cache or FailureCache()
+        self.cover_store = cover_store or CoverStore.get_default()
 
-    def get_pixbuf(self, uri, dimensions, urls):
-        pixbuf_entry_pair = None
+    def __new_entry(self):
+        return self.PixbufCacheEntry(
+            self.thumbnail_pack, self.failure_cache, self.cover_store)
+
+    def __get_entry_pair(self, uri):
         with self.__pixbufs_lock:
             if uri not in self.__pixbufs.keys():
-                self.__pixbufs[uri] = (
-                    self.PixbufCacheEntry(),
-                    threading.Lock()
-                )
-            pixbuf_entry_pair = self.__pixbufs[uri]
+                self.__pixbufs[uri] = (self.__new_entry(), threading.Lock())
+            return self.__pixbufs[uri]
 
+    def get_pixbuf(self, uri, dimensions, urls):
+        pixbuf_entry_pair = self.__get_entry_pair(uri)
         with pixbuf_entry_pair[1]:
-            return pixbuf_entry_pair[0].get_scaled(uri, dimensions, urls)
+            return pixbuf_entry_pair[0].get_scaled(dimensions, urls)
+
+    def is_ready(self, uri, dimensions, urls):
+        pixbuf_entry_pair = self.__get_entry_pair(uri)
+        with pixbuf_entry_pair[1]:
+            return pixbuf_entry_pair[0].is_ready(dimensions, urls)
+
+    def is_known_bad(self, dimensions, urls):
+        # Called from the main loop, so this must not wait for an entry
+        # lock that a download is holding.
+        image_url, _desired_dim = get_desired_image_for_size(
+            dimensions.height, urls)
+        return image_url is not None and \
+            self.failure_cache.should_skip(image_url)
+
+    def get_preview(self, uri, dimensions, urls):
+        pixbuf_entry_pair = self.__get_entry_pair(uri)
+        with pixbuf_entry_pair[1]:
+            return pixbuf_entry_pair[0].get_preview(dimensions, urls)
 
     def forget_pixbuf(self, uri):
         with self.__pixbufs_lock:
             if uri not in self.__pixbufs.keys():
                 return
-            self.__pixbufs[uri] = (
-                self.PixbufCacheEntry(),
-                self.__pixbufs[uri][1]
-            )
+            self.__pixbufs[uri] = (self.__new_entry(), self.__pixbufs[uri][1])
+
+
+class CoverWorkerQueue:
+    """A fixed set of cover threads working through prioritized jobs.
+
+    First images always run before upgrades, so swapping in sharper covers
+    never delays the first image of another row.
+    """
+
+    FIRST_IMAGE = 0
+    UPGRADE = 1
+
+    def __init__(self, workers=4):
+        self.__jobs = queue.PriorityQueue()
+        self.__sequence = itertools.count()
+        for _ in range(workers):
+            threading.Thread(target=self.__work, daemon=True).start()
+
+    def submit(self, function, priority=FIRST_IMAGE):
+        self.__jobs.put((priority, next(self.__sequence), function))
+
+    def __work(self):
+        while True:
+            _priority, _sequence, function = self.__jobs.get()
+            try:
+                function()
+            except Exception as e:
+                print(e)
 
 
 class CoverArtLoader:
@@ -257,6 +317,7 @@ class CoverArtLoader:
     def __init__(self):
         self.imageSize = 60
         self.pixbuf_cache = PixbufCache()
+        self.workers = CoverWorkerQueue()
 
     # GTK
     def get_loading_image(self):
@@ -273,9 +334,8 @@ class CoverArtLoader:
             def __set_to_icon_helper():
                 update_me.set_from_icon_name(icon_name, size)
                 update_me.set_pixel_size(dimensions.height)
-            GLib.idle_add(
-                priority=GLib.PRIORITY_LOW,
-                function=__set_to_icon_helper)
+            UiDispatcher.get().dispatch(
+                update_me, __set_to_icon_helper, key='image')
 
         if urls is None:
             if uri == "Saved Tracks":
@@ -288,7 +348,7 @@ class CoverArtLoader:
             # GTK
             def to_image():
                 update_me.set_from_pixbuf(new_child)
-            GLib.idle_add(priority=GLib.PRIORITY_LOW, function=to_image)
+            UiDispatcher.get().dispatch(update_me, to_image, key='image')
 
         def update_in_parent_error():
             __set_to_icon(
@@ -303,8 +363,28 @@ class CoverArtLoader:
             else:
                 update_in_parent_error()
 
-        thread = threading.Thread(target=get_pixbuf_and_update)
-        thread.start()
+        def get_preview_and_update():
+            self.pixbuf_cache.cover_store.remember(uri, urls)
+            smallest_url, _ = get_smallest_image(urls)
+            desired_url, _ = get_desired_image_for_size(
+                dimensions.height, urls)
+            # Images of unknown size, e.g. from MPRIS, have no preview.
+            if smallest_url in (None, desired_url) or \
+                    self.pixbuf_cache.is_ready(uri, dimensions, urls):
+                get_pixbuf_and_update()
+                return
+            preview = self.pixbuf_cache.get_preview(uri, dimensions, urls)
+            if preview:
+                update_in_parent_pixbuf(preview)
+            self.workers.submit(
+                get_pixbuf_and_update, CoverWorkerQueue.UPGRADE)
+
+        # Known-bad covers get the error icon right away, without a job.
+        if self.pixbuf_cache.is_known_bad(dimensions, urls):
+            update_in_parent_error()
+            return
+
+        self.workers.submit(get_preview_and_update)
 
     def forget_image(self, uri):
         self.pixbuf_cache.forget_pixbuf(uri)
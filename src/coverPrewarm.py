@@ -0,0 +1,213 @@
+# coverPrewarm.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import os
+
+from xdg import BaseDirectory
+
+from .batchThumbnailer import BatchThumbnailer
+from .core.bandwidthProfile import BandwidthProfile
+from .core.config import Config
+from .core.connectivity import Connectivity
+from .core.coverStore import (
+    CoverDownloadError, Dimensions, download_to_file,
+    get_desired_image_for_size, get_thumbnail_key)
+from .core.ioEngine import IoEngine
+from .core.metrics import Metrics
+from .core.spotify import Spotify as sp
+from .core.throttle import TokenBucket, UserActivity
+
+
+class CoverPrewarmer:
+    """Downloads missing covers for the library in the background.
+
+    Walks the playlists and the first tracks of each, fetches the covers
+    that are neither in the thumbnail pack nor on disk at the rate set by
+    SPOTIPYNE_PREWARM_RATE (bytes per second, 0 disables it) and scales
+    them with the batch thumbnailer. It waits while the user is loading
+    pages, while offline and on metered connections.
+
+    A playlist counts as finished once all its covers are in the thumbnail
+    pack. Finished playlists are remembered across restarts with their
+    snapshot_id, a playlist that changed since is walked again.
+    """
+
+    ENV_RATE = "SPOTIPYNE_PREWARM_RATE"
+    DEFAULT_RATE = 128 * 1024
+    TRACKS_PER_PLAYLIST = 50
+    ROW_SIZE = 60
+    HEADER_SIZE = 128
+    BATCH_SIZE = 200
+
+    def __init__(self, pixbuf_cache, playlist_tracks_projection):
+        self.pixbuf_cache = pixbuf_cache
+        self.playlist_tracks_projection = playlist_tracks_projection
+        rate = os.getenv(self.ENV_RATE)
+        self.rate = int(rate) if rate else self.DEFAULT_RATE
+        self.bucket = TokenBucket(self.rate) if self.rate > 0 else None
+        self.state_path = BaseDirectory.save_cache_path(
+            Config.applicationID) + '/prewarm.json'
+        self.finished_playlists = self.__load_state()
+        self.future = None
+
+    def __load_state(self):
+        try:
+            with open(self.state_path, "r") as state_file:
+                finished = json.load(state_file).get('finished', {})
+        except (FileNotFoundError, ValueError):
+            return {}
+        # Older versions kept a plain list without snapshot ids, those
+        # playlists are walked once more.
+        return finished if isinstance(finished, dict) else {}
+
+    def __save_state(self):
+        temp_path = self.state_path + '.part'
+        with open(temp_path, "w") as state_file:
+            json.dump({'finished': self.finished_playlists}, state_file,
+                      sort_keys=True)
+        os.replace(temp_path, self.state_path)
+
+    def __is_finished(self, playlist):
+        return playlist['uri'] in self.finished_playlists and \
+            self.finished_playlists[playlist['uri']] == \
+            playlist.get('snapshot_id')
+
+    def start(self, playlists):
+        if self.bucket is None or self.future is not None or \
+                BandwidthProfile.is_enabled():
+            return
+        self.future = IoEngine.get().spawn(self.__prewarm(playlists))
+
+    def stop(self):
+        if self.future:
+            self.future.cancel()
+
+    async def __wait_until_allowed(self):
+        while UserActivity.is_active() or not Connectivity.is_online() or \
+                BandwidthProfile.is_enabled():
+            Metrics.inc('prewarm.paused')
+            await asyncio.sleep(1)
+
+    def __missing_cover(self, urls, size):
+        dim = Dimensions(size, size, True)
+        if not urls:
+            return None
+        image_url, desired_dim = get_desired_image_for_size(size, urls)
+        if image_url is None or desired_dim.width is None or \
+                get_thumbnail_key(image_url, dim) in self.pixbuf_cache.thumbnail_pack:
+            return None
+        return image_url, dim
+
+    async def __fetch(self, image_url):
+        cover_store = self.pixbuf_cache.cover_store
+        if cover_store.has(image_url):
+            return True
+        await self.__wait_until_allowed()
+        try:
+            path = await IoEngine.get().run(
+                cover_store.fetch, image_url, download_to_file)
+        except CoverDownloadError as e:
+            self.pixbuf_cache.failure_cache.record_failure(
+                image_url, e.permanent)
+            return False
+        size = os.path.getsize(path)
+        Metrics.inc('prewarm.bytes', size)
+        await self.bucket.consume(size)
+        return True
+
+    async def __prewarm_playlist(self, playlist, jobs):
+        """Queues thumbnail jobs for the covers of playlist. Returns the
+        thumbnail keys it needs, or None if a cover could not be fetched."""
+        wanted = [
+            self.__missing_cover(playlist['images'], size)
+            for size in (self.ROW_SIZE, self.HEADER_SIZE)]
+        await self.__wait_until_allowed()
+        tracks = await IoEngine.get().run(
+            self.playlist_tracks_projection.request,
+            sp.get().playlist_tracks,
+            playlist_id=playlist['uri'].split(':')[-1],
+            limit=self.TRACKS_PER_PLAYLIST)
+        seen_albums = set()
+        for item in tracks['items']:
+            track = item['track']
+            if track is None or track['album']['uri'] in seen_albums:
+                continue
+            seen_albums.add(track['album']['uri'])
+            wanted.append(self.__missing_cover(
+                track['album']['images'], self.ROW_SIZE))
+
+        keys = []
+        complete = True
+        for cover in wanted:
+            if cover is None:
+                continue
+            image_url, dim = cover
+            if self.pixbuf_cache.failure_cache.should_skip(image_url) or \
+                    not await self.__fetch(image_url):
+                complete = False
+                continue
+            jobs.append((
+                image_url,
+                self.pixbuf_cache.cover_store.path_for_url(image_url),
+                dim))
+            keys.append(get_thumbnail_key(image_url, dim))
+        return keys if complete else None
+
+    async def __prewarm(self, playlists):
+        thumbnailer = BatchThumbnailer(self.pixbuf_cache.thumbnail_pack)
+        loop = asyncio.get_running_loop()
+        jobs = []
+        walked_since_batch = []
+
+        async def flush():
+            if jobs:
+                report = await loop.run_in_executor(
+                    None, thumbnailer.run, list(jobs))
+                Metrics.inc('prewarm.batches')
+                Metrics.inc('prewarm.thumbnails', report.done)
+                Metrics.inc('prewarm.thumbnail_failures', report.failed)
+                jobs.clear()
+            # Only what made it into the pack counts, a failed or dropped
+            # thumbnail has the playlist walked again next time.
+            pack = self.pixbuf_cache.thumbnail_pack
+            for playlist, keys in walked_since_batch:
+                if all(key in pack for key in keys):
+                    self.finished_playlists[playlist['uri']] = \
+                        playlist.get('snapshot_id')
+                    Metrics.inc('prewarm.playlists')
+            walked_since_batch.clear()
+            self.__save_state()
+
+        for playlist in playlists:
+            if self.__is_finished(playlist):
+                continue
+            try:
+                keys = await self.__prewarm_playlist(playlist, jobs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+                continue
+            if keys is None:
+                Metrics.inc('prewarm.incomplete_playlists')
+                continue
+            walked_since_batch.append((playlist, keys))
+            if len(jobs) >= self.BATCH_SIZE:
+                await flush()
+        await flush()
@@ -21,7 +21,7 @@ import sys
 import spotipy
 from gi.repository import Gtk, GLib, Pango
 
-from .spotify import Spotify as sp
+from .core.spotify import Spotify as sp
 
 
 def can_log_in():
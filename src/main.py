@@ -15,29 +15,72 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import signal
 import sys
 import gi
 gi.require_version("Gtk", "3.0")
 gi.require_version("Handy", "1")
-from gi.repository import Gtk, Gio
+from gi.repository import Gtk, Gio, GLib
 
+from .core.startupProfile import StartupProfile
 from .window import SpotipyneWindow
-from .config import Config
+from .core.config import Config
+from .core.metrics import Metrics
+from .mainLoopWatchdog import MainLoopWatchdog
 
 
 class Application(Gtk.Application):
     def __init__(self):
         super().__init__(application_id=Config.applicationID,
                          flags=Gio.ApplicationFlags.FLAGS_NONE)
+        self.watchdog = None
+
+    def do_startup(self):
+        StartupProfile.mark("application startup")
+        Gtk.Application.do_startup(self)
+
+        self.watchdog = MainLoopWatchdog.from_environment()
+        if self.watchdog:
+            self.watchdog.start()
+
+        show_metrics = Gio.SimpleAction(name="show-metrics")
+        show_metrics.connect("activate", self.on_show_metrics)
+        self.add_action(show_metrics)
+        self.set_accels_for_action("app.show-metrics", ["<Primary><Shift>m"])
+
+        # kill -USR1 <pid> writes the metrics next to the cover cache, so
+        # machines can be compared without opening the dialog.
+        GLib.unix_signal_add(
+            GLib.PRIORITY_DEFAULT, signal.SIGUSR1, self.on_dump_metrics)
+
+    def do_shutdown(self):
+        if self.watchdog:
+            self.watchdog.stop()
+            print(self.watchdog.report())
+        Gtk.Application.do_shutdown(self)
+
+    def on_show_metrics(self, _action, _param):
+        from .metricsDialog import MetricsDialog
+        MetricsDialog(
+            watchdog=self.watchdog,
+            transient_for=self.get_active_window())
+
+    def on_dump_metrics(self):
+        print("Metrics written to " + Metrics.dump_to_file())
+        if self.watchdog:
+            print(self.watchdog.report())
+        return GLib.SOURCE_CONTINUE
 
     def do_activate(self):
         win = self.get_active_window()
         if not win:
-            win = SpotipyneWindow(application=self)
+            with StartupProfile.step("window"):
+                win = SpotipyneWindow(application=self)
         win.present()
 
 
 def main(version):
+    StartupProfile.mark("main")
     Config.version = version
     app = Application()
     return app.run(sys.argv)
@@ -0,0 +1,142 @@
+# mainLoopWatchdog.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import threading
+import time
+import traceback
+
+from gi.repository import GLib
+
+from .core.metrics import Metrics
+
+
+class MainLoopWatchdog:
+    """Detects stalls of the GLib main loop and samples what it was doing.
+
+    A helper thread posts a high priority idle callback and waits for it. If
+    the main loop does not get to it within the threshold, the stack of the
+    main thread is sampled until the loop responds again. Enable it with
+    SPOTIPYNE_WATCHDOG_MS=50.
+    """
+
+    ENV_VARIABLE = "SPOTIPYNE_WATCHDOG_MS"
+    STACK_DEPTH = 12
+    SAMPLE_INTERVAL = 0.01
+
+    class Stall:
+
+        def __init__(self, stack):
+            self.stack = stack
+            self.count = 0
+            self.total_ms = 0.0
+            self.worst_ms = 0.0
+
+    @classmethod
+    def from_environment(cls):
+        threshold = os.getenv(cls.ENV_VARIABLE)
+        if not threshold:
+            return None
+        try:
+            return cls(threshold_ms=float(threshold))
+        except ValueError:
+            print(cls.ENV_VARIABLE + " has to be a number of milliseconds",
+                  file=sys.stderr)
+            return None
+
+    def __init__(self, threshold_ms=50, interval_ms=100):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.main_thread_id = threading.main_thread().ident
+        self.stalls = {}
+        self.stalls_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.__watch, daemon=True, name="main-loop-watchdog")
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def __sample_main_stack(self):
+        frame = sys._current_frames().get(self.main_thread_id)
+        if frame is None:
+            return None
+        return tuple(
+            "{}:{} {}".format(
+                os.path.basename(entry.filename), entry.lineno, entry.name)
+            for entry in traceback.extract_stack(frame)[-self.STACK_DEPTH:])
+
+    def __watch(self):
+        while not self.stop_event.wait(self.interval):
+            pong = threading.Event()
+            posted = time.perf_counter()
+
+            def on_pong():
+                pong.set()
+                return GLib.SOURCE_REMOVE
+            GLib.idle_add(on_pong, priority=GLib.PRIORITY_HIGH)
+
+            if pong.wait(self.threshold):
+                continue
+
+            # The loop is stalled. Keep sampling, the frame that is on top
+            # most of the time is the one to blame.
+            samples = {}
+            while not pong.wait(self.SAMPLE_INTERVAL) and \
+                    not self.stop_event.is_set():
+                stack = self.__sample_main_stack()
+                if stack:
+                    samples[stack] = samples.get(stack, 0) + 1
+            stalled_ms = (time.perf_counter() - posted) * 1000
+            if samples:
+                culprit = max(samples, key=samples.get)
+            else:
+                culprit = ("<no python frame>",)
+            self.__record(culprit, stalled_ms)
+
+    def __record(self, stack, stalled_ms):
+        Metrics.inc('mainloop.stalls')
+        Metrics.observe('mainloop.stall_ms', stalled_ms)
+        with self.stalls_lock:
+            if stack not in self.stalls:
+                self.stalls[stack] = self.Stall(stack)
+            stall = self.stalls[stack]
+            stall.count += 1
+            stall.total_ms += stalled_ms
+            stall.worst_ms = max(stall.worst_ms, stalled_ms)
+
+    def report(self, limit=10):
+        with self.stalls_lock:
+            stalls = sorted(
+                self.stalls.values(),
+                key=lambda stall: stall.total_ms,
+                reverse=True)
+        total = sum(stall.count for stall in stalls)
+        lines = ["Main loop stalls over {:.0f}ms: {}".format(
+            self.threshold * 1000, total)]
+        for stall in stalls[:limit]:
+            lines.append("")
+            lines.append("{} stalls, {:.0f}ms total, worst {:.0f}ms".format(
+                stall.count, stall.total_ms, stall.worst_ms))
+            for frame in stall.stack:
+                lines.append("    " + frame)
+        return "\n".join(lines)
@@ -0,0 +1,67 @@
+# metricsDialog.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gtk, Pango
+
+from .core.bandwidthProfile import BandwidthProfile
+from .core.metrics import Metrics
+
+
+class MetricsDialog(Gtk.Dialog):
+
+    RESPONSE_REFRESH = 1
+    RESPONSE_SAVE = 2
+
+    def __init__(self, watchdog=None, **kwargs):
+        super().__init__(title="Metrics", **kwargs)
+        self.watchdog = watchdog
+        self.set_default_size(720, 520)
+        self.add_button("Save to file", self.RESPONSE_SAVE)
+        self.add_button("Refresh", self.RESPONSE_REFRESH)
+
+        self.text_view = Gtk.TextView()
+        self.text_view.set_editable(False)
+        self.text_view.set_cursor_visible(False)
+        self.text_view.override_font(
+            Pango.FontDescription.from_string("monospace"))
+        scrolled_window = Gtk.ScrolledWindow()
+        scrolled_window.set_vexpand(True)
+        scrolled_window.add(self.text_view)
+        self.get_content_area().pack_start(scrolled_window, True, True, 0)
+
+        self.status_label = Gtk.Label(xalign=0)
+        self.get_content_area().pack_end(self.status_label, False, True, 5)
+
+        self.connect("response", self.__on_response)
+        self.refresh()
+        self.show_all()
+
+    def refresh(self):
+        text = Metrics.format_text()
+        if self.watchdog:
+            text += "\n\n" + self.watchdog.report()
+        self.text_view.get_buffer().set_text(text)
+        self.status_label.set_text(BandwidthProfile.summary())
+
+    def __on_response(self, _dialog, response):
+        if response == self.RESPONSE_REFRESH:
+            self.refresh()
+        elif response == self.RESPONSE_SAVE:
+            path = Metrics.dump_to_file()
+            self.status_label.set_text("Saved to " + path)
+        else:
+            self.destroy()
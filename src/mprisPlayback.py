@@ -0,0 +1,152 @@
+# mprisPlayback.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+
+from gi.repository import Gio, GLib
+
+from .core.metrics import Metrics
+from .core.playbackState import PlaybackState
+
+
+class MprisPlayback:
+    """Follows a local Spotify client over MPRIS.
+
+    on_state is called on the main loop with a PlaybackState whenever the
+    client reports a change, and with None when the client goes away. The
+    bus defaults to the session bus, SPOTIPYNE_MPRIS_BUS can point it to a
+    private bus, e.g. one with a stub player on it.
+    """
+
+    ENV_BUS_ADDRESS = 'SPOTIPYNE_MPRIS_BUS'
+    BUS_NAME = 'org.mpris.MediaPlayer2.spotify'
+    OBJECT_PATH = '/org/mpris/MediaPlayer2'
+    PLAYER_INTERFACE = 'org.mpris.MediaPlayer2.Player'
+    CALL_TIMEOUT_MS = 500
+
+    def __init__(self, on_state, bus_name=BUS_NAME):
+        self.on_state = on_state
+        self.bus_name = bus_name
+        self.proxy = None
+        self.properties = {}
+        self.position_us = 0
+        self.position_time = time.monotonic()
+        self.watch_id = None
+
+        self.address = os.environ.get(self.ENV_BUS_ADDRESS)
+        if self.address:
+            Gio.DBusConnection.new_for_address(
+                self.address,
+                Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT
+                | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION,
+                None, None, self.__on_connection)
+        else:
+            Gio.bus_get(Gio.BusType.SESSION, None, self.__on_connection)
+
+    def is_active(self):
+        return self.proxy is not None
+
+    def __on_connection(self, source, result):
+        try:
+            if self.address:
+                connection = Gio.DBusConnection.new_for_address_finish(result)
+            else:
+                connection = Gio.bus_get_finish(result)
+        except GLib.Error as e:
+            print(e)
+            return
+        self.watch_id = Gio.bus_watch_name_on_connection(
+            connection, self.bus_name, Gio.BusNameWatcherFlags.NONE,
+            self.__on_name_appeared, self.__on_name_vanished)
+
+    def __on_name_appeared(self, connection, name, name_owner):
+        Gio.DBusProxy.new(
+            connection, Gio.DBusProxyFlags.NONE, None, name_owner,
+            self.OBJECT_PATH, self.PLAYER_INTERFACE, None,
+            self.__on_proxy_ready)
+
+    def __on_name_vanished(self, connection, name):
+        if self.proxy is None:
+            return
+        self.proxy = None
+        self.properties = {}
+        self.on_state(None)
+
+    def __on_proxy_ready(self, source, result):
+        try:
+            proxy = Gio.DBusProxy.new_finish(result)
+        except GLib.Error as e:
+            print(e)
+            return
+        self.proxy = proxy
+        for name in proxy.get_cached_property_names() or []:
+            self.properties[name] = proxy.get_cached_property(name).unpack()
+        proxy.connect('g-properties-changed', self.__on_properties_changed)
+        proxy.connect('g-signal', self.__on_signal)
+        self.__set_position(self.properties.get('Position', 0))
+        self.__query_position()
+        self.__emit()
+
+    def __on_properties_changed(self, proxy, changed, invalidated):
+        changed = changed.unpack()
+        new_track = 'Metadata' in changed and \
+            changed['Metadata'] != self.properties.get('Metadata')
+        if new_track:
+            self.__set_position(0)
+        else:
+            self.__set_position(self.__current_position())
+        self.properties.update(changed)
+        self.__emit()
+        # Position is not announced, it only moves by itself or on Seeked.
+        if new_track or 'PlaybackStatus' in changed:
+            self.__query_position()
+
+    def __on_signal(self, proxy, sender_name, signal_name, parameters):
+        if signal_name == 'Seeked':
+            self.__set_position(parameters.unpack()[0])
+            self.__emit()
+
+    def __query_position(self):
+        def on_reply(proxy, result):
+            try:
+                position = proxy.call_finish(result).unpack()[0]
+            except GLib.Error as e:
+                print(e)
+                return
+            if self.proxy is proxy:
+                self.__set_position(position)
+                self.__emit()
+        self.proxy.call(
+            'org.freedesktop.DBus.Properties.Get',
+            GLib.Variant('(ss)', (self.PLAYER_INTERFACE, 'Position')),
+            Gio.DBusCallFlags.NONE, self.CALL_TIMEOUT_MS, None, on_reply)
+
+    def __set_position(self, position_us):
+        self.position_us = position_us
+        self.position_time = time.monotonic()
+
+    def __current_position(self):
+        if self.properties.get('PlaybackStatus') != 'Playing':
+            return self.position_us
+        elapsed = time.monotonic() - self.position_time
+        return self.position_us + int(elapsed * 1000000)
+
+    def __emit(self):
+        Metrics.inc('playback.mpris_updates')
+        self.on_state(PlaybackState.from_mpris(
+            self.properties, self.__current_position()))
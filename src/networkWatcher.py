@@ -0,0 +1,41 @@
+# networkWatcher.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gio
+
+from .core.bandwidthProfile import BandwidthProfile
+from .core.connectivity import Connectivity
+
+
+class NetworkWatcher:
+    """Tells Connectivity when Gio.NetworkMonitor sees the network come
+    and go, so no requests are sent that are certain to fail, and
+    BandwidthProfile whether it is metered."""
+
+    def __init__(self):
+        self.monitor = Gio.NetworkMonitor.get_default()
+        self.monitor.connect('network-changed', self.__update)
+        self.monitor.connect('notify::connectivity', self.__update)
+        self.monitor.connect('notify::network-metered', self.__update)
+        self.__update()
+
+    def __update(self, *_args):
+        BandwidthProfile.set_metered(self.monitor.get_network_metered())
+        # A captive portal or a local-only network does not reach Spotify.
+        Connectivity.set_online(
+            self.monitor.get_network_available() and
+            self.monitor.get_connectivity() == Gio.NetworkConnectivity.FULL)
@@ -16,12 +16,13 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import threading
-
 from gi.repository import Gtk, GLib
 
-from .spotify import Spotify as sp
+from .core.spotify import Spotify as sp
 from .contentDeck import ContentDeck
+from .core.ioEngine import IoEngine
+from .core.projection import Projection
+from .core import rowModels
 
 
 @Gtk.Template(resource_path='/xyz/merlinx/Spotipyne/searchOverview.ui')
@@ -30,6 +31,16 @@ class SearchOverview(Gtk.Box):
 
     search_bar_entry = Gtk.Template.Child()
 
+    # The search endpoint has no fields parameter, so this only strips.
+    SEARCH = Projection('search', ','.join(
+        result_type + '(items(' + fields + '))' for result_type, fields in (
+            ('tracks', rowModels.TRACK_FIELDS),
+            ('artists', rowModels.ARTIST_FIELDS),
+            ('albums', rowModels.ALBUM_FIELDS),
+            ('playlists', rowModels.PLAYLIST_FIELDS),
+            ('shows', rowModels.SHOW_FIELDS),
+            ('episodes', rowModels.EPISODE_FIELDS))))
+
     def __init__(self, gui_builder, back_button, **kwargs):
         super().__init__(**kwargs)
         self.gui_builder = gui_builder
@@ -65,7 +76,8 @@ class SearchOverview(Gtk.Box):
         self.search_deck.set_default_widget(widget)
 
     def set_new_search(self, text):
-        search_response = sp.get().search(
+        search_response = self.SEARCH.request(
+            sp.get().search,
             text, limit=4, offset=0,
             type='track,playlist,show,episode,album,artist')
 
@@ -79,10 +91,4 @@ class SearchOverview(Gtk.Box):
 
     def search(self, entry):
         text = entry.get_buffer().get_text()
-        thread = threading.Thread(
-            target=self.set_new_search,
-            daemon=True,
-            args=(
-                text,
-                ))
-        thread.start()
+        IoEngine.get().submit(self.set_new_search, text)
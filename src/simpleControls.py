@@ -15,13 +15,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import threading
 from spotipy import SpotifyException
 
 from gi.repository import Gtk, GLib, Gio
 
-from .spotify import Spotify as sp
+from .core.spotify import Spotify as sp
 from .coverArtLoader import Dimensions
+from .uiDispatcher import UiDispatcher
+from .core.commandQueue import CommandQueue
+from .core.connectivity import OfflineError
+from .core.editQueue import EditQueue
 
 
 @Gtk.Template(resource_path='/xyz/merlinx/Spotipyne/simpleControls.ui')
@@ -33,7 +36,7 @@ class SimpleControls(Gtk.Revealer):
         def __init__(self, spotify_playback, **kwargs):
             super().__init__(**kwargs)
             spotify_playback.connect("is_playing_changed", self.update_label)
-            self.connect("clicked", self.on_clicked)
+            self.connect("clicked", self.on_clicked, spotify_playback)
             self.show()
             self.__is_playing = False
             self.playing_image = Gtk.Image.new_from_icon_name(
@@ -50,17 +53,25 @@ class SimpleControls(Gtk.Revealer):
                     self.set_image(self.playing_image)
                 else:
                     self.set_image(self.paused_image)
-            GLib.idle_add(to_main_thread)
-
-        def on_clicked(self, _):
-            def to_bg():
-                if self.__is_playing:
-                    sp.pause_playback()
-                else:
-                    sp.start_playback()
+            UiDispatcher.get().dispatch(self, to_main_thread, key='image')
 
-            thread = threading.Thread(daemon=True, target=to_bg)
-            thread.start()
+        def on_clicked(self, _, spotify_playback):
+            # The icon flips right away, quick clicks collapse into one
+            # command for where they end up.
+            playing = not self.__is_playing
+            spotify_playback.expect(
+                'is_playing', playing, wait_for_snapshot=True)
+            CommandQueue.get().put(
+                'play_state', self.send, spotify_playback, playing)
+
+        def send(self, spotify_playback, playing):
+            if playing:
+                ok = sp.start_playback()
+                notice = "Could not resume playback"
+            else:
+                ok = sp.pause_playback()
+                notice = "Could not pause playback"
+            spotify_playback.settle('is_playing', playing, ok, notice)
 
     class SaveTrackButton(Gtk.Button):
 
@@ -85,24 +96,35 @@ class SimpleControls(Gtk.Revealer):
                     self.set_image(self.remove_saved_icon_image)
                 else:
                     self.set_image(self.add_saved_icon_image)
-            GLib.idle_add(to_main_thread)
+            UiDispatcher.get().dispatch(self, to_main_thread, key='image')
 
         def on_clicked(self, _, spotify_playback):
-            def to_bg():
-                try:
-                    current_track_uri = spotify_playback.track_uri
-                    saved = self.__is_saved_track
-                    if saved:
-                        sp.get().current_user_saved_tracks_delete(
-                            [current_track_uri])
-                    else:
-                        sp.get().current_user_saved_tracks_add(
-                            [current_track_uri])
-                    spotify_playback.emit("is_saved_track_changed", not saved)
-                except SpotifyException as e:
-                    print(str(e))
-            thread = threading.Thread(daemon=True, target=to_bg)
-            thread.start()
+            saved = not self.__is_saved_track
+            spotify_playback.expect('is_saved_track', saved)
+            # Toggles of one track coalesce, those of different tracks don't.
+            track_uri = spotify_playback.track_uri
+            CommandQueue.get().put(
+                ('saved_track', track_uri), self.send, spotify_playback,
+                track_uri, saved)
+
+        def send(self, spotify_playback, track_uri, saved):
+            try:
+                if saved:
+                    sp.get().current_user_saved_tracks_add([track_uri])
+                else:
+                    sp.get().current_user_saved_tracks_delete([track_uri])
+                ok = True
+            except OfflineError:
+                EditQueue.get().put(
+                    EditQueue.SAVE if saved else EditQueue.REMOVE,
+                    [track_uri])
+                ok = True
+            except SpotifyException as e:
+                print(str(e))
+                ok = False
+            notice = "Could not add the track to Liked Songs" if saved \
+                else "Could not remove the track from Liked Songs"
+            spotify_playback.settle('is_saved_track', saved, ok, notice)
 
     class SimpleProgressBar(Gtk.ProgressBar):
 
@@ -130,6 +152,8 @@ class SimpleControls(Gtk.Revealer):
             self.set_fraction(self.get_fraction() + self.__smoothing_speed)
             return True
 
+    NOTICE_SECONDS = 4
+
     progressbar_box = Gtk.Template.Child()
     mainbox = Gtk.Template.Child()
 
@@ -142,6 +166,14 @@ class SimpleControls(Gtk.Revealer):
         self.cover_art = Gtk.Image()
         self.mainbox.pack_start(self.cover_art, False, True, 0)
 
+        self.notice_label = Gtk.Label()
+        self.notice_revealer = Gtk.Revealer()
+        self.notice_revealer.add(self.notice_label)
+        self.progressbar_box.pack_start(
+            self.notice_revealer, False, True, 0)
+        self.__notice_timeout = None
+        spotify_playback.connect("command_failed", self.on_command_failed)
+
         self.song_label = Gtk.Label()
         self.song_label.set_line_wrap(False)
         self.mainbox.pack_start(self.song_label, False, True, 0)
@@ -193,7 +225,10 @@ class SimpleControls(Gtk.Revealer):
 
     def update_devices_list(self, spotify_playback):
         def activate_device(action, value, device_id):
-            sp.get().transfer_playback(device_id, force_play=True)
+            sp.active_device_id = device_id
+            CommandQueue.get().put(
+                'transfer', sp.get().transfer_playback, device_id,
+                force_play=True)
         self.devices_list_menu.remove_all()
         devs = spotify_playback.get_devices()
         self.set_reveal_child(len(devs) != 0)
@@ -214,6 +249,20 @@ class SimpleControls(Gtk.Revealer):
             spotify_playback.get_artist_names())
         self.song_label.set_markup(label_string)
 
+    def on_command_failed(self, spotify_playback, notice):
+        def to_main_thread():
+            def hide_notice():
+                self.__notice_timeout = None
+                self.notice_revealer.set_reveal_child(False)
+                return False
+            if self.__notice_timeout is not None:
+                GLib.source_remove(self.__notice_timeout)
+            self.notice_label.set_text(notice)
+            self.notice_revealer.set_reveal_child(True)
+            self.__notice_timeout = GLib.timeout_add_seconds(
+                self.NOTICE_SECONDS, hide_notice)
+        UiDispatcher.get().dispatch(self, to_main_thread, key='notice')
+
     def on_track_changed(self, spotify_playback, track_uri):
         spotify_playback.set_current_cover_art(
             self.cover_art, Dimensions(60, 60, True))
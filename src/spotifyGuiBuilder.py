@@ -15,16 +15,24 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import threading
+import asyncio
 import time
 import random
 
-from functools import reduce
-
 from gi.repository import Gtk, GLib, Pango
 
+from .core import rowModels
+from .core.catalog import Catalog
+from .core.commandQueue import CommandQueue
+from .core.ioEngine import IoEngine, RequestGroup
+from .core.library import Library
+from .core.metrics import Metrics
+from .core.spotify import Spotify as sp
+from .core.throttle import UserActivity
 from .coverArtLoader import Dimensions
-from .spotify import Spotify as sp
+from .coverPrewarm import CoverPrewarmer
+from .trackFilter import TrackFilter
+from .trackSelection import TrackSelection
 
 # TODO maybe just remove the non genericRows
 
@@ -77,113 +85,221 @@ class PlaylistRow(GenericSpotifyRow):
 
 class SpotifyGuiBuilder:
 
+    HEADER_COVER_SIZE = 128
+
     def __init__(self, cover_art_loader):
         self.cover_art_loader = cover_art_loader
+        self.cover_prewarmer = CoverPrewarmer(
+            cover_art_loader.pixbuf_cache, Library.PLAYLIST_TRACKS)
         self.current_playlist_iD = ''
 
-    def get_playlists(self):
-        all_playlists = []
-        offset = 0
-        page_size = 50
-        keep_going = True
-        while keep_going:
-            playlists_response = sp.get().current_user_playlists(limit=page_size, offset=offset)
-            keep_going = playlists_response['next'] is not None
-            offset += page_size
-            all_playlists += playlists_response['items']
-        return all_playlists
-
-    def get_saved_tracks(self):
-        all_tracks = []
-        offset = 0
-        page_size = 50
-        keep_going = True
-        while keep_going:
-            tracks_response = sp.get().current_user_saved_tracks(
-                    limit=page_size,
-                    offset=offset
-            )
-            keep_going = tracks_response['next'] is not None
-            offset += page_size
-            all_tracks += tracks_response['items']
-        return [track_response['track'] for track_response in all_tracks]
-
-    def get_playlist_tracks(self, playlist_id):
-        all_tracks = []
-        offset = 0
-        page_size = 100
-        keep_going = True
-        while keep_going:
-            tracks_response = sp.get().playlist_tracks(
-                playlist_id=playlist_id,
-                fields='items(track(uri,id,name,artists(name),album(id,uri,images))),next',
-                limit=page_size, offset=offset)
-            keep_going = tracks_response['next'] is not None
-            offset += page_size
-            all_tracks += tracks_response['items']
-        return [track_response['track'] for track_response in all_tracks]
-
     def load_generic_list(self,
                           generic_list,
                           raw_data,
-                          build_entry_function,
-                          stop_event):
-        def load_chunk(chunk):
-            for raw_data_for_entry in chunk:
-                entry = build_entry_function(raw_data_for_entry)
-                generic_list.insert(entry, -1)
-            generic_list.show_all()
+                          build_model_function,
+                          stop_event,
+                          on_rows_added=None):
+        # The view-models are built here on the I/O loop, the main thread
+        # only creates the widgets for them. Without a build_model_function
+        # raw_data already yields models (TrackStore). on_rows_added gets
+        # every chunk of new rows on the main thread, e.g. to filter them.
+        def load_chunk(models):
+            start = time.perf_counter()
+            rows = [self.bind_row(model) for model in models]
+            for row in rows:
+                generic_list.insert(row, -1)
+                row.show_all()
+            generic_list.show()
+            if on_rows_added:
+                on_rows_added(rows)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            Metrics.inc('rows.built', len(models))
+            Metrics.observe('rows.chunk_build_ms', elapsed_ms)
+            if len(models) > 0:
+                Metrics.observe('rows.row_build_us', elapsed_ms * 1000 / len(models))
 
         def chunks(l, n):
             for i in range(0, len(l), n):
                 yield l[i:i+n]
 
         def set_listbox_attributes(listbox):
-            listbox.set_selection_mode(Gtk.SelectionMode.NONE)
+            # A TrackSelection may be selecting already.
+            if listbox.get_selection_mode() != Gtk.SelectionMode.MULTIPLE:
+                listbox.set_selection_mode(Gtk.SelectionMode.NONE)
         GLib.idle_add(set_listbox_attributes, generic_list)
 
-        for chunk in chunks(raw_data, 10):
-            GLib.idle_add(load_chunk, chunk, priority=GLib.PRIORITY_LOW)
-            time.sleep(0.5)
-            if stop_event and stop_event.is_set():
-                return
-
+        async def feed_chunks():
+            UserActivity.begin()
+            try:
+                for chunk in chunks(raw_data, 10):
+                    if build_model_function:
+                        models = [build_model_function(raw) for raw in chunk]
+                    else:
+                        models = chunk
+                    GLib.idle_add(load_chunk, models, priority=GLib.PRIORITY_LOW)
+                    await asyncio.sleep(0.5)
+                    if stop_event and stop_event.is_set():
+                        return
+            finally:
+                UserActivity.end()
+
+        return IoEngine.get().spawn(feed_chunks(), group=stop_event)
 
     def load_playlist_tracks_list(self,
                                   playlist_tracks_list,
                                   playlist_id,
-                                  stop_event):
-        playlist_tracks = self.get_playlist_tracks(playlist_id)
+                                  stop_event,
+                                  track_filter=None):
+        playlist_tracks = Library.get_playlist_tracks(playlist_id)
+        if track_filter:
+            GLib.idle_add(track_filter.set_track_store, playlist_tracks)
         self.load_generic_list(
             playlist_tracks_list,
             playlist_tracks,
-            self.build_track_entry,
-            stop_event
+            None,
+            stop_event,
+            track_filter.add_rows if track_filter else None
         )
 
-    def build_artist_page(self, artist_uri):
+    def __build_track_tools(self, track_filter, track_selection):
+        hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        hbox.pack_start(track_filter.entry, True, True, 0)
+        hbox.pack_start(track_selection.toggle, False, True, 0)
+        return hbox
+
+    def __build_page_header(self, vbox):
+        image = self.cover_art_loader.get_loading_image()
+        label = Gtk.Label(xalign=0.5)
+        vbox.pack_start(image, False, True, 0)
+        vbox.pack_start(label, False, True, 0)
+        return image, label
+
+    def __fill_page_header(self, image, label, uri, images, markup):
+        self.cover_art_loader.async_update_cover(
+            image, uri, images, dimensions=Dimensions(
+                self.HEADER_COVER_SIZE, self.HEADER_COVER_SIZE, True))
+
+        def set_label():
+            label.set_markup(markup)
+            label.show_all()
+        # Ahead of the list chunks, which are added at PRIORITY_LOW.
+        GLib.idle_add(set_label)
+
+    def __build_page_section(self, vbox, title):
+        title_label = Gtk.Label(xalign=0)
+        title_label.set_markup('<b>' + title + '</b>')
+        section_list = Gtk.ListBox()
+        vbox.pack_start(title_label, False, True, 0)
+        vbox.pack_start(section_list, False, True, 0)
+        return section_list
+
+    def build_artist_page(self, artist_uri, push_page_function=None):
+        artist_id = artist_uri.split(':')[-1]
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-        vbox.page_stop_event = threading.Event()
-        vbox.pack_start(Gtk.Label("Artist " + artist_uri), False, True, 0)
+        vbox.page_stop_event = RequestGroup()
+        artist_image, artist_label = self.__build_page_header(vbox)
+        top_tracks_list = self.__build_page_section(vbox, "Popular")
+        albums_list = self.__build_page_section(vbox, "Albums")
+        related_list = self.__build_page_section(vbox, "Fans also like")
+
+        def on_top_track_activated(_listbox, row):
+            CommandQueue.get().put(
+                'start', sp.start_playback, uris=[row.get_uri()])
+
+        def on_album_activated(_listbox, row):
+            push_page_function(self.build_album_page(row.get_uri()))
+
+        def on_related_artist_activated(_listbox, row):
+            push_page_function(self.build_artist_page(
+                row.get_uri(), push_page_function))
+
+        top_tracks_list.connect('row-activated', on_top_track_activated)
+        if push_page_function:
+            albums_list.connect('row-activated', on_album_activated)
+            related_list.connect('row-activated', on_related_artist_activated)
+
+        # All four requests go out at once, every section is filled as soon
+        # as its own response is there.
+        async def load_header():
+            artist = await Catalog.artist(artist_id)
+            markup = '<b>' + rowModels.escape_markup(artist['name']) + '</b>'
+            markup += '\n' + str(artist['followers']['total']) + ' followers'
+            if artist['genres']:
+                markup += '\n' + rowModels.escape_markup(
+                    ', '.join(artist['genres']))
+            self.__fill_page_header(
+                artist_image, artist_label, artist_uri, artist['images'],
+                markup)
+
+        async def load_top_tracks():
+            top_tracks = await Catalog.artist_top_tracks(artist_id)
+            self.load_generic_list(
+                top_tracks_list, top_tracks,
+                rowModels.track_model, vbox.page_stop_event)
+
+        async def load_albums():
+            albums = await Catalog.artist_albums(artist_id)
+            self.load_generic_list(
+                albums_list, albums,
+                rowModels.album_model, vbox.page_stop_event)
+
+        async def load_related_artists():
+            related = await Catalog.related_artists(artist_id)
+            self.load_generic_list(
+                related_list, related,
+                rowModels.artist_model, vbox.page_stop_event)
+
+        for load in (load_header, load_top_tracks, load_albums,
+                     load_related_artists):
+            IoEngine.get().spawn(load(), group=vbox.page_stop_event)
         vbox.show_all()
         return vbox
 
     def build_album_page(self, album_uri):
+        album_id = album_uri.split(':')[-1]
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-        vbox.page_stop_event = threading.Event()
-        vbox.pack_start(Gtk.Label("Album " + album_uri), False, True, 0)
+        vbox.page_stop_event = RequestGroup()
+        album_image, album_label = self.__build_page_header(vbox)
+        tracks_list = Gtk.ListBox()
+        vbox.pack_start(tracks_list, False, True, 0)
+
+        def on_track_activated(_listbox, row):
+            CommandQueue.get().put(
+                'start', sp.start_playback,
+                context_uri=album_uri, offset={"uri": row.get_uri()})
+
+        tracks_list.connect('row-activated', on_track_activated)
+
+        async def load_album():
+            album = await Catalog.album(album_id)
+            self.__fill_page_header(
+                album_image, album_label, album_uri, album['images'],
+                rowModels.two_line_markup(
+                    album['name'],
+                    rowModels.join_artist_names(album['artists'])))
+            tracks = await Catalog.album_tracks(album)
+            self.load_generic_list(
+                tracks_list, tracks, None, vbox.page_stop_event)
+
+        IoEngine.get().spawn(load_album(), group=vbox.page_stop_event)
         vbox.show_all()
         return vbox
 
     def build_saved_tracks_page(self):
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-        vbox.page_stop_event = threading.Event()
+        vbox.page_stop_event = RequestGroup()
         tracks_list = Gtk.ListBox()
         image = Gtk.Image.new_from_icon_name(
             "emblem-favorite-symbolic.symbolic", Gtk.IconSize.DIALOG)
         label = Gtk.Label("Liked Songs", xalign=0)
+        track_filter = TrackFilter()
+        track_selection = TrackSelection(tracks_list)
         vbox.pack_start(image, False, True, 0)
         vbox.pack_start(label, False, True, 0)
+        vbox.pack_start(
+            self.__build_track_tools(track_filter, track_selection),
+            False, True, 0)
+        vbox.pack_start(track_selection.action_bar, False, True, 0)
         vbox.pack_start(tracks_list, False, True, 0)
 
         def on_saved_tracks_list_row_activated(listbox, row):
@@ -196,16 +312,18 @@ class SpotifyGuiBuilder:
         tracks_list.connect('row-activated', on_saved_tracks_list_row_activated)
 
         def load_saved_tracks_list():
-            saved_tracks = self.get_saved_tracks()
+            saved_tracks = Library.get_saved_tracks()
+            GLib.idle_add(track_filter.set_track_store, saved_tracks)
             self.load_generic_list(
                 tracks_list,
                 saved_tracks,
-                self.build_track_entry,
-                vbox.page_stop_event
+                None,
+                vbox.page_stop_event,
+                track_filter.add_rows
             )
             pass
 
-        threading.Thread(daemon=True, target=load_saved_tracks_list).start()
+        IoEngine.get().submit(load_saved_tracks_list, group=vbox.page_stop_event)
 
         vbox.show_all()
         return vbox
@@ -213,46 +331,49 @@ class SpotifyGuiBuilder:
     def build_playlist_page(self, playlist_uri):
         playlist_id = playlist_uri.split(':')[-1]
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-        vbox.page_stop_event = threading.Event()
+        vbox.page_stop_event = RequestGroup()
         playlist_image = self.cover_art_loader.get_loading_image()
         label = Gtk.Label(xalign=0.5)
         play_button = Gtk.Button("play random", halign=Gtk.Align.CENTER)
         playlist_tracks_list = Gtk.ListBox()
+        track_filter = TrackFilter()
+        track_selection = TrackSelection(playlist_tracks_list)
         vbox.pack_start(playlist_image, False, True, 0)
         vbox.pack_start(label, False, True, 0)
         vbox.pack_start(play_button, False, False, 0)
+        vbox.pack_start(
+            self.__build_track_tools(track_filter, track_selection),
+            False, True, 0)
+        vbox.pack_start(track_selection.action_bar, False, True, 0)
         vbox.pack_start(playlist_tracks_list, False, True, 0)
 
         def play_random(_button):
             try:
-                random_row = random.choice(playlist_tracks_list.get_children())
+                random_row = random.choice([
+                    row for row in playlist_tracks_list.get_children()
+                    if row.get_visible()])
             except IndexError:
                 return
             uri = random_row.get_uri()
-            def helper():
-                sp.start_playback(
-                    context_uri=playlist_uri, offset={
-                        "uri": uri})
-            threading.Thread(daemon=True, target=helper).start()
+            CommandQueue.get().put(
+                'start', sp.start_playback,
+                context_uri=playlist_uri, offset={"uri": uri})
 
         play_button.connect("clicked", play_random)
 
         def on_playlist_tracks_list_row_activated(listbox, row):
             uri = row.get_uri()
-            def helper():
-                sp.start_playback(
-                    context_uri=playlist_uri, offset={
-                        "uri": uri})
-            sp_thread = threading.Thread(daemon=True, target=helper)
-            sp_thread.start()
+            CommandQueue.get().put(
+                'start', sp.start_playback,
+                context_uri=playlist_uri, offset={"uri": uri})
 
         playlist_tracks_list.connect(
             'row-activated', on_playlist_tracks_list_row_activated)
 
         def load_playlist_page():
             def load_label_and_image():
-                playlist_info_response = sp.get().playlist(
-                    playlist_id, fields='name,images,followers(total),owner(display_name)')
+                playlist_info_response = Library.get_playlist_info(
+                    playlist_id)
                 playlist_cover_size_big = 128
                 images = playlist_info_response['images']
                 self.cover_art_loader.async_update_cover(
@@ -275,21 +396,41 @@ class SpotifyGuiBuilder:
 
                 GLib.idle_add(build_playlist_label, priority=GLib.PRIORITY_LOW)
 
-            thread_label = threading.Thread(
-                daemon=True, target=load_label_and_image)
-            thread_label.start()
-            thread_tracks = threading.Thread(
-                daemon=True, target=self.load_playlist_tracks_list, args=(
-                    playlist_tracks_list, playlist_id, vbox.page_stop_event))
-            thread_tracks.start()
+            IoEngine.get().submit(
+                load_label_and_image, group=vbox.page_stop_event)
+            IoEngine.get().submit(
+                self.load_playlist_tracks_list,
+                playlist_tracks_list, playlist_id, vbox.page_stop_event,
+                track_filter, group=vbox.page_stop_event)
         load_playlist_page()
         vbox.show_all()
         return vbox
 
     def build_show_page(self, show_uri):
+        show_id = show_uri.split(':')[-1]
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-        vbox.page_stop_event = threading.Event()
-        vbox.pack_start(Gtk.Label("Show " + show_uri), False, True, 0)
+        vbox.page_stop_event = RequestGroup()
+        show_image, show_label = self.__build_page_header(vbox)
+        episodes_list = Gtk.ListBox()
+        vbox.pack_start(episodes_list, False, True, 0)
+
+        def on_episode_activated(_listbox, row):
+            CommandQueue.get().put(
+                'start', sp.start_playback, uris=[row.get_uri()])
+
+        episodes_list.connect('row-activated', on_episode_activated)
+
+        async def load_show():
+            show = await Catalog.show(show_id)
+            self.__fill_page_header(
+                show_image, show_label, show_uri, show['images'],
+                rowModels.two_line_markup(show['name'], show['publisher']))
+            episodes = await Catalog.show_episodes(show)
+            self.load_generic_list(
+                episodes_list, episodes, rowModels.episode_model,
+                vbox.page_stop_event)
+
+        IoEngine.get().spawn(load_show(), group=vbox.page_stop_event)
         vbox.show_all()
         return vbox
 
@@ -312,79 +453,42 @@ class SpotifyGuiBuilder:
         entry.add(hbox)
         return entry
 
-    def build_track_entry(self, track):
-        album_uri = track['album']['uri']
-        row = TrackRow(uri=track['uri'])
-        image_responses = track['album']['images']
-
-        track_name_string = track['name']
-        artist_string = reduce(
-            lambda a, b: {'name': a['name'] + ", " + b['name']},
-            track['artists'][1:],
-            track['artists'][0])['name']
-        track_label_string = '<b>' + GLib.markup_escape_text(
-            track_name_string) + '</b>' + '\n' + GLib.markup_escape_text(artist_string)
+    ROW_CLASSES = {
+        'track': TrackRow,
+        'artist': ArtistRow,
+        'episode': EpisodeRow,
+        'show': ShowRow,
+        'album': AlbumRow,
+        'playlist': PlaylistRow,
+    }
+
+    def bind_row(self, model):
+        row = self.ROW_CLASSES[model.kind](uri=model.uri)
         return self.__build_generic_entry(
-            row, image_responses, album_uri, track_label_string)
+            row, model.images, model.cover_uri, model.markup)
+
+    def build_track_entry(self, track):
+        return self.bind_row(rowModels.track_model(track))
 
     def build_artist_entry(self, artist_response):
-        artist_uri = artist_response['uri']
-        row = ArtistRow(uri=artist_uri)
-        image_responses = artist_response['images']
-        label_markup = '<b>' + GLib.markup_escape_text(
-            artist_response['name']) + '</b>' + '\n' + GLib.markup_escape_text(
-            str(artist_response['followers']['total']) + ' followers')
-        return self.__build_generic_entry(
-            row, image_responses, artist_uri, label_markup)
+        return self.bind_row(rowModels.artist_model(artist_response))
 
     def build_episode_entry(self, episode_response):
-        if episode_response is None:
-            return self.__build_generic_entry(
-                EpisodeRow(uri='episode::Response is None'),
-                None, "No Uri. Episode is None", "No Uri. Episode is None")
-        episode_uri = episode_response['uri']
-        row = EpisodeRow(uri=episode_uri)
-        image_responses = episode_response['images']
-        label_markup = '<b>' + GLib.markup_escape_text(
-            episode_response['name']) + '</b>' + '\n' + GLib.markup_escape_text(
-            episode_response['description'])
-        return self.__build_generic_entry(
-            row, image_responses, episode_uri, label_markup)
+        return self.bind_row(rowModels.episode_model(episode_response))
 
     def build_show_entry(self, show_response):
-        show_uri = show_response['uri']
-        row = ShowRow(uri=show_uri)
-        image_responses = show_response['images']
-        label_markup = '<b>' + GLib.markup_escape_text(
-            show_response['name']) + '</b>' + '\n' + GLib.markup_escape_text(show_response['publisher'])
-        return self.__build_generic_entry(
-            row, image_responses, show_uri, label_markup)
+        return self.bind_row(rowModels.show_model(show_response))
 
     def build_album_entry(self, album_response):
-        album_uri = album_response['uri']
-        row = AlbumRow(uri=album_uri)
-        image_responses = album_response['images']
-        artist_string = reduce(
-            lambda a, b: {'name': a['name'] + ", " + b['name']},
-            album_response['artists'][1:],
-            album_response['artists'][0])['name']
-        label_markup = '<b>' + GLib.markup_escape_text(
-            album_response['name']) + '</b>' + '\n' + GLib.markup_escape_text(artist_string)
-        return self.__build_generic_entry(
-            row, image_responses, album_uri, label_markup)
+        return self.bind_row(rowModels.album_model(album_response))
 
     def build_playlist_entry(self, playlist_response):
-        playlist_uri = playlist_response['uri']
-        row = PlaylistRow(uri=playlist_uri)
-        image_responses = playlist_response['images']
-        return self.__build_generic_entry(
-            row, image_responses, playlist_uri, GLib.markup_escape_text(
-                playlist_response['name']))
+        return self.bind_row(rowModels.playlist_model(playlist_response))
 
     def build_search_results(self, search_result_box,
                            search_response, set_search_overlay_function):
         def _search_result_helper(
-                search_type, name, build_entry_function, activation_handler):
+                search_type, name, build_model_function, activation_handler):
             response = search_response[search_type]
             result_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
             result_title = Gtk.Label(xalign=0)
@@ -393,10 +497,8 @@ class SpotifyGuiBuilder:
             if len(response['items']) != 0:
                 results_list = Gtk.ListBox()
                 results_list.connect("row-activated", activation_handler)
-                list_loader_thread = threading.Thread(
-                    daemon=True, target=self.load_generic_list, args=(
-                        results_list, response['items'], build_entry_function, None))
-                list_loader_thread.start()
+                self.load_generic_list(
+                    results_list, response['items'], build_model_function, None)
                 result_box.pack_start(results_list, False, True, 0)
                 search_result_box.pack_start(result_box, False, True, 0)
             else:
@@ -409,39 +511,39 @@ class SpotifyGuiBuilder:
 
         search_queries = [{'type': 'tracks',
                           'name': 'Tracks',
-                          'build_entry_function': self.build_track_entry,
+                          'build_model_function': rowModels.track_model,
                           'activation_handler': lambda _,
-                          entry: sp.start_playback(uris=[entry.get_uri()])},
+                          entry: CommandQueue.get().put('start', sp.start_playback, uris=[entry.get_uri()])},
                          {'type': 'artists',
                           'name': 'Artists',
-                          'build_entry_function': self.build_artist_entry,
+                          'build_model_function': rowModels.artist_model,
                           'activation_handler': lambda _,
-                          entry: set_search_overlay_function(self.build_artist_page(entry.get_uri()))},
+                          entry: set_search_overlay_function(self.build_artist_page(entry.get_uri(), set_search_overlay_function))},
                          {'type': 'albums',
                           'name': 'Albums',
-                          'build_entry_function': self.build_album_entry,
+                          'build_model_function': rowModels.album_model,
                           'activation_handler': lambda _,
                           entry: set_search_overlay_function(self.build_album_page(entry.get_uri()))},
                          {'type': 'playlists',
                           'name': 'Playlists',
-                          'build_entry_function': self.build_playlist_entry,
+                          'build_model_function': rowModels.playlist_model,
                           'activation_handler': lambda _,
                           entry: set_search_overlay_function(self.build_playlist_page(entry.get_uri()))},
                          {'type': 'shows',
                           'name': 'Shows',
-                          'build_entry_function': self.build_show_entry,
+                          'build_model_function': rowModels.show_model,
                           'activation_handler': lambda _,
                           entry: set_search_overlay_function(self.build_show_page(entry.get_uri()))},
                          {'type': 'episodes',
                           'name': 'Episodes',
-                          'build_entry_function': self.build_episode_entry,
+                          'build_model_function': rowModels.episode_model,
                           'activation_handler': lambda _,
-                          entry: sp.start_playback(uris=[entry.get_uri()])}]
+                          entry: CommandQueue.get().put('start', sp.start_playback, uris=[entry.get_uri()])}]
         for search_query in search_queries:
             _search_result_helper(
                 search_query['type'],
                 search_query['name'],
-                search_query['build_entry_function'],
+                search_query['build_model_function'],
                 search_query['activation_handler'])
         search_result_box.show_all()
 
@@ -472,13 +574,14 @@ class SpotifyGuiBuilder:
 
             listbox.connect("row-activated", on_row_activated)
             GLib.idle_add(load_saved_tracks_entry)
-            playlists = self.get_playlists()
+            playlists = Library.get_playlists()
             self.load_generic_list(listbox,
                                    playlists,
-                                   self.build_playlist_entry,
+                                   rowModels.playlist_model,
                                    None)
+            self.cover_prewarmer.start(playlists)
 
-        threading.Thread(daemon=True, target=_load_library_helper).start()
+        IoEngine.get().submit(_load_library_helper)
 
     def async_load_playlists(self, playlists_list):
         # TODO use insert
@@ -505,15 +608,7 @@ class SpotifyGuiBuilder:
             playlists_list.show_all()
 
         def load_playlists():
-            all_playlists = []
-            offset = 0
-            page_size = 50
-            keep_going = True
-            while keep_going:
-                playlists_response = sp.get().current_user_playlists(limit=page_size, offset=offset)
-                keep_going = playlists_response['next'] is not None
-                offset += page_size
-                all_playlists += playlists_response['items']
+            all_playlists = Library.get_playlists()
 
             def add_all_playlist_entries():
                 for playlist in all_playlists:
@@ -524,5 +619,4 @@ class SpotifyGuiBuilder:
 
             add_all_playlist_entries()
 
-        thread = threading.Thread(target=load_playlists)
-        thread.start()
+        IoEngine.get().submit(load_playlists)
@@ -15,22 +15,62 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import time
 import threading
 
-from functools import reduce
-
 from gi.repository import GObject
 
-from .spotify import Spotify as sp
+from .core.bandwidthProfile import BandwidthProfile
+from .core.connectivity import Connectivity
+from .core.ioEngine import IoEngine
+from .core.metrics import Metrics
+from .core.playbackState import PlaybackState
+from .core.spotify import Spotify as sp
 
 from .coverArtLoader import Dimensions
+from .mprisPlayback import MprisPlayback
 
 
 class SpotifyPlayback(GObject.Object):
     __gtype_name__ = "SpotifyPlayback"
 
     SLEEP_TIME = 2
+    NO_PLAYBACK_SLEEP_TIME = 5
+    # While MPRIS reports the state the Web API is only asked for devices.
+    MPRIS_SLEEP_TIME = 15
+    # Nothing is requested while offline, coming back online wakes the poll.
+    OFFLINE_SLEEP_TIME = 60
+    # An optimistic value whose command never reports back, e.g. because a
+    # newer command replaced it, gives way to the snapshots after this.
+    OPTIMISTIC_TIMEOUT = 10
+
+    SIGNAL_FOR = {
+        'is_playing': 'is_playing_changed',
+        'is_saved_track': 'is_saved_track_changed',
+    }
+
+    class Optimistic:
+        """A value shown before the server confirmed it.
+
+        wait_for_snapshot says whether the value is confirmed by the next
+        playback snapshot, or by the response to the command itself.
+        """
+
+        __slots__ = ('value', 'wait_for_snapshot', 'since', 'settled_at')
+
+        def __init__(self, value, wait_for_snapshot):
+            self.value = value
+            self.wait_for_snapshot = wait_for_snapshot
+            self.since = time.monotonic()
+            self.settled_at = None
+
+        def is_confirmed_by(self, taken_at):
+            # A snapshot taken before the command went through may still
+            # show the old value.
+            if self.settled_at is not None:
+                return taken_at > self.settled_at
+            return taken_at - self.since > SpotifyPlayback.OPTIMISTIC_TIMEOUT
 
     def __init__(self, cover_art_loader, **kwargs):
         super().__init__(**kwargs)
@@ -47,65 +87,182 @@ class SpotifyPlayback(GObject.Object):
         self.artists = ""
         self.cover_url = ""
         self.is_saved_track = False
+        # What the server last said, is_playing comes with self.state.
+        self.server_saved_track = False
+        self.state = PlaybackState()
+        self.mpris_active = False
+        self.optimistic = {}
+        self.__wake_up = None
 
-        playback_update_thread = threading.Thread(
-            target=self.keep_updating, daemon=True)
-        playback_update_thread.start()
+        self.mpris = MprisPlayback(self.on_mpris_state)
+        Connectivity.add_listener(self.on_connectivity_changed)
+        IoEngine.get().spawn(self.keep_updating())
 
-    def keep_updating(self):
-        is_playing = None
+    async def keep_updating(self):
+        # The poll runs on an I/O thread, the waiting in between is done on
+        # the I/O loop and does not hold a thread.
+        self.__wake_up = asyncio.Event()
+        last_poll = None
         while True:
+            now = time.monotonic()
+            Metrics.inc('playback.polls')
+            if last_poll is not None:
+                Metrics.observe(
+                    'playback.poll_interval_ms', (now - last_poll) * 1000)
+            last_poll = now
+            delay = BandwidthProfile.stretch_poll(
+                await IoEngine.get().run(self.poll_once))
             try:
-                pb = sp.get().current_playback()
-                devices = sp.get().devices()['devices']
-                new_devices_ids = [dev['id'] for dev in devices]
-                self.devices = devices
-                if new_devices_ids != self.devices_ids:
-                    self.devices_ids = new_devices_ids
-                    self.emit("devices_changed")
-
-                if not pb:
-                    if self.has_playback:
-                        self.emit("has_playback", not self.has_playback)
-                    time.sleep(5)
-                    self.has_playback = False
-                    continue
-                else:
-                    if not self.has_playback:
-                        self.emit("has_playback", not self.has_playback)
-                    self.has_playback = True
-
-                if is_playing != pb['is_playing']:
-                    is_playing = pb['is_playing']
-                    self.emit("is_playing_changed", is_playing)
-
-                self.repeat = pb['repeat_state']
-
-                self.shuffle = pb['shuffle_state']
-
-                self.progress_ms = pb['progress_ms']
-
-                if self.track_uri != pb['item']['uri']:
-                    self.track_name = pb['item']['name']
-                    self.artists = reduce(
-                            lambda a, b:
-                            {'name': a['name'] + ", " + b['name']},
-                            pb['item']['artists'][1:],
-                            pb['item']['artists'][0]
-                            )['name']
-                    self.track_uri = pb['item']['uri']
-                    self.duration_ms = pb['item']['duration_ms']
-                    self.cover_url = pb['item']['album']['images']
-                    self.emit("track_changed", self.track_uri)
-                    if sp.get().current_user_saved_tracks_contains(
-                            [self.track_uri])[0]:
-                        self.emit(
-                            "is_saved_track_changed",
-                            self.is_saved_track)
-                self.progress_fraction = self.progress_ms / self.duration_ms
-            except Exception as e:
-                print(e)
-            time.sleep(self.SLEEP_TIME)
+                await asyncio.wait_for(self.__wake_up.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.__wake_up.clear()
+
+    def wake_up(self):
+        """Polls right away instead of waiting for the next interval."""
+        if self.__wake_up is not None:
+            IoEngine.get().loop.call_soon_threadsafe(self.__wake_up.set)
+
+    def on_mpris_state(self, state):
+        mpris_active = state is not None and state.has_playback
+        if mpris_active:
+            self.apply_state(state)
+        if mpris_active != self.mpris_active:
+            self.mpris_active = mpris_active
+            # Back to polling, or fetch what MPRIS does not know right away.
+            self.wake_up()
+
+    def on_connectivity_changed(self, online):
+        if online:
+            self.wake_up()
+
+    def poll_once(self):
+        """Fetches the playback state once, returns the delay until the next poll."""
+        if not Connectivity.is_online():
+            return self.OFFLINE_SLEEP_TIME
+        try:
+            mpris_active = self.mpris_active
+            taken_at = time.monotonic()
+            if not mpris_active:
+                state = PlaybackState.from_response(
+                    PlaybackState.CURRENT_PLAYBACK.request(
+                        sp.get().current_playback))
+            devices = sp.get().devices()['devices']
+            new_devices_ids = [dev['id'] for dev in devices]
+            self.devices = devices
+            sp.remember_devices(devices)
+            if new_devices_ids != self.devices_ids:
+                self.devices_ids = new_devices_ids
+                self.emit("devices_changed")
+            if mpris_active:
+                return self.MPRIS_SLEEP_TIME
+            self.apply_state(state, taken_at)
+            if not state.has_playback:
+                return self.NO_PLAYBACK_SLEEP_TIME
+        except Exception as e:
+            print(e)
+        return self.SLEEP_TIME
+
+    def apply_state(self, state, taken_at=None):
+        """Emits the signals for what changed since the last state, from
+        either the Web API poll or MPRIS."""
+        if taken_at is None:
+            taken_at = time.monotonic()
+        with self.lock:
+            previous = self.state
+            self.state = state
+            if state.has_playback != previous.has_playback:
+                self.has_playback = state.has_playback
+                self.emit("has_playback", state.has_playback)
+            if not state.has_playback:
+                return
+
+            optimistic = self.optimistic.get('is_playing')
+            if optimistic is None:
+                if state.is_playing != previous.is_playing:
+                    self.emit("is_playing_changed", state.is_playing)
+            elif optimistic.is_confirmed_by(taken_at):
+                del self.optimistic['is_playing']
+                if state.is_playing != optimistic.value:
+                    Metrics.inc('playback.optimistic_corrections')
+                    self.emit("is_playing_changed", state.is_playing)
+
+            self.repeat = state.repeat
+            self.shuffle = state.shuffle
+            self.progress_ms = state.progress_ms
+
+            if self.track_uri != state.track_uri:
+                self.track_name = state.track_name
+                self.artists = state.artists
+                self.track_uri = state.track_uri
+                self.duration_ms = state.duration_ms
+                self.cover_url = state.cover_images
+                self.optimistic.pop('is_saved_track', None)
+                self.server_saved_track = False
+                self.emit("track_changed", self.track_uri)
+                IoEngine.get().submit(self.check_saved_track, self.track_uri)
+            self.progress_fraction = state.progress_fraction()
+
+    def check_saved_track(self, track_uri):
+        # MPRIS does not know about the library, this stays a Web API call
+        # and is kept off the main loop.
+        try:
+            saved = sp.get().current_user_saved_tracks_contains(
+                [track_uri])[0]
+            with self.lock:
+                if track_uri != self.track_uri:
+                    return
+                self.server_saved_track = saved
+                # A click that is still on its way wins over this answer.
+                pending = 'is_saved_track' in self.optimistic
+            if not pending:
+                self.emit("is_saved_track_changed", saved)
+        except Exception as e:
+            print(e)
+
+    def expect(self, name, value, wait_for_snapshot=False):
+        """Shows value for name ('is_playing' or 'is_saved_track') before
+        the command for it went out, settle reports how the command did."""
+        with self.lock:
+            self.optimistic[name] = self.Optimistic(value, wait_for_snapshot)
+        Metrics.inc('playback.optimistic_updates')
+        self.emit(self.SIGNAL_FOR[name], value)
+
+    def settle(self, name, value, ok, notice):
+        """Called with the outcome of the command sent for expect.
+
+        A value expected with wait_for_snapshot then waits for the next
+        snapshot taken after now, others are confirmed by the response
+        itself. On failure the last value the server reported comes back,
+        not the one before the click, which after several coalesced clicks
+        may be a value the server never had. command_failed carries notice.
+        """
+        with self.lock:
+            optimistic = self.optimistic.get(name)
+            if optimistic is None or optimistic.value != value:
+                # Superseded by a newer click or a track change.
+                return
+            if ok and optimistic.wait_for_snapshot:
+                optimistic.settled_at = time.monotonic()
+            else:
+                del self.optimistic[name]
+            if ok and name == 'is_saved_track':
+                self.server_saved_track = value
+            server_value = self.__server_value(name)
+        if ok:
+            if not self.mpris_active:
+                self.wake_up()
+            return
+        Metrics.inc('playback.optimistic_rollbacks')
+        # Emitted even if it looks unchanged, the UI still shows the
+        # optimistic value.
+        self.emit(self.SIGNAL_FOR[name], server_value)
+        self.emit("command_failed", notice)
+
+    def __server_value(self, name):
+        if name == 'is_playing':
+            return bool(self.state.is_playing)
+        return self.server_saved_track
 
     @GObject.Property(type=float, default=0.0)
     def progress_fraction(self):
@@ -135,6 +292,10 @@ class SpotifyPlayback(GObject.Object):
     def devices_changed(self):
         pass
 
+    @GObject.Signal(arg_types=(str,))
+    def command_failed(self, notice):
+        pass
+
     def set_current_cover_art(self, image, dim=None):
         if dim is None:
             dim = Dimensions(self.desired_size, self.desired_size, True)
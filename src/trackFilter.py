@@ -0,0 +1,66 @@
+# trackFilter.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from gi.repository import Gtk
+
+from .core.metrics import Metrics
+
+
+class TrackFilter:
+    """A search entry that narrows a track list as you type.
+
+    The matching runs over the search keys the TrackStore keeps, and rows
+    are only shown or hidden, never rebuilt. Rows whose state does not
+    change are not touched at all.
+    """
+
+    def __init__(self):
+        self.entry = Gtk.SearchEntry(placeholder_text="Filter tracks")
+        self.entry.connect('search-changed', self.__on_search_changed)
+        self.track_store = None
+        self.rows = []
+        self.shown = []
+        self.query = ''
+
+    def set_track_store(self, track_store):
+        self.track_store = track_store
+
+    def add_rows(self, rows):
+        """Called for every chunk of rows the list loads, in store order."""
+        if self.track_store is None:
+            return
+        first = len(self.rows)
+        self.rows += rows
+        shown = self.track_store.matches(self.query, len(self.rows), first)
+        for row, show in zip(rows, shown):
+            row.set_visible(show)
+        self.shown += shown
+
+    def __on_search_changed(self, entry):
+        self.query = entry.get_text()
+        if self.track_store is None:
+            return
+        start = time.perf_counter()
+        shown = self.track_store.matches(self.query, len(self.rows))
+        for index, show in enumerate(shown):
+            if show != self.shown[index]:
+                self.rows[index].set_visible(show)
+        self.shown = shown
+        Metrics.observe(
+            'filter.apply_ms', (time.perf_counter() - start) * 1000)
@@ -0,0 +1,173 @@
+# trackSelection.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GObject, Gtk
+
+from .core.ioEngine import IoEngine
+from .core.library import Library
+from .core.libraryEdits import LibraryEdits
+from .uiDispatcher import UiDispatcher
+
+
+class TrackSelection:
+    """Lets the user pick many tracks of a list and save, remove or add
+    them to a playlist at once.
+
+    While selecting, activating a row toggles it instead of playing it.
+    The selection is kept here and not left to the list box, whose clicks
+    would replace it. Tracks of batches that failed stay selected, so the
+    same button sends them again.
+    """
+
+    def __init__(self, listbox):
+        self.listbox = listbox
+        self.selected = set()
+        self.playlists_loaded = False
+
+        self.toggle = Gtk.ToggleButton(label="Select", halign=Gtk.Align.END)
+        self.toggle.connect('toggled', self.__on_toggled)
+
+        self.action_bar = Gtk.ActionBar(no_show_all=True)
+        select_all_button = Gtk.Button(label="All")
+        select_all_button.connect('clicked', self.__on_select_all)
+        save_button = Gtk.Button(label="Save")
+        save_button.connect('clicked', self.__on_save)
+        remove_button = Gtk.Button(label="Remove")
+        remove_button.connect('clicked', self.__on_remove)
+        self.playlists_list = Gtk.ListBox()
+        self.playlists_list.connect(
+            'row-activated', self.__on_playlist_activated)
+        scrolled = Gtk.ScrolledWindow(
+            propagate_natural_height=True, max_content_height=300)
+        scrolled.add(self.playlists_list)
+        scrolled.show_all()
+        self.playlists_popover = Gtk.Popover()
+        self.playlists_popover.add(scrolled)
+        add_button = Gtk.MenuButton(
+            label="Add to playlist", popover=self.playlists_popover)
+        add_button.connect('toggled', self.__on_add_toggled)
+        self.progress = Gtk.ProgressBar(show_text=True, valign=Gtk.Align.CENTER)
+        self.progress.set_text("0 selected")
+
+        for button in (select_all_button, save_button, remove_button,
+                       add_button):
+            self.action_bar.pack_start(button)
+            button.show()
+        self.action_bar.pack_end(self.progress)
+        self.progress.show()
+
+        # Connected before the page's own handler, so it can stop playback.
+        listbox.connect('row-activated', self.__on_row_activated)
+
+    def is_active(self):
+        return self.toggle.get_active()
+
+    def get_uris(self):
+        return [row.get_uri() for row in self.listbox.get_children()
+                if row in self.selected]
+
+    def __show_selection(self):
+        self.listbox.unselect_all()
+        for row in self.selected:
+            self.listbox.select_row(row)
+        self.progress.set_fraction(0.0)
+        self.progress.set_text(str(len(self.selected)) + " selected")
+
+    def __on_toggled(self, toggle):
+        self.selected = set()
+        if toggle.get_active():
+            self.listbox.set_selection_mode(Gtk.SelectionMode.MULTIPLE)
+            self.__show_selection()
+            self.action_bar.show()
+        else:
+            self.listbox.set_selection_mode(Gtk.SelectionMode.NONE)
+            self.action_bar.hide()
+
+    def __on_row_activated(self, listbox, row):
+        if not self.is_active():
+            return
+        GObject.signal_stop_emission_by_name(listbox, 'row-activated')
+        if row in self.selected:
+            self.selected.remove(row)
+        else:
+            self.selected.add(row)
+        self.__show_selection()
+
+    def __on_select_all(self, _button):
+        self.selected = {row for row in self.listbox.get_children()
+                         if row.get_visible()}
+        self.__show_selection()
+
+    def __run(self, verb, edit, *args):
+        uris = self.get_uris()
+        if not uris:
+            return
+        rows_by_uri = {row.get_uri(): row for row in self.selected}
+
+        def show_progress(result):
+            def to_main_thread():
+                self.progress.set_fraction(result.fraction())
+                self.progress.set_text(
+                    str(result.done) + " / " + str(result.total))
+            UiDispatcher.get().dispatch(
+                self.progress, to_main_thread, key='progress')
+
+        def show_result(result):
+            self.selected = {rows_by_uri[uri] for uri in result.failed}
+            self.__show_selection()
+            self.progress.set_fraction(1.0 if not result.failed else 0.0)
+            self.progress.set_text(result.summary(verb))
+
+        async def run_edit():
+            result = await edit(*args, uris, progress_callback=show_progress)
+            UiDispatcher.get().dispatch(
+                self.progress, show_result, result, key='result')
+        IoEngine.get().spawn(run_edit())
+
+    def __on_save(self, _button):
+        self.__run("Saved", LibraryEdits.save_tracks)
+
+    def __on_remove(self, _button):
+        self.__run("Removed", LibraryEdits.remove_tracks)
+
+    def __on_add_toggled(self, button):
+        if not button.get_active() or self.playlists_loaded:
+            return
+        self.playlists_loaded = True
+
+        def load_playlists():
+            try:
+                playlists = Library.get_playlists()
+            except Exception as e:
+                print(e)
+                self.playlists_loaded = False
+                return
+
+            def add_rows():
+                for playlist in playlists:
+                    row = Gtk.ListBoxRow()
+                    row.playlist_id = playlist['uri'].split(':')[-1]
+                    row.add(Gtk.Label(label=playlist['name'], xalign=0))
+                    self.playlists_list.add(row)
+                self.playlists_list.show_all()
+            UiDispatcher.get().dispatch(
+                self.playlists_list, add_rows, key='playlists')
+        IoEngine.get().submit(load_playlists)
+
+    def __on_playlist_activated(self, _listbox, row):
+        self.playlists_popover.popdown()
+        self.__run("Added", LibraryEdits.add_to_playlist, row.playlist_id)
@@ -0,0 +1,140 @@
+# uiDispatcher.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from collections import OrderedDict
+
+from gi.repository import GLib
+
+from .core.metrics import Metrics
+
+
+class UiDispatcher:
+    """Batches widget updates from worker threads into the main loop.
+
+    Instead of one idle source per update, updates are queued and drained
+    about once per frame within a time budget. An update is keyed by its
+    widget and a name, so a newer update for the same widget and name
+    replaces a pending older one. Updates for widgets that are gone or being
+    destroyed are dropped.
+    """
+
+    FRAME_INTERVAL_MS = 16
+    BUDGET_MS = 8
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        with cls.__instance_lock:
+            if not cls.__instance:
+                cls.__instance = UiDispatcher()
+            return cls.__instance
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__pending = OrderedDict()
+        self.__scheduled = False
+        self.__anonymous_keys = 0
+
+    def dispatch(self, widget, function, *args, key=None):
+        """Runs function(*args) on the main loop if widget is still alive."""
+        with self.__lock:
+            if key is None:
+                self.__anonymous_keys += 1
+                key = self.__anonymous_keys
+            # Keyed on the widget itself rather than its id(), which a new
+            # widget can reuse once the old one is freed.
+            full_key = (widget, key)
+            if full_key in self.__pending:
+                Metrics.inc('ui.updates_coalesced')
+                del self.__pending[full_key]
+            self.__pending[full_key] = (widget, function, args)
+            Metrics.inc('ui.updates_queued')
+            if not self.__scheduled:
+                self.__schedule_locked()
+
+    def __schedule_locked(self):
+        self.__scheduled = True
+        GLib.timeout_add(
+            self.FRAME_INTERVAL_MS,
+            self.__drain,
+            priority=GLib.PRIORITY_DEFAULT_IDLE)
+
+    def __is_alive(self, widget):
+        # Destroyed widgets are unparented. Everything updated through here
+        # is packed before its first update arrives.
+        if widget is None:
+            return True
+        if widget.in_destruction():
+            return False
+        return widget.get_parent() is not None or widget.is_toplevel()
+
+    def __drain(self):
+        finished = False
+        try:
+            more = self.__drain_batch()
+            finished = True
+            return more
+        finally:
+            if not finished:
+                # The source is removed along with the exception. Without a
+                # new one every later update would wait forever.
+                with self.__lock:
+                    self.__scheduled = False
+                    if self.__pending:
+                        self.__schedule_locked()
+
+    def __drain_batch(self):
+        start = time.perf_counter()
+        deadline = start + self.BUDGET_MS / 1000
+        drained = 0
+        # Decided under the same lock that finds the queue empty, a
+        # dispatch right after that schedules a new source of its own.
+        more = True
+        while True:
+            with self.__lock:
+                if not self.__pending:
+                    self.__scheduled = False
+                    more = False
+                    break
+                _key, (widget, function, args) = \
+                    self.__pending.popitem(last=False)
+            if self.__is_alive(widget):
+                try:
+                    function(*args)
+                except Exception as e:
+                    # One broken update must not take the others with it.
+                    print(e)
+                    Metrics.inc('ui.update_errors')
+                drained += 1
+            else:
+                Metrics.inc('ui.updates_dropped')
+            if time.perf_counter() >= deadline:
+                break
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        Metrics.inc('ui.batches')
+        Metrics.observe('ui.batch_size', drained)
+        Metrics.observe('ui.batch_ms', elapsed_ms)
+        if elapsed_ms > self.FRAME_INTERVAL_MS:
+            Metrics.inc('ui.batches_over_frame')
+
+        # Something is left over, come back next frame.
+        return more
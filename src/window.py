@@ -15,17 +15,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .login import Login
-from .searchOverview import SearchOverview
-from .libraryOverview import LibraryOverview
-from .simpleControls import SimpleControls
-from .spotifyPlayback import SpotifyPlayback
-from .spotifyGuiBuilder import SpotifyGuiBuilder
-from .coverArtLoader import CoverArtLoader
-from gi.repository import Gtk, Handy, GObject
-
 import gi
 gi.require_version('Handy', '1')
+from gi.repository import Gtk, GLib, Handy, GObject
+
+from .core.startupProfile import StartupProfile
+from .login import Login
+
+# Everything after the login is imported where it is first needed, so the
+# login page or the library is up before the rest has even been loaded.
 
 
 @Gtk.Template(resource_path='/xyz/merlinx/Spotipyne/window.ui')
@@ -42,19 +40,35 @@ class SpotipyneWindow(Handy.ApplicationWindow):
     back_button_search = Gtk.Template.Child()
     simple_controls_parent = Gtk.Template.Child()
 
+    def init_network_watcher(self):
+        from .networkWatcher import NetworkWatcher
+        self.network_watcher = NetworkWatcher()
+
+    def init_edit_queue(self):
+        from .core.editQueue import EditQueue
+        EditQueue.get().start()
+
     def init_cover_art_loader(self):
+        from .coverArtLoader import CoverArtLoader
         self.cover_art_loader = CoverArtLoader()
 
+    def init_gui_builder(self):
+        from .spotifyGuiBuilder import SpotifyGuiBuilder
+        self.sp_gui = SpotifyGuiBuilder(self.cover_art_loader)
+
     def init_spotify_playback(self):
+        from .spotifyPlayback import SpotifyPlayback
         self.spotify_playback = SpotifyPlayback(self.cover_art_loader)
 
     def init_simple_controls(self):
+        from .simpleControls import SimpleControls
         self.simple_controls = SimpleControls(self.spotify_playback)
         self.simple_controls_parent.pack_start(
             self.simple_controls, False, True, 0)
         self.simple_controls.set_reveal_child(False)
 
     def init_library_overview(self):
+        from .libraryOverview import LibraryOverview
         self.library_overview = LibraryOverview(
             self.sp_gui, self.back_button_playlists)
         self.main_stack.add_titled(self.library_overview, 'Library', 'Library')
@@ -62,11 +76,28 @@ class SpotipyneWindow(Handy.ApplicationWindow):
             self.library_overview, 'icon-name',
             'applications-multimedia-symbolic')
 
-    def init_search_overview(self):
-        self.search_overview = SearchOverview(self.sp_gui, self.back_button_search)
-        self.main_stack.add_titled(self.search_overview, 'Search', 'Search')
+    def init_search_tab(self):
+        # Only a placeholder until the tab is first opened.
+        self.search_overview = None
+        self.search_tab = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self.main_stack.add_titled(self.search_tab, 'Search', 'Search')
         self.main_stack.child_set_property(
-            self.search_overview, 'icon-name', 'edit-find-symbolic')
+            self.search_tab, 'icon-name', 'edit-find-symbolic')
+        self.main_stack.connect(
+            "notify::visible-child-name", self.on_main_stack_switched)
+        self.search_tab.show()
+
+    def on_main_stack_switched(self, stack, _):
+        if stack.get_visible_child_name() == 'Search' and \
+                self.search_overview is None:
+            self.init_search_overview()
+
+    def init_search_overview(self):
+        with StartupProfile.step("search overview"):
+            from .searchOverview import SearchOverview
+            self.search_overview = SearchOverview(
+                self.sp_gui, self.back_button_search)
+            self.search_tab.pack_start(self.search_overview, True, True, 0)
 
     def init_back_buttons(self):
         self.back_button_stack.child_set_property
@@ -84,23 +115,29 @@ class SpotipyneWindow(Handy.ApplicationWindow):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        self.init_login()
+        with StartupProfile.step("login page"):
+            self.init_login()
+        StartupProfile.mark("window created")
 
     def on_logged_in(self):
+        StartupProfile.mark("logged in")
         self.player_deck.remove(self.login_page)
         self.player_deck.set_visible_child(self.player_deck.get_children()[0])
 
-        self.init_cover_art_loader()
-
-        self.sp_gui = SpotifyGuiBuilder(self.cover_art_loader)
+        with StartupProfile.step("network watcher"):
+            self.init_network_watcher()
 
-        self.init_library_overview()
+        with StartupProfile.step("cover art loader"):
+            self.init_cover_art_loader()
 
-        self.init_search_overview()
+        with StartupProfile.step("gui builder"):
+            self.init_gui_builder()
 
-        self.init_spotify_playback()
+        with StartupProfile.step("library overview"):
+            self.init_library_overview()
 
-        self.init_simple_controls()
+        with StartupProfile.step("search tab"):
+            self.init_search_tab()
 
         self.init_back_buttons()
 
@@ -109,3 +146,29 @@ class SpotipyneWindow(Handy.ApplicationWindow):
             self.bottom_switcher,
             "reveal",
             GObject.BindingFlags.SYNC_CREATE)
+
+        # Playback and the controls are hidden until there is playback
+        # anyway, they are set up once the library has been drawn.
+        frame_clock = self.get_frame_clock()
+        if frame_clock is None:
+            GLib.idle_add(self.init_after_first_frame)
+            return
+        self.__after_paint_handler = frame_clock.connect(
+            "after-paint", self.on_first_frame_after_login)
+
+    def on_first_frame_after_login(self, frame_clock):
+        frame_clock.disconnect(self.__after_paint_handler)
+        StartupProfile.mark("first frame after login")
+        GLib.idle_add(self.init_after_first_frame)
+
+    def init_after_first_frame(self):
+        with StartupProfile.step("spotify playback"):
+            self.init_spotify_playback()
+
+        with StartupProfile.step("simple controls"):
+            self.init_simple_controls()
+
+        with StartupProfile.step("edit queue"):
+            self.init_edit_queue()
+        StartupProfile.finish()
+        return GLib.SOURCE_REMOVE
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# coverArtLoaderTest.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import tempfile
+import unittest
+
+import gi
+gi.require_version('Gtk', '3.0')
+gi.require_version('GdkPixbuf', '2.0')
+from gi.repository import GdkPixbuf  # noqa: E402
+
+import testHelpers  # noqa: E402
+
+testHelpers.load_spotipyne()
+from spotipyne import coverArtLoader as loader  # noqa: E402
+from spotipyne.core.coverStore import CoverStore  # noqa: E402
+from spotipyne.core.failureCache import FailureCache  # noqa: E402
+from spotipyne.core.thumbnailPack import ThumbnailPack  # noqa: E402
+
+IMAGE_URL = 'https://i.scdn.co/image/test-300x300'
+URLS = [{'url': IMAGE_URL, 'width': 300, 'height': 300}]
+
+RED = 0xff0000ff
+BLUE = 0x0000ffff
+
+
+def filled_pixbuf(size, colour):
+    pixbuf = GdkPixbuf.Pixbuf.new(
+        GdkPixbuf.Colorspace.RGB, False, 8, size, size)
+    pixbuf.fill(colour)
+    return pixbuf
+
+
+def red_of(pixbuf):
+    return pixbuf.get_pixels()[0]
+
+
+class GetScaledTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cover_store = CoverStore(
+            tempfile.mkdtemp(dir=testHelpers.CACHE_DIR))
+        self.pack = ThumbnailPack(tempfile.mkdtemp(dir=testHelpers.CACHE_DIR))
+        self.entry = loader.PixbufCache.PixbufCacheEntry(
+            self.pack, FailureCache(), self.cover_store)
+
+    def tearDown(self):
+        self.pack.close()
+
+    def test_scales_down_from_a_larger_cached_pixbuf(self):
+        self.entry.pixbufs_scaled[loader.Dimensions(64, 64, True)] = \
+            filled_pixbuf(64, RED)
+        self.entry.pixbufs_scaled[loader.Dimensions(300, 300, True)] = \
+            filled_pixbuf(300, BLUE)
+        scaled = self.entry.get_scaled(loader.Dimensions(128, 128, True), URLS)
+        self.assertEqual(scaled.get_width(), 128)
+        self.assertEqual(red_of(scaled), 0)
+
+    def test_never_scales_up_a_smaller_cached_pixbuf(self):
+        self.entry.pixbufs_scaled[loader.Dimensions(64, 64, True)] = \
+            filled_pixbuf(64, RED)
+        filled_pixbuf(300, BLUE).savev(
+            self.cover_store.path_for_url(IMAGE_URL), 'png', [], [])
+        scaled = self.entry.get_scaled(loader.Dimensions(128, 128, True), URLS)
+        self.assertEqual(scaled.get_width(), 128)
+        self.assertEqual(red_of(scaled), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
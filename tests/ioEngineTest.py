@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+# ioEngineTest.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+
+import testHelpers
+
+testHelpers.load_spotipyne()
+from spotipyne.core.ioEngine import IoEngine  # noqa: E402
+
+
+class SharedSessionTest(unittest.TestCase):
+
+    def test_adapters_retry_rate_limits_and_server_errors(self):
+        session = IoEngine.create_session(threading.BoundedSemaphore(1))
+        for prefix in ('https://', 'http://'):
+            retry = session.get_adapter(prefix + 'api.spotify.com').max_retries
+            self.assertEqual(retry.total, IoEngine.RETRIES)
+            self.assertGreater(retry.backoff_factor, 0)
+            self.assertEqual(
+                set(retry.status_forcelist), {429, 500, 502, 503, 504})
+            self.assertTrue(retry.respect_retry_after_header)
+            # Writes are retried too, spotipy retries every method.
+            self.assertFalse(retry.allowed_methods)
+            self.assertTrue(retry.is_retry('POST', 429, True))
+            self.assertTrue(retry.is_retry('PUT', 503, False))
+            self.assertFalse(retry.is_retry('GET', 404, False))
+
+
+class CallTest(unittest.TestCase):
+
+    def test_call_returns_the_result(self):
+        self.assertEqual(IoEngine.get().call(sum, [1, 2, 3]), 6)
+
+    def test_call_raises_on_an_io_thread(self):
+        engine = IoEngine.get()
+
+        def nested():
+            return engine.call(sum, [1, 2])
+        with self.assertRaises(RuntimeError):
+            engine.call(nested)
+
+    def test_call_raises_on_the_loop_thread(self):
+        engine = IoEngine.get()
+        raised = []
+
+        def on_loop():
+            try:
+                engine.call(sum, [1, 2])
+            except RuntimeError:
+                raised.append(True)
+        engine.loop.call_soon_threadsafe(on_loop)
+        engine.call(lambda: None)
+        engine.call(lambda: None)
+        self.assertEqual(raised, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
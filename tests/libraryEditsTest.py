@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# libraryEditsTest.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+import testHelpers
+
+testHelpers.load_spotipyne()
+from spotipyne.core import libraryEdits  # noqa: E402
+from spotipyne.core.ioEngine import IoEngine  # noqa: E402
+from spotipyne.core.libraryEdits import LibraryEdits  # noqa: E402
+from spotipyne.core.throttle import TokenBucket  # noqa: E402
+
+
+class RateLimited(Exception):
+    """Looks like the SpotifyException spotipy raises for a 429."""
+
+    def __init__(self, retry_after=None):
+        super().__init__('429 Too Many Requests')
+        self.http_status = 429
+        self.headers = {} if retry_after is None else \
+            {'Retry-After': str(retry_after)}
+
+
+class FakeLibrary:
+    """Answers current_user_saved_tracks_add, with a 429 while limited()
+    says so."""
+
+    def __init__(self, limited, retry_after=0):
+        self.limited = limited
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.saved_at = []
+
+    def current_user_saved_tracks_add(self, batch):
+        with self.lock:
+            self.calls += 1
+            if self.limited(self.calls):
+                raise RateLimited(self.retry_after)
+            self.saved_at.append(time.monotonic())
+
+    def get(self):
+        return self
+
+
+def save(library, uris):
+    with mock.patch.object(libraryEdits, 'sp', library):
+        return IoEngine.get().spawn(
+            LibraryEdits.save_tracks(uris)).result(timeout=60)
+
+
+def uris(count):
+    return ['spotify:track:' + str(index) for index in range(count)]
+
+
+class RateLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        # Fast enough not to matter, unless a 429 pauses it.
+        self.rate_limit = LibraryEdits.rate_limit
+        LibraryEdits.rate_limit = TokenBucket(1000, burst=1000)
+
+    def tearDown(self):
+        LibraryEdits.rate_limit = self.rate_limit
+
+    def test_rate_limited_batches_are_sent_again(self):
+        library = FakeLibrary(lambda call: call <= 2)
+        result = save(library, uris(3 * LibraryEdits.SAVED_TRACKS_BATCH))
+        self.assertEqual(result.done, result.total)
+        self.assertEqual(result.failed, [])
+        self.assertEqual(library.calls, 5)
+
+    def test_retry_after_holds_back_every_batch(self):
+        start = time.monotonic()
+        library = FakeLibrary(
+            lambda call: time.monotonic() - start < 0.5, retry_after=1)
+        result = save(library, uris(6 * LibraryEdits.SAVED_TRACKS_BATCH))
+        self.assertEqual(result.done, result.total)
+        self.assertGreaterEqual(min(library.saved_at) - start, 0.9)
+
+    def test_a_batch_that_stays_rate_limited_fails(self):
+        library = FakeLibrary(lambda call: True)
+        tracks = uris(2 * LibraryEdits.SAVED_TRACKS_BATCH)
+        result = save(library, tracks)
+        self.assertEqual(result.done, 0)
+        self.assertEqual(sorted(result.failed), sorted(tracks))
+        self.assertEqual(
+            library.calls, 2 * LibraryEdits.RATE_LIMITED_ATTEMPTS)
+
+    def test_retry_after(self):
+        self.assertEqual(LibraryEdits.retry_after(RateLimited(3)), 3)
+        self.assertEqual(
+            LibraryEdits.retry_after(RateLimited()),
+            LibraryEdits.DEFAULT_RETRY_AFTER_S)
+        self.assertIsNone(LibraryEdits.retry_after(ValueError()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# mprisPlaybackTest.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Runs MprisPlayback against a stub player on a private dbus-daemon, the
+# same way SPOTIPYNE_MPRIS_BUS points the app at one.
+
+import os
+import time
+import unittest
+
+from gi.repository import Gio, GLib
+
+import mprisStub
+import testHelpers
+
+testHelpers.load_spotipyne()
+from spotipyne.mprisPlayback import MprisPlayback  # noqa: E402
+
+TIMEOUT_S = 5
+
+
+def wait_for(condition):
+    context = GLib.MainContext.default()
+    deadline = time.monotonic() + TIMEOUT_S
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        if not context.iteration(False):
+            time.sleep(0.005)
+    return True
+
+
+@unittest.skipUnless(mprisStub.have_dbus_daemon(), "needs dbus-daemon")
+class MprisPlaybackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = mprisStub.PrivateBus()
+        self.player = mprisStub.StubPlayer(
+            self.bus.connect(), MprisPlayback.BUS_NAME,
+            PlaybackStatus='Paused',
+            Metadata=mprisStub.metadata(
+                'first', title='First', artists=['Someone'],
+                length_us=180000000),
+            Position=30000000)
+        self.states = []
+        os.environ[MprisPlayback.ENV_BUS_ADDRESS] = self.bus.address
+        self.mpris = MprisPlayback(self.states.append)
+
+    def tearDown(self):
+        del os.environ[MprisPlayback.ENV_BUS_ADDRESS]
+        self.bus.stop()
+
+    def last_state(self):
+        return self.states[-1] if self.states else None
+
+    def wait_for_state(self, **expected):
+        def matches():
+            state = self.last_state()
+            return state is not None and all(
+                getattr(state, name) == value
+                for name, value in expected.items())
+        self.assertTrue(
+            wait_for(matches),
+            "no state with {}, last was {}".format(
+                expected,
+                self.last_state() and self.last_state().to_dict()))
+
+    def test_initial_state_is_read_from_the_player(self):
+        self.wait_for_state(
+            has_playback=True,
+            is_playing=False,
+            track_uri='spotify:track:first',
+            track_name='First',
+            artists='Someone',
+            duration_ms=180000,
+            progress_ms=30000)
+        self.assertTrue(self.mpris.is_active())
+
+    def test_properties_changed(self):
+        self.wait_for_state(track_uri='spotify:track:first')
+        self.player.set_properties(
+            PlaybackStatus='Playing',
+            Metadata=mprisStub.metadata('second', title='Second'),
+            Shuffle=True,
+            LoopStatus='Playlist')
+        self.wait_for_state(
+            is_playing=True,
+            track_uri='spotify:track:second',
+            track_name='Second',
+            shuffle=True,
+            repeat='context')
+
+    def test_seeked(self):
+        self.wait_for_state(track_uri='spotify:track:first')
+        self.player.seek(90000000)
+        self.wait_for_state(progress_ms=90000)
+
+    def test_play_pause_round_trip(self):
+        self.wait_for_state(is_playing=False)
+        client = self.bus.connect()
+
+        def play_pause():
+            client.call(
+                MprisPlayback.BUS_NAME, mprisStub.OBJECT_PATH,
+                MprisPlayback.PLAYER_INTERFACE, 'PlayPause', None, None,
+                Gio.DBusCallFlags.NONE, -1, None, None)
+
+        play_pause()
+        self.wait_for_state(is_playing=True)
+        play_pause()
+        self.wait_for_state(is_playing=False)
+        self.assertEqual(self.player.play_pause_calls, 2)
+
+    def test_player_going_away(self):
+        self.wait_for_state(has_playback=True)
+        self.player.release()
+        self.assertTrue(wait_for(lambda: self.states[-1] is None))
+        self.assertFalse(self.mpris.is_active())
+
+
+if __name__ == '__main__':
+    unittest.main()
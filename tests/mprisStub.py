@@ -0,0 +1,166 @@
+# mprisStub.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import shutil
+import signal
+import subprocess
+
+from gi.repository import Gio, GLib
+
+PLAYER_INTERFACE = 'org.mpris.MediaPlayer2.Player'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+OBJECT_PATH = '/org/mpris/MediaPlayer2'
+
+PLAYER_XML = """
+<node>
+  <interface name="org.mpris.MediaPlayer2.Player">
+    <method name="PlayPause"/>
+    <signal name="Seeked">
+      <arg name="Position" type="x"/>
+    </signal>
+    <property name="PlaybackStatus" type="s" access="read"/>
+    <property name="LoopStatus" type="s" access="read"/>
+    <property name="Shuffle" type="b" access="read"/>
+    <property name="Metadata" type="a{sv}" access="read"/>
+    <property name="Position" type="x" access="read"/>
+  </interface>
+</node>
+"""
+
+PROPERTY_TYPES = {
+    'PlaybackStatus': 's',
+    'LoopStatus': 's',
+    'Shuffle': 'b',
+    'Metadata': 'a{sv}',
+    'Position': 'x',
+}
+
+
+def metadata(track_id, title='', artists=(), length_us=0, art_url=None):
+    """Metadata the way the Spotify client reports it."""
+    values = {
+        'mpris:trackid': GLib.Variant('o', '/com/spotify/track/' + track_id),
+        'xesam:title': GLib.Variant('s', title),
+        'xesam:artist': GLib.Variant('as', list(artists)),
+        'mpris:length': GLib.Variant('x', length_us),
+    }
+    if art_url:
+        values['mpris:artUrl'] = GLib.Variant('s', art_url)
+    return values
+
+
+class PrivateBus:
+    """A dbus-daemon of its own, so the tests never see a real player."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ['dbus-daemon', '--session', '--nofork', '--print-address'],
+            stdout=subprocess.PIPE, universal_newlines=True)
+        self.address = self.process.stdout.readline().strip()
+
+    def connect(self):
+        return Gio.DBusConnection.new_for_address_sync(
+            self.address,
+            Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT
+            | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION,
+            None, None)
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class StubPlayer:
+    """A minimal org.mpris.MediaPlayer2.Player on the given connection.
+
+    Only what MprisPlayback reads is there. Properties are answered from
+    self.properties, PlayPause flips PlaybackStatus and announces it with
+    PropertiesChanged like the real client does.
+    """
+
+    def __init__(self, connection, bus_name, **properties):
+        self.connection = connection
+        self.bus_name = bus_name
+        self.properties = {
+            'PlaybackStatus': 'Stopped',
+            'LoopStatus': 'None',
+            'Shuffle': False,
+            'Metadata': {},
+            'Position': 0,
+        }
+        self.properties.update(properties)
+        self.play_pause_calls = 0
+        interface = Gio.DBusNodeInfo.new_for_xml(PLAYER_XML).interfaces[0]
+        # Without a get_property handler GDBus hands the Properties calls
+        # to on_method_call, which keeps everything in one place.
+        self.registration_id = connection.register_object(
+            OBJECT_PATH, interface, self.on_method_call, None, None)
+        connection.call_sync(
+            'org.freedesktop.DBus', '/org/freedesktop/DBus',
+            'org.freedesktop.DBus', 'RequestName',
+            GLib.Variant('(su)', (bus_name, 0)), GLib.VariantType('(u)'),
+            Gio.DBusCallFlags.NONE, -1, None)
+
+    def variant(self, name):
+        return GLib.Variant(PROPERTY_TYPES[name], self.properties[name])
+
+    def on_method_call(self, connection, sender, object_path, interface_name,
+                       method_name, parameters, invocation):
+        if interface_name == PROPERTIES_INTERFACE and method_name == 'Get':
+            _interface, name = parameters.unpack()
+            invocation.return_value(GLib.Variant('(v)', (self.variant(name),)))
+        elif interface_name == PROPERTIES_INTERFACE and \
+                method_name == 'GetAll':
+            invocation.return_value(GLib.Variant('(a{sv})', (
+                {name: self.variant(name) for name in self.properties},)))
+        elif method_name == 'PlayPause':
+            self.play_pause_calls += 1
+            playing = self.properties['PlaybackStatus'] == 'Playing'
+            self.set_properties(
+                PlaybackStatus='Paused' if playing else 'Playing')
+            invocation.return_value(None)
+        else:
+            invocation.return_dbus_error(
+                'org.freedesktop.DBus.Error.UnknownMethod', method_name)
+
+    def set_properties(self, **changed):
+        self.properties.update(changed)
+        self.connection.emit_signal(
+            None, OBJECT_PATH, PROPERTIES_INTERFACE, 'PropertiesChanged',
+            GLib.Variant('(sa{sv}as)', (
+                PLAYER_INTERFACE,
+                {name: self.variant(name) for name in changed},
+                [])))
+
+    def seek(self, position_us):
+        self.properties['Position'] = position_us
+        self.connection.emit_signal(
+            None, OBJECT_PATH, PLAYER_INTERFACE, 'Seeked',
+            GLib.Variant('(x)', (position_us,)))
+
+    def release(self):
+        self.connection.unregister_object(self.registration_id)
+        self.connection.call_sync(
+            'org.freedesktop.DBus', '/org/freedesktop/DBus',
+            'org.freedesktop.DBus', 'ReleaseName',
+            GLib.Variant('(s)', (self.bus_name,)), GLib.VariantType('(u)'),
+            Gio.DBusCallFlags.NONE, -1, None)
+
+
+def have_dbus_daemon():
+    return shutil.which('dbus-daemon') is not None
@@ -0,0 +1,44 @@
+# testHelpers.py
+#
+# Copyright 2020 Merlin Danner
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import importlib.util
+import os
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# xdg.BaseDirectory reads the environment on import, so the cache has to be
+# redirected before anything from spotipyne is loaded.
+CACHE_DIR = tempfile.mkdtemp(prefix='spotipyne-test-')
+os.environ['XDG_CACHE_HOME'] = CACHE_DIR
+
+
+def load_spotipyne():
+    # Same as in benchmarks/benchmarkHelpers.py: meson installs src/ as the
+    # "spotipyne" package, so load it under that name in-tree as well.
+    if 'spotipyne' in sys.modules:
+        return sys.modules['spotipyne']
+    spec = importlib.util.spec_from_file_location(
+        'spotipyne',
+        os.path.join(SRC_DIR, '__init__.py'),
+        submodule_search_locations=[SRC_DIR])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['spotipyne'] = module
+    spec.loader.exec_module(module)
+    return module